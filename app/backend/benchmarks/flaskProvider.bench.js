@@ -0,0 +1,144 @@
+// Per-call overhead of the Flask AI provider: a fresh connection per call with
+// the legacy prompt-string contract ("before") versus pooled keep-alive
+// connections with the structured payload ("after").
+//
+//   node benchmarks/flaskProvider.bench.js --calls 500 --concurrency 1,8 --out bench.json
+//
+// Without FLASK_AI_URL the calls go to a local stub that answers at once, so
+// the numbers are client and connection overhead only. Point FLASK_AI_URL at
+// the Flask AI service (AGENT_PROVIDER=mock, MOCK_LATENCY_MS=0) to include it.
+import http from "node:http";
+import { writeFileSync } from "node:fs";
+import { performance } from "node:perf_hooks";
+import { createFlaskProvider } from "../src/providers/ai/flask.provider.js";
+
+const TRIAGE = {
+  symptoms: "Headache and nausea since yesterday",
+  severity: 6,
+  duration: "1 day",
+  age: 42,
+  gender: "female",
+  medical_history: "migraine",
+  current_medications: "",
+};
+
+const PROMPT =
+  `Symptoms: ${TRIAGE.symptoms}\n` +
+  `Severity: ${TRIAGE.severity}\n` +
+  `Duration: ${TRIAGE.duration}\n` +
+  `Age: ${TRIAGE.age}\n` +
+  `Gender: ${TRIAGE.gender}\n` +
+  `Medical History: ${TRIAGE.medical_history}\n` +
+  `Current Medications: N/A`;
+
+const STUB_BODY = JSON.stringify({
+  subjective: `Patient reports: ${TRIAGE.symptoms}`,
+  objective: "Vitals not provided",
+  assessment: "Probable migraine",
+  plan: "Analgesia and hydration",
+  nextStep: "Teleconsultation recommended",
+  start_chat: false,
+});
+
+function parseArgs(argv) {
+  const args = { calls: 500, concurrency: [1, 8], out: null };
+  for (let i = 0; i < argv.length; i += 2) {
+    const [flag, value] = [argv[i], argv[i + 1]];
+    if (flag === "--calls") args.calls = Number(value);
+    else if (flag === "--concurrency") args.concurrency = value.split(",").map(Number);
+    else if (flag === "--out" || flag === "-o") args.out = value;
+  }
+  return args;
+}
+
+function startStub() {
+  const stats = { connections: 0 };
+  const server = http.createServer((req, res) => {
+    req.resume();
+    req.on("end", () => {
+      res.writeHead(200, { "Content-Type": "application/json" });
+      res.end(STUB_BODY);
+    });
+  });
+  server.on("connection", () => {
+    stats.connections += 1;
+  });
+  return new Promise((resolve) => {
+    server.listen(0, "127.0.0.1", () => resolve({ server, stats, url: `http://127.0.0.1:${server.address().port}` }));
+  });
+}
+
+function percentile(sorted, p) {
+  return sorted[Math.min(sorted.length - 1, Math.floor((p / 100) * sorted.length))];
+}
+
+async function runScenario(provider, input, calls, concurrency) {
+  const latencies = [];
+  let next = 0;
+  async function worker() {
+    while (next < calls) {
+      next += 1;
+      const started = performance.now();
+      await provider.complete(input);
+      latencies.push(performance.now() - started);
+    }
+  }
+  const started = performance.now();
+  await Promise.all(Array.from({ length: concurrency }, worker));
+  const elapsed = performance.now() - started;
+  latencies.sort((a, b) => a - b);
+  const mean = latencies.reduce((sum, value) => sum + value, 0) / latencies.length;
+  return {
+    calls,
+    concurrency,
+    throughput_per_s: Number(((calls / elapsed) * 1000).toFixed(1)),
+    mean_ms: Number(mean.toFixed(3)),
+    p50_ms: Number(percentile(latencies, 50).toFixed(3)),
+    p95_ms: Number(percentile(latencies, 95).toFixed(3)),
+    p99_ms: Number(percentile(latencies, 99).toFixed(3)),
+  };
+}
+
+async function main() {
+  const args = parseArgs(process.argv.slice(2));
+  let stub = null;
+  if (!process.env.FLASK_AI_URL) {
+    stub = await startStub();
+    process.env.FLASK_AI_URL = stub.url;
+    process.env.GEMINI_API_KEY = process.env.GEMINI_API_KEY || "benchmark";
+  }
+
+  const scenarios = {
+    before: { provider: createFlaskProvider({ keepAlive: false }), input: PROMPT },
+    after: { provider: createFlaskProvider({ keepAlive: true }), input: TRIAGE },
+  };
+
+  const results = [];
+  for (const concurrency of args.concurrency) {
+    for (const [name, { provider, input }] of Object.entries(scenarios)) {
+      // Warm up (and, with keep-alive, fill the pool) before measuring
+      await runScenario(provider, input, Math.min(50, args.calls), concurrency);
+      const connectionsBefore = stub ? stub.stats.connections : null;
+      const result = await runScenario(provider, input, args.calls, concurrency);
+      if (stub) result.connections = stub.stats.connections - connectionsBefore;
+      results.push({ scenario: name, ...result });
+      console.log(
+        `${name.padEnd(6)} c=${String(concurrency).padEnd(3)} mean=${result.mean_ms}ms ` +
+          `p50=${result.p50_ms}ms p99=${result.p99_ms}ms ${result.throughput_per_s}/s` +
+          (stub ? ` connections=${result.connections}` : "")
+      );
+    }
+  }
+
+  Object.values(scenarios).forEach(({ provider }) => provider.close());
+  if (stub) stub.server.close();
+
+  if (args.out) {
+    writeFileSync(args.out, JSON.stringify({ target: process.env.FLASK_AI_URL, results }, null, 2));
+  }
+}
+
+main().catch((error) => {
+  console.error(error);
+  process.exit(1);
+});
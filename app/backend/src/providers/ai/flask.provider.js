@@ -1,8 +1,16 @@
+import http from "node:http";
+import https from "node:https";
 import fetch from "node-fetch";
 
 const REQUIRED_ENV_VARS = ["GEMINI_API_KEY"];
 const DEFAULT_BASE_URL = "http://flask_ai:5000";
 
+// Idle sockets are closed a bit before the Flask AI service drops them
+// (KEEPALIVE_TIMEOUT_SECONDS, 75s by default), so a request never lands
+// on a connection the server is closing.
+const DEFAULT_KEEP_ALIVE_TIMEOUT_MS = 60000;
+const DEFAULT_MAX_SOCKETS = 32;
+
 function resolveBaseUrl() {
   const baseUrl = process.env.FLASK_AI_URL || process.env.FLASK_AI_BASE_URL || DEFAULT_BASE_URL;
   if (!baseUrl) {
@@ -26,96 +34,120 @@ function ensureConfigured() {
   return { baseUrl: resolveBaseUrl() };
 }
 
-export default {
-  name: "flask",
-  async complete(prompt, options = {}) {
-    const { baseUrl } = ensureConfigured();
-    // Parse incoming triage payload or fallback prompt string
-    let data = {};
-
-    if (typeof prompt === "string") {
-      const lines = prompt.split("\n");
-      lines.forEach((line) => {
-        if (line.startsWith("Symptoms:")) {
-          data.symptoms = line.replace("Symptoms:", "").trim();
-        } else if (line.startsWith("Severity:")) {
-          const value = Number(line.replace("Severity:", "").trim());
-          data.severity = Number.isNaN(value) ? null : value;
-        } else if (line.startsWith("Duration:")) {
-          data.duration = line.replace("Duration:", "").trim();
-        } else if (line.startsWith("Age:")) {
-          const ageValue = Number(line.replace("Age:", "").trim());
-          data.age = Number.isNaN(ageValue) ? null : ageValue;
-        } else if (line.startsWith("Gender:")) {
-          data.gender = line.replace("Gender:", "").trim();
-        } else if (line.startsWith("Medical History:")) {
-          const history = line.replace("Medical History:", "").trim();
-          data.medical_history = history !== "N/A" ? history : "";
-        } else if (line.startsWith("Current Medications:")) {
-          const meds = line.replace("Current Medications:", "").trim();
-          data.current_medications = meds !== "N/A" ? meds : "";
-        }
-      });
-    } else if (prompt && typeof prompt === "object") {
-      // If already an object, clone to avoid accidental mutation
-      data = { ...prompt };
+function readNumber(name, fallback) {
+  const value = Number(process.env[name]);
+  return Number.isFinite(value) && value > 0 ? value : fallback;
+}
+
+// Legacy contract: a "Symptoms: ...\nSeverity: ..." prompt string
+function parsePrompt(prompt) {
+  const data = {};
+  prompt.split("\n").forEach((line) => {
+    if (line.startsWith("Symptoms:")) {
+      data.symptoms = line.replace("Symptoms:", "").trim();
+    } else if (line.startsWith("Severity:")) {
+      const value = Number(line.replace("Severity:", "").trim());
+      data.severity = Number.isNaN(value) ? null : value;
+    } else if (line.startsWith("Duration:")) {
+      data.duration = line.replace("Duration:", "").trim();
+    } else if (line.startsWith("Age:")) {
+      const ageValue = Number(line.replace("Age:", "").trim());
+      data.age = Number.isNaN(ageValue) ? null : ageValue;
+    } else if (line.startsWith("Gender:")) {
+      data.gender = line.replace("Gender:", "").trim();
+    } else if (line.startsWith("Medical History:")) {
+      const history = line.replace("Medical History:", "").trim();
+      data.medical_history = history !== "N/A" ? history : "";
+    } else if (line.startsWith("Current Medications:")) {
+      const meds = line.replace("Current Medications:", "").trim();
+      data.current_medications = meds !== "N/A" ? meds : "";
     }
+  });
+  return data;
+}
+
+export function createFlaskProvider({
+  keepAlive = process.env.FLASK_AI_KEEP_ALIVE !== "false",
+  maxSockets = readNumber("FLASK_AI_MAX_SOCKETS", DEFAULT_MAX_SOCKETS),
+  keepAliveTimeoutMs = readNumber("FLASK_AI_KEEP_ALIVE_TIMEOUT_MS", DEFAULT_KEEP_ALIVE_TIMEOUT_MS),
+} = {}) {
+  // One pool per protocol, shared by every call from this process
+  const agentOptions = { keepAlive, maxSockets, timeout: keepAliveTimeoutMs };
+  const agents = {
+    "http:": new http.Agent(agentOptions),
+    "https:": new https.Agent(agentOptions),
+  };
 
-    if (!data.symptoms && typeof options?.fallbackPrompt === "string") {
-      return this.complete(options.fallbackPrompt);
+  // compact asks the service to leave out raw_response and triage_input
+  async function postJson(url, payload, label, { compact = false } = {}) {
+    const headers = { "Content-Type": "application/json" };
+    if (compact) {
+      headers.Prefer = "return=minimal";
     }
 
     let response;
     try {
-      response = await fetch(`${baseUrl}/generate_summary`, {
+      response = await fetch(url, {
         method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify(data),
+        headers,
+        body: JSON.stringify(payload),
+        agent: (parsedUrl) => agents[parsedUrl.protocol],
       });
     } catch (networkError) {
-      const error = new Error(`Flask AI service network error: ${networkError.message}`);
+      const error = new Error(`${label} network error: ${networkError.message}`);
       error.code = "AI_PROVIDER_NETWORK_ERROR";
       error.cause = networkError;
       throw error;
     }
 
     if (!response.ok) {
-      const error = new Error(`Flask AI service failed: ${response.status}`);
+      const error = new Error(`${label} failed: ${response.status}`);
       error.code = "AI_PROVIDER_HTTP_ERROR";
       error.status = response.status;
       throw error;
     }
 
-    return await response.text(); // string (JSON stringificado)
-  },
-  async chat(message, { sessionId } = {}) {
-    const { baseUrl } = ensureConfigured();
-    const payload = { message };
-    if (sessionId) {
-      payload.session_id = sessionId;
-    }
-
-    let response;
     try {
-      response = await fetch(`${baseUrl}/chat`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify(payload),
-      });
-    } catch (networkError) {
-      const error = new Error(`Flask AI chat network error: ${networkError.message}`);
-      error.code = "AI_PROVIDER_NETWORK_ERROR";
-      error.cause = networkError;
-      throw error;
-    }
-
-    if (!response.ok) {
-      const error = new Error(`Flask AI chat service failed: ${response.status}`);
+      return await response.json();
+    } catch (parseError) {
+      // e.g. a proxy's HTML error page served with 200
+      const error = new Error(`${label} returned an invalid JSON body: ${parseError.message}`);
       error.code = "AI_PROVIDER_HTTP_ERROR";
       error.status = response.status;
+      error.cause = parseError;
       throw error;
     }
+  }
+
+  return {
+    name: "flask",
+    agents,
+    async complete(input, options = {}) {
+      const { baseUrl } = ensureConfigured();
+      // Structured triage objects are sent as-is; prompt strings are parsed
+      const data = typeof input === "string" ? parsePrompt(input) : { ...(input || {}) };
+
+      if (!data.symptoms && typeof options?.fallbackPrompt === "string") {
+        return this.complete(options.fallbackPrompt);
+      }
+
+      // The triage flow reads only the SOAP sections, so the raw model text is not sent
+      return postJson(`${baseUrl}/generate_summary`, data, "Flask AI service", { compact: true });
+    },
+    async chat(message, { sessionId } = {}) {
+      const { baseUrl } = ensureConfigured();
+      const payload = { message };
+      if (sessionId) {
+        payload.session_id = sessionId;
+      }
+
+      // Full payload: chat.controller forwards raw_response to the frontend
+      return postJson(`${baseUrl}/chat`, payload, "Flask AI chat service");
+    },
+    close() {
+      Object.values(agents).forEach((agent) => agent.destroy());
+    },
+  };
+}
 
-    return await response.json();
-  },
-};
+export default createFlaskProvider();
@@ -89,11 +89,11 @@ export async function runTriage(data) {
   }
 
   const { payload, frontend } = normalizeTriageData(data);
-  const prompt = buildPromptFromTriage(frontend);
 
   let summaryStr;
   try {
-    const requestPayload = payload.symptoms ? payload : prompt;
+    // Providers take the structured payload; the prompt string is only a legacy fallback
+    const requestPayload = payload.symptoms ? payload : buildPromptFromTriage(frontend);
     summaryStr = await aiProvider.complete(requestPayload);
   } catch (error) {
     throw error;
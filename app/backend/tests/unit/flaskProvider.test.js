@@ -0,0 +1,104 @@
+import http from "node:http";
+import { describe, it, expect, beforeAll, afterAll } from "@jest/globals";
+import { createFlaskProvider } from "../../src/providers/ai/flask.provider.js";
+
+describe("flaskProvider", () => {
+  let server;
+  let provider;
+  const requests = [];
+  let connections = 0;
+
+  beforeAll(async () => {
+    server = http.createServer((req, res) => {
+      let body = "";
+      req.on("data", (chunk) => {
+        body += chunk;
+      });
+      req.on("end", () => {
+        requests.push({ url: req.url, headers: req.headers, body: JSON.parse(body) });
+        if (req.url === "/chat" && JSON.parse(body).message === "proxy page") {
+          res.writeHead(200, { "Content-Type": "text/html" });
+          res.end("<html>Bad gateway</html>");
+          return;
+        }
+        const summary = { assessment: "Likely migraine", session_id: "abc" };
+        // Like the service, leave out the raw model text only when asked to
+        if (req.headers.prefer !== "return=minimal") {
+          summary.raw_response = "Assessment: Likely migraine";
+        }
+        res.writeHead(200, { "Content-Type": "application/json" });
+        res.end(JSON.stringify(summary));
+      });
+    });
+    server.on("connection", () => {
+      connections += 1;
+    });
+    await new Promise((resolve) => server.listen(0, "127.0.0.1", resolve));
+    process.env.FLASK_AI_URL = `http://127.0.0.1:${server.address().port}`;
+    process.env.GEMINI_API_KEY = "test-key";
+    provider = createFlaskProvider({ keepAlive: true });
+  });
+
+  afterAll(async () => {
+    provider.close();
+    delete process.env.FLASK_AI_URL;
+    delete process.env.GEMINI_API_KEY;
+    await new Promise((resolve) => server.close(resolve));
+  });
+
+  it("sends structured payloads as-is and returns the parsed summary", async () => {
+    requests.length = 0;
+    const payload = { symptoms: "Headache", severity: 5, medical_history: "asthma" };
+
+    const result = await provider.complete(payload);
+
+    expect(result.assessment).toBe("Likely migraine");
+    expect(requests[0].url).toBe("/generate_summary");
+    expect(requests[0].body).toEqual(payload);
+    expect(requests[0].headers.prefer).toBe("return=minimal");
+  });
+
+  it("returns the fields chat.controller reads from chat replies", async () => {
+    requests.length = 0;
+
+    const result = await provider.chat("hello", { sessionId: "abc" });
+
+    expect(requests[0].url).toBe("/chat");
+    expect(requests[0].body).toEqual({ message: "hello", session_id: "abc" });
+    expect(requests[0].headers.prefer).toBeUndefined();
+    expect(result.session_id).toBe("abc");
+    expect(result.raw_response).toBe("Assessment: Likely migraine");
+    expect(result.assessment).toBe("Likely migraine");
+  });
+
+  it("reports a non-JSON 200 body as a provider HTTP error", async () => {
+    let error;
+    try {
+      await provider.chat("proxy page");
+    } catch (caught) {
+      error = caught;
+    }
+
+    expect(error.code).toBe("AI_PROVIDER_HTTP_ERROR");
+    expect(error.status).toBe(200);
+  });
+
+  it("still accepts the legacy prompt string", async () => {
+    requests.length = 0;
+
+    await provider.complete("Symptoms: Chest pain\nSeverity: 9\nMedical History: N/A");
+
+    expect(requests[0].body).toEqual({ symptoms: "Chest pain", severity: 9, medical_history: "" });
+  });
+
+  it("reuses pooled connections across calls", async () => {
+    await provider.chat("hello", { sessionId: "abc" });
+    const opened = connections;
+
+    for (let i = 0; i < 5; i += 1) {
+      await provider.chat("hello", { sessionId: "abc" });
+    }
+
+    expect(connections).toBe(opened);
+  });
+});
@@ -0,0 +1,164 @@
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+from metrics import REGISTRY
+
+ADMISSION_WAIT = REGISTRY.histogram(
+    "triage_admission_wait_seconds", "Time spent queued for an upstream token", ("outcome",))
+ADMISSION_REJECTED = REGISTRY.counter(
+    "triage_admission_rejected_total", "Upstream calls shed by the admission controller", ("reason",))
+
+# Priority for requests with no severity (severity runs 1-10)
+DEFAULT_PRIORITY = 5
+# Background work no client waits on; queued behind every request
+BACKGROUND_PRIORITY = 0
+
+
+class AdmissionRejected(Exception):
+    """The call was shed instead of queued; ``status`` is the HTTP code to return"""
+
+    def __init__(self, message: str, status: int, reason: str, retry_after: float):
+        super().__init__(message)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Token-bucket rate limit with a bounded priority queue in front of the provider.
+
+    Tokens refill at ``rate`` per second up to ``burst``. A call takes a token
+    at once when one is free and nobody is queued; otherwise it waits in a
+    queue ordered by priority (highest first, FIFO within a priority). Calls
+    are shed rather than queued when the queue is full (503) or when their
+    estimated wait exceeds ``max_wait`` (429), and a queued call that is
+    still waiting after ``max_wait`` is shed as well. ``rate`` <= 0 disables
+    admission control.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None, max_queue: int = 256, max_wait: float = 10.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = max(burst if burst is not None else rate, 1.0)
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._clock = clock
+        self._tokens = self.burst
+        self._updated = clock()
+        # Heap of (-priority, sequence)
+        self._queue: List[Tuple[int, int]] = []
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _reject(self, message: str, status: int, reason: str, retry_after: float):
+        ADMISSION_REJECTED.inc(reason)
+        raise AdmissionRejected(message, status, reason, retry_after)
+
+    def _enqueue(self, priority: int, now: float) -> Optional[Tuple[int, int]]:
+        """Take a token or join the queue; None means admitted immediately"""
+        self._refill(now)
+        if not self._queue and self._tokens >= 1:
+            self._tokens -= 1
+            ADMISSION_WAIT.observe(0.0, "admitted")
+            return None
+        if len(self._queue) >= self.max_queue:
+            self._reject("Upstream queue is full", 503, "queue_full", self.max_wait)
+        ahead = sum(1 for negative, _ in self._queue if -negative >= priority)
+        estimated_wait = (ahead + 1 - self._tokens) / self.rate
+        if estimated_wait > self.max_wait:
+            self._reject(f"Upstream rate limit reached; estimated wait {estimated_wait:.1f}s",
+                         429, "rate_limited", estimated_wait)
+        ticket = (-priority, next(self._sequence))
+        heapq.heappush(self._queue, ticket)
+        return ticket
+
+    def _try_admit(self, ticket: Tuple[int, int], started: float, now: float) -> Optional[float]:
+        """Admit the ticket if it is first in line and a token is free.
+
+        Returns None when admitted, otherwise how long to wait before checking
+        again. Sheds the ticket once it has waited max_wait.
+        """
+        self._refill(now)
+        if self._queue[0] == ticket and self._tokens >= 1:
+            heapq.heappop(self._queue)
+            self._tokens -= 1
+            self._cond.notify_all()
+            ADMISSION_WAIT.observe(now - started, "admitted")
+            return None
+        remaining = started + self.max_wait - now
+        if remaining <= 0:
+            self._queue.remove(ticket)
+            heapq.heapify(self._queue)
+            self._cond.notify_all()
+            ADMISSION_WAIT.observe(now - started, "rejected")
+            self._reject("Timed out waiting for upstream capacity", 429, "timeout", 1.0 / self.rate)
+        if self._queue[0] == ticket:
+            return min(remaining, (1 - self._tokens) / self.rate)
+        return remaining
+
+    def acquire(self, priority: int = DEFAULT_PRIORITY):
+        if not self.enabled:
+            return
+        with self._cond:
+            started = self._clock()
+            ticket = self._enqueue(priority, started)
+            if ticket is None:
+                return
+            while True:
+                wait = self._try_admit(ticket, started, self._clock())
+                if wait is None:
+                    return
+                self._cond.wait(wait)
+
+    async def acquire_async(self, priority: int = DEFAULT_PRIORITY, poll_interval: float = 0.05):
+        if not self.enabled:
+            return
+        with self._cond:
+            started = self._clock()
+            ticket = self._enqueue(priority, started)
+        if ticket is None:
+            return
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_admit(ticket, started, self._clock())
+                if wait is None:
+                    return
+                # Coroutines cannot block on the condition; poll instead
+                await asyncio.sleep(min(wait, poll_interval))
+        except asyncio.CancelledError:
+            with self._cond:
+                if ticket in self._queue:
+                    self._queue.remove(ticket)
+                    heapq.heapify(self._queue)
+                    self._cond.notify_all()
+            raise
+
+
+def create_admission_controller() -> AdmissionController:
+    """Build the admission controller from AI_RATE_* / AI_QUEUE_* environment variables"""
+    rate = float(os.getenv('AI_RATE_LIMIT_PER_SECOND', '0'))
+    burst = os.getenv('AI_RATE_LIMIT_BURST')
+    return AdmissionController(
+        rate=rate,
+        burst=float(burst) if burst else None,
+        max_queue=int(os.getenv('AI_QUEUE_MAX_SIZE', '256')),
+        max_wait=float(os.getenv('AI_QUEUE_MAX_WAIT_SECONDS', '10')),
+    )
@@ -1,19 +1,53 @@
+import asyncio
 import os
+import inspect
 import json
 import logging
+import threading
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Any, Optional, List
-import google.generativeai as genai
+from typing import Dict, Any, Optional, List, AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable, Iterator, Tuple
+from ai_provider import AIProvider
+from mock_provider import MockAIProvider
+from concurrency import ConcurrencyLimiter
+from session_store import TriageSession, create_session_store
+from response_cache import create_response_cache, make_cache_key
+from semantic_cache import create_semantic_cache
+from singleflight import SingleFlight
+from chat_history import estimate_tokens, fit_history
+from batch import aiter_ordered, iter_ordered
+from metrics import REGISTRY, RequestTimer, stage, start_request
+from tracing import create_tracer
+from soap_parser import SoapParser, parse_soap, parse_soap_json
+from prompts import SOAP_JSON_PROMPT, SOAP_PROMPT, SOAP_RESPONSE_SCHEMA
+from resilience import CircuitBreaker, CircuitOpenError
+from model_routing import create_model_router
+from conversation_log import create_conversation_log
+from admission import BACKGROUND_PRIORITY, DEFAULT_PRIORITY, AdmissionRejected, create_admission_controller
+from triage_rules import create_rule_engine
 
-class GeminiAIProvider:
+# How each /generate_summary reply was read: "json" (structured output),
+# "text" (SOAP text parser), "text_fallback" (JSON requested but invalid) or
+# "fallback" (parser error, keyword-based sections); responses that never
+# reach the model report "degraded" (breaker open) or "rules" (pre-triage)
+PARSE_PATHS = REGISTRY.counter("triage_parse_path_total", "Summary replies by parse path", ("path",))
+RULE_ENRICHMENTS = REGISTRY.counter(
+    "triage_rule_enrichments_total", "Background model calls for rule-answered triages", ("result",))
+
+class GeminiAIProvider(AIProvider):
     """Google Gemini AI provider"""
+
+    display_name = "GeminiAI"
     
     def __init__(self):
         api_key = os.getenv('GEMINI_API_KEY')
         if not api_key:
             raise ValueError("GEMINI_API_KEY environment variable is required")
         
+        # Imported here so the mock provider and process startup skip the SDK
+        import google.generativeai as genai
+        self._genai = genai
         genai.configure(api_key=api_key)
         
         # Get model from environment or use default
@@ -27,131 +61,254 @@ class GeminiAIProvider:
             # Fallback to listing available models
             self.list_available_models()
             raise
+
+        # Older google-generativeai releases have no system_instruction; the
+        # system message is then prepended to each prompt instead
+        self.supports_system_instruction = (
+            "system_instruction" in inspect.signature(genai.GenerativeModel).parameters
+        )
+        # JSON mode (response_mime_type, then response_schema) also needs a newer SDK
+        config_fields = inspect.signature(genai.types.GenerationConfig).parameters
+        self.supports_json_mode = "response_mime_type" in config_fields
+        self._json_config: Dict[str, Any] = {}
+        if self.supports_json_mode:
+            self._json_config["response_mime_type"] = "application/json"
+            if "response_schema" in config_fields:
+                self._json_config["response_schema"] = SOAP_RESPONSE_SCHEMA
+        # (model name, system message) -> GenerativeModel, for routed models
+        self._models: Dict[Tuple[str, Optional[str]], Any] = {(self.model_name, None): self.model}
     
     def list_available_models(self):
         """List available models for debugging"""
         try:
             print("Available models:")
-            models = genai.list_models()
+            models = self._genai.list_models()
             for model in models:
                 if 'generateContent' in model.supported_generation_methods:
                     print(f"  - {model.name}")
         except Exception as e:
             print(f"Error listing models: {e}")
     
-    def complete(self, prompt: str, system_message: Optional[str] = None) -> str:
+    def _model_for(self, system_message: Optional[str], model_name: Optional[str] = None):
+        """Model named model_name, carrying system_message as its system instruction when supported"""
+        if not self.supports_system_instruction:
+            system_message = None
+        key = (model_name or self.model_name, system_message or None)
+        model = self._models.get(key)
+        if model is None:
+            # A few routed models times a handful of template constants, so this stays small
+            if key[1] is None:
+                model = self._genai.GenerativeModel(key[0])
+            else:
+                model = self._genai.GenerativeModel(key[0], system_instruction=key[1])
+            self._models[key] = model
+        return model
+
+    def _prompt_for(self, prompt: str, system_message: Optional[str]) -> str:
+        """Prompt text to send, with system_message inlined when it cannot go separately"""
+        if system_message and not self.supports_system_instruction:
+            return f"{system_message}\n\n{prompt}"
+        return prompt
+
+    def complete(self, prompt: str, system_message: Optional[str] = None, model: Optional[str] = None) -> str:
         try:
-            # Combine system message and prompt
-            full_prompt = f"{system_message}\n\n{prompt}" if system_message else prompt
-            
-            response = self.model.generate_content(full_prompt)
+            response = self._model_for(system_message, model).generate_content(self._prompt_for(prompt, system_message))
             return response.text
             
         except Exception as e:
             logging.error(f"Gemini AI request failed: {e}")
-            raise Exception(f"Gemini AI service error: {e}")
+            raise Exception(f"Gemini AI service error: {e}") from e
+
+    def complete_json(self, prompt: str, system_message: Optional[str] = None, model: Optional[str] = None) -> str:
+        """complete with decoding constrained to SOAP_RESPONSE_SCHEMA when the SDK supports it"""
+        try:
+            response = self._model_for(system_message, model).generate_content(
+                self._prompt_for(prompt, system_message), generation_config=self._json_config or None
+            )
+            return response.text
+
+        except Exception as e:
+            logging.error(f"Gemini AI request failed: {e}")
+            raise Exception(f"Gemini AI service error: {e}") from e
+
+    async def complete_json_async(self, prompt: str, system_message: Optional[str] = None, model: Optional[str] = None) -> str:
+        """Async counterpart of complete_json"""
+        try:
+            response = await self._model_for(system_message, model).generate_content_async(
+                self._prompt_for(prompt, system_message), generation_config=self._json_config or None
+            )
+            return response.text
+
+        except Exception as e:
+            logging.error(f"Gemini AI request failed: {e}")
+            raise Exception(f"Gemini AI service error: {e}") from e
+
+    async def complete_async(self, prompt: str, system_message: Optional[str] = None, model: Optional[str] = None) -> str:
+        """Async counterpart of complete that awaits the model call"""
+        try:
+            response = await self._model_for(system_message, model).generate_content_async(self._prompt_for(prompt, system_message))
+            return response.text
+
+        except Exception as e:
+            logging.error(f"Gemini AI request failed: {e}")
+            raise Exception(f"Gemini AI service error: {e}") from e
     
-    def chat_complete(self, messages: List[Dict[str, str]], triage_context: Optional[Dict] = None) -> str:
+    def chat_complete(self, messages: List[Dict[str, str]], triage_context: Optional[Dict] = None, model: Optional[str] = None) -> str:
         """Run chat conversation with message history and triage context"""
         try:
             # Start a chat session
-            chat = self.model.start_chat(history=[])
-            
-            # Build context-aware prompt if triage info is available
-            if triage_context:
-                context_prompt = self._build_context_prompt(triage_context, messages)
-                response = chat.send_message(context_prompt)
-            else:
-                # Send the last message (most recent) to get response
-                last_message = messages[-1]["content"]
-                response = chat.send_message(last_message)
-
-            text_response = getattr(response, "text", None)
-            if text_response:
-                return text_response
-
-            # Fallback: concatenate candidate content if available
-            candidates = getattr(response, "candidates", None)
-            if candidates:
-                parts = []
-                for candidate in candidates:
-                    content = getattr(candidate, "content", None)
-                    if content and getattr(content, "parts", None):
-                        parts.extend(str(part) for part in content.parts)
-                if parts:
-                    return "\n".join(parts)
-
-            return str(response)
+            system_message, message = self.build_chat_request(messages, triage_context)
+            chat = self._model_for(system_message, model).start_chat(history=[])
+            response = chat.send_message(self._prompt_for(message, system_message))
+            return self._extract_text(response)
             
         except Exception as e:
             logging.error(f"Gemini chat failed: {e}")
-            raise Exception(f"Gemini chat error: {e}")
-    
-    def _build_context_prompt(self, triage_context: Dict, messages: List[Dict[str, str]]) -> str:
-        """Build a prompt that includes triage context"""
-        age = triage_context.get('age')
-        age_text = age if age is not None else 'Not specified'
-        severity = triage_context.get('severity')
-        severity_text = severity if severity is not None else 'Not specified'
-        duration = triage_context.get('duration') or 'Not specified'
-        gender = triage_context.get('gender') or 'Not specified'
-        medical_history = triage_context.get('medical_history') or 'None provided'
-        current_medications = triage_context.get('current_medications') or 'None provided'
-        initial_symptoms = triage_context.get('symptoms') or 'Not specified'
-
-        context_info = f"""
-You are a professional healthcare assistant specialized in patient triage. 
-Provide accurate, clinically appropriate SOAP notes. Be concise but thorough.
-Focus on patient safety and appropriate next steps. 
-Your goal is to create a complete SOAP note of the case, ask the nescessary questions to complete and return the SOAP note. 
-Please format your response exactly like this:
-Subjective: [patient symptoms description]
-Objective: [clinical observations] 
-Assessment: [clinical impression and priority]
-Plan: [recommended actions]
-Next Step: [specific recommendation]
-Summary: [humanized summary of the response]
-
-PATIENT TRIAGE CONTEXT (remember this information):
-- Age: {age_text}
-- Severity: {severity_text}
-- Duration: {duration}
-- Gender: {gender}
-- Initial Symptoms: {initial_symptoms}
-- Medical History: {medical_history}
-- Current Medications: {current_medications}
-- Current Assessment: {triage_context.get('assessment', 'Not assessed')}
-- Current Plan: {triage_context.get('plan', 'No plan yet')}
-
-CONVERSATION HISTORY:
-"""
-        
-        # Add conversation history
-        for msg in messages:
-            role = "Patient" if msg["role"] == "user" else "Assistant"
-            context_info += f"{role}: {msg['content']}\n"
-        
-        context_info += "\nPlease continue the conversation while keeping the patient's triage context in mind."
-        
-        return context_info
+            raise Exception(f"Gemini chat error: {e}") from e
+
+    async def chat_complete_async(self, messages: List[Dict[str, str]], triage_context: Optional[Dict] = None, model: Optional[str] = None) -> str:
+        """Async counterpart of chat_complete that awaits the model call"""
+        try:
+            system_message, message = self.build_chat_request(messages, triage_context)
+            chat = self._model_for(system_message, model).start_chat(history=[])
+            response = await chat.send_message_async(self._prompt_for(message, system_message))
+            return self._extract_text(response)
+
+        except Exception as e:
+            logging.error(f"Gemini chat failed: {e}")
+            raise Exception(f"Gemini chat error: {e}") from e
+
+    def chat_complete_stream(self, messages: List[Dict[str, str]], triage_context: Optional[Dict] = None, model: Optional[str] = None) -> Iterator[str]:
+        """Run chat conversation yielding text chunks as the model produces them"""
+        try:
+            system_message, message = self.build_chat_request(messages, triage_context)
+            chat = self._model_for(system_message, model).start_chat(history=[])
+            response = chat.send_message(self._prompt_for(message, system_message), stream=True)
+            for chunk in response:
+                text = getattr(chunk, "text", None)
+                if text:
+                    yield text
+
+        except Exception as e:
+            logging.error(f"Gemini chat stream failed: {e}")
+            raise Exception(f"Gemini chat error: {e}") from e
+
+    def _extract_text(self, response: Any) -> str:
+        """Extract text from a chat response"""
+        text_response = getattr(response, "text", None)
+        if text_response:
+            return text_response
+
+        # Fallback: concatenate candidate content if available
+        candidates = getattr(response, "candidates", None)
+        if candidates:
+            parts = []
+            for candidate in candidates:
+                content = getattr(candidate, "content", None)
+                if content and getattr(content, "parts", None):
+                    parts.extend(str(part) for part in content.parts)
+            if parts:
+                return "\n".join(parts)
+
+        return str(response)
+
+
+# Providers selectable with AGENT_PROVIDER
+AI_PROVIDERS = {
+    "gemini": GeminiAIProvider,
+    "mock": MockAIProvider,
+}
 
 class Agent:
     """Main Agent class that integrates with your Flask app"""
     
     def __init__(self):
-        self.ai_provider = self._create_ai_provider()
+        # Before the provider, so a failing provider can be logged
         self.logger = self._setup_logging()
-        # Store triage sessions in memory (in production, use a database)
-        self.triage_sessions = {}
+        self.ai_provider = self._create_ai_provider()
+        # Bounded store of triage sessions, evicted by LRU and idle TTL
+        self.session_store = create_session_store()
+        # Parsed SOAP responses keyed on the normalized triage input
+        self.response_cache = create_response_cache()
+        # Responses of differently worded triages in the same age band and
+        # severity bucket (off unless SEMANTIC_CACHE_MAX_ENTRIES > 0)
+        self.semantic_cache = create_semantic_cache()
+        # Identical triage prompts in flight share one upstream call
+        self.inflight_requests = SingleFlight()
+        # Chat turns beyond this many (estimated) tokens are condensed
+        self.chat_token_budget = int(os.getenv('CHAT_CONTEXT_TOKEN_BUDGET', '2000'))
+        # Append-only record of every session and turn; rebuilds sessions the
+        # store no longer holds (None when CONVERSATION_LOG_PATH is unset)
+        self.conversation_log = create_conversation_log(self.chat_token_budget)
+        # Ask for a JSON SOAP object instead of free text; the text parser
+        # stays as the fallback. Cached responses are keyed on the prompt
+        # version, so bump it in prompts.py when the prompt or parser changes.
+        self.structured_output = os.getenv('AI_STRUCTURED_OUTPUT', 'true').strip().lower() in ('1', 'true', 'yes')
+        self.soap_prompt = SOAP_JSON_PROMPT if self.structured_output else SOAP_PROMPT
+        # Worker threads used by run_batch / iter_batch
+        self.batch_max_workers = int(os.getenv('BATCH_MAX_WORKERS', '8'))
+        self.tracer = create_tracer()
+        # Cap concurrent upstream calls so spikes queue instead of fanning out
+        self.provider_limiter = ConcurrencyLimiter(int(os.getenv('AI_MAX_CONCURRENCY', '16')))
+        # Rate limit and severity-ordered queue in front of the provider
+        self.admission = create_admission_controller()
+        # Model choice per operation, each model with its own deadlines,
+        # retries and circuit breaker. Every attempt holds a limiter slot, and
+        # one that overruns its deadline keeps it until the SDK returns.
+        self.model_router = create_model_router(
+            self.ai_provider.model_name, max_workers=2 * self.provider_limiter.max_in_flight,
+            limiter=self.provider_limiter,
+        )
+        # Clear-cut red-flag cases are answered from a rule table without the
+        # model (None when TRIAGE_RULES_ENABLED is false). With enrichment on,
+        # the model still runs in the background and its assessment and plan
+        # replace the templated ones in the session used by /chat.
+        self.rule_engine = create_rule_engine()
+        self.rule_enrichment = os.getenv('TRIAGE_RULES_ENRICH', 'true').strip().lower() in ('1', 'true', 'yes')
+        enrich_workers = int(os.getenv('TRIAGE_RULES_ENRICH_WORKERS', '2'))
+        self._enrich_pool = ThreadPoolExecutor(max_workers=enrich_workers, thread_name_prefix="triage-enrich")
+        # Enrichments queued or running; beyond this they are skipped
+        self._enrich_slots = threading.BoundedSemaphore(32 * enrich_workers)
+        self._register_gauges()
     
-    def _create_ai_provider(self):
-        """Create AI provider - only Gemini supported now"""
+    def _create_ai_provider(self) -> AIProvider:
+        """Create the AI provider named by AGENT_PROVIDER (default: gemini)"""
+        provider_name = os.getenv('AGENT_PROVIDER', 'gemini').strip().lower()
+        provider_class = AI_PROVIDERS.get(provider_name)
+        if provider_class is None:
+            raise ValueError(f"Unknown AGENT_PROVIDER '{provider_name}' (expected one of: {', '.join(AI_PROVIDERS)})")
         try:
-            return GeminiAIProvider()
+            return provider_class()
         except Exception as e:
-            print(f"Failed to initialize Gemini: {e}")
+            self.logger.error(f"Failed to initialize {provider_name} provider: {e}")
             raise
     
+    def _register_gauges(self):
+        """Expose store, cache and concurrency state on /metrics"""
+        REGISTRY.gauge("triage_session_store_size", "Sessions currently stored",
+                       lambda: self.session_store.stats()["size"])
+        REGISTRY.gauge("triage_response_cache_size", "Entries in the response cache",
+                       lambda: len(self.response_cache))
+        REGISTRY.gauge("triage_response_cache_hit_rate", "Response cache hits / lookups since start",
+                       lambda: self.response_cache.stats()["hit_rate"])
+        REGISTRY.gauge("triage_semantic_cache_size", "Entries in the near-duplicate cache",
+                       lambda: len(self.semantic_cache))
+        REGISTRY.gauge("triage_semantic_cache_hit_rate", "Near-duplicate cache hits / lookups since start",
+                       lambda: self.semantic_cache.stats()["hit_rate"])
+        REGISTRY.gauge("triage_single_flight_coalesced_total", "Requests that joined an identical in-flight call",
+                       lambda: self.inflight_requests.coalesced)
+        REGISTRY.gauge("triage_provider_in_flight", "Provider calls currently running",
+                       lambda: self.provider_limiter.in_flight)
+        REGISTRY.gauge("triage_provider_waiting", "Requests waiting for a provider slot",
+                       lambda: self.provider_limiter.waiting)
+        REGISTRY.gauge("triage_admission_queue_depth", "Calls queued for an upstream rate-limit token",
+                       lambda: self.admission.queue_depth)
+        if self.conversation_log is not None:
+            REGISTRY.gauge("triage_conversation_log_queue_depth", "Conversation events waiting for the writer",
+                           lambda: self.conversation_log.queue_depth)
+        REGISTRY.gauge("triage_circuit_breaker_state", "Worst upstream breaker: 0 closed, 1 half-open, 2 open",
+                       lambda: CircuitBreaker.STATE_VALUES[self.model_router.breaker_state])
+
     def _setup_logging(self) -> logging.Logger:
         """Setup logging"""
         logger = logging.getLogger("TriageAgent")
@@ -210,337 +367,748 @@ class Agent:
 
         return normalized
     
-    def run(self, data: Dict[str, Any]) -> Dict[str, Any]:
+    def run(self, data: Dict[str, Any], use_cache: bool = True) -> Dict[str, Any]:
         """
         Main method called by your Flask app for triage.
         Expects data with: symptoms, severity, duration, age, gender, medical_history, current_medications
         Returns response in the exact format your frontend expects.
+        Pass use_cache=False to skip cached responses and ask the model again.
         """
         request_id = str(uuid.uuid4())
-        start_time = datetime.now()
+        timer = start_request("generate_summary")
+
+        try:
+            triage_input, cache_key, response = self._start_triage(request_id, timer, data, use_cache)
+            if response is not None:
+                return response
+
+            # Generate AI response, joining an identical call already in flight
+            shared_response, coalesced = self.inflight_requests.do(
+                cache_key, lambda: self._generate_ai_response(triage_input)
+            )
+            return self._finish_generated_triage(request_id, timer, triage_input, cache_key, shared_response, coalesced)
+            
+        except AdmissionRejected as e:
+            self._reject_request(request_id, timer, e)
+            raise
+        except Exception as e:
+            return self._triage_error(request_id, timer, data, e)
+
+    async def arun(self, data: Dict[str, Any], use_cache: bool = True) -> Dict[str, Any]:
+        """Async counterpart of run used by the ASGI server; session I/O runs in a worker thread"""
+        request_id = str(uuid.uuid4())
+        timer = start_request("generate_summary")
 
         try:
-            # Normalize incoming triage data
+            triage_input, cache_key, response = await asyncio.to_thread(
+                self._start_triage, request_id, timer, data, use_cache
+            )
+            if response is not None:
+                return response
+
+            shared_response, coalesced = await self.inflight_requests.do_async(
+                cache_key, lambda: self._agenerate_ai_response(triage_input)
+            )
+            return await asyncio.to_thread(
+                self._finish_generated_triage, request_id, timer, triage_input, cache_key, shared_response, coalesced
+            )
+
+        except AdmissionRejected as e:
+            self._reject_request(request_id, timer, e)
+            raise
+        except Exception as e:
+            return self._triage_error(request_id, timer, data, e)
+
+    def _start_triage(self, request_id: str, timer: RequestTimer, data: Dict[str, Any], use_cache: bool):
+        """Normalize the input and answer from the rules or the caches.
+
+        Returns (triage_input, cache_key, response); response is the finished
+        reply when no model call is needed, else None.
+        """
+        # Normalize incoming triage data
+        with timer.stage("normalize"):
             triage_input = self._normalize_triage_input(data)
 
-            # Generate AI response
-            response = self._generate_ai_response(triage_input)
+        # Clear-cut cases skip the cache and the model altogether
+        response = self._rule_response(triage_input, timer)
+        if response is not None:
+            return triage_input, None, self._finish_rule_triage(request_id, timer, triage_input, response)
+
+        # Reuse a recent response for an identical input
+        cache_key, response = self._get_cached_response(triage_input, use_cache)
+        cache_hit = response is not None
+        semantic_hit = False
+        if not cache_hit:
+            # Then a recent response to a differently worded, similar triage
+            response = self._get_similar_response(triage_input, use_cache)
+            semantic_hit = response is not None
+        if response is None:
+            return triage_input, cache_key, None
+        return triage_input, cache_key, self._finish_triage(request_id, timer, triage_input, response, cache_hit,
+                                                            semantic_hit=semantic_hit)
+
+    def _finish_generated_triage(self, request_id: str, timer: RequestTimer, triage_input: Dict[str, Any], cache_key: str, shared_response: Dict[str, Any], coalesced: bool) -> Dict[str, Any]:
+        """Cache a fresh model response (the leader's job) and finish the triage"""
+        if not coalesced and not shared_response.get("degraded"):
+            self.response_cache.put(cache_key, shared_response)
+            self._remember_similar(triage_input, shared_response)
+        # Every caller attaches its own metadata to a private copy
+        return self._finish_triage(request_id, timer, triage_input, dict(shared_response), coalesced=coalesced)
+
+    def run_batch(self, items: List[Any], max_workers: Optional[int] = None, use_cache: bool = True) -> List[Dict[str, Any]]:
+        """Run triage for a list of payloads; one result per item, in input order"""
+        return list(self.iter_batch(items, max_workers, use_cache))
+
+    def iter_batch(self, items: Iterable[Any], max_workers: Optional[int] = None, use_cache: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Lazily run triage over an iterable of payloads on a bounded worker pool.
+        Yields {"index", "status", "result"/"error"} per item in input order.
+        Items that are exceptions (e.g. undecodable input lines) are reported as errors.
+        """
+        workers = max_workers or self.batch_max_workers
+        return iter_ordered(
+            lambda indexed: self.run_batch_item(*indexed, use_cache=use_cache),
+            enumerate(items),
+            workers,
+        )
+
+    def aiter_batch(self, items: AsyncIterable[Any], max_workers: Optional[int] = None, use_cache: bool = True) -> AsyncIterator[Dict[str, Any]]:
+        """Async counterpart of iter_batch; at most max_workers items run at once"""
+
+        async def indexed():
+            index = 0
+            async for item in items:
+                yield index, item
+                index += 1
+
+        return aiter_ordered(
+            lambda pair: self.arun_batch_item(*pair, use_cache=use_cache),
+            indexed(),
+            max_workers or self.batch_max_workers,
+        )
+
+    def run_batch_item(self, index: int, item: Any, use_cache: bool = True) -> Dict[str, Any]:
+        """Run one batch item without letting it fail the whole batch"""
+        invalid = self._invalid_batch_item(index, item)
+        if invalid is not None:
+            return invalid
+        try:
+            result = self.run(item, use_cache=use_cache)
+        except AdmissionRejected as e:
+            return self._rejected_batch_item(index, e)
+        return self._batch_item_result(index, result)
+
+    async def arun_batch_item(self, index: int, item: Any, use_cache: bool = True) -> Dict[str, Any]:
+        """Async counterpart of run_batch_item"""
+        invalid = self._invalid_batch_item(index, item)
+        if invalid is not None:
+            return invalid
+        try:
+            result = await self.arun(item, use_cache=use_cache)
+        except AdmissionRejected as e:
+            return self._rejected_batch_item(index, e)
+        return self._batch_item_result(index, result)
+
+    def _invalid_batch_item(self, index: int, item: Any) -> Optional[Dict[str, Any]]:
+        if isinstance(item, Exception):
+            return {"index": index, "status": "error", "error": str(item)}
+        if not isinstance(item, dict):
+            return {"index": index, "status": "error", "error": "Item must be a JSON object"}
+        return None
+
+    def _rejected_batch_item(self, index: int, error: AdmissionRejected) -> Dict[str, Any]:
+        return {"index": index, "status": "rejected", "error": str(error), "retry_after": round(error.retry_after, 3)}
+
+    def _batch_item_result(self, index: int, result: Dict[str, Any]) -> Dict[str, Any]:
+        if "error" in result:
+            return {"index": index, "status": "error", "error": result["error"], "result": result}
+        return {"index": index, "status": "ok", "result": result}
+
+    def _get_cached_response(self, triage_input: Dict[str, Any], use_cache: bool):
+        """Return the cache key and the cached response, if any"""
+        cache_key = make_cache_key(triage_input, self.model_router.summary_model, self.soap_prompt.key)
+        if not use_cache:
+            return cache_key, None
+        return cache_key, self.response_cache.get(cache_key)
+
+    def _semantic_namespace(self) -> str:
+        return f"{self.model_router.summary_model}:{self.soap_prompt.key}"
 
-            # Calculate latency
-            latency = f"{(datetime.now() - start_time).total_seconds():.3f}s"
+    def _get_similar_response(self, triage_input: Dict[str, Any], use_cache: bool) -> Optional[Dict[str, Any]]:
+        """Cached response of a near-duplicate triage, with the patient-worded sections rebuilt"""
+        if not use_cache or not self.semantic_cache.enabled:
+            return None
+        with stage("semantic_cache"):
+            found = self.semantic_cache.get(triage_input, self._semantic_namespace())
+        if found is None:
+            return None
+        response, similarity = found
+        # Only the clinical judgement is reused; anything quoting the other
+        # patient's own words is rebuilt from this input
+        defaults = self._soap_defaults(triage_input)
+        response.update({
+            "subjective": defaults["subjective"],
+            "objective": defaults["objective"],
+            "summary": f"{defaults['subjective']}. {response.get('assessment', '')}".strip(),
+            "semantic_similarity": round(similarity, 4),
+        })
+        return response
 
-            # Store triage session for future chat conversations
-            session_id = str(uuid.uuid4())
-            self.triage_sessions[session_id] = {
+    def _remember_similar(self, triage_input: Dict[str, Any], response: Dict[str, Any]):
+        # Keyword fallbacks are not worth serving to other inputs
+        if response.get("parse_path") != "fallback":
+            self.semantic_cache.put(triage_input, response, self._semantic_namespace())
+
+    def _finish_triage(self, request_id: str, timer: RequestTimer, triage_input: Dict[str, Any], response: Dict[str, Any], cache_hit: bool = False, coalesced: bool = False, semantic_hit: bool = False) -> Dict[str, Any]:
+        """Store the triage session and attach response metadata"""
+        # Calculate latency
+        latency = timer.latency_text()
+
+        # Store triage session for future chat conversations
+        session_id = str(uuid.uuid4())
+        with timer.stage("session_update"):
+            session = TriageSession(
                 **triage_input,
-                'assessment': response.get('assessment', ''),
-                'plan': response.get('plan', ''),
-                'created_at': datetime.now().isoformat()
-            }
-
-            # Log successful request
-            self._log_request(request_id, "success", latency)
-
-            # Add metadata to response
-            response.update({
-                "request_id": request_id,
-                "session_id": session_id,  # Important: This links triage to chat
-                "latency": latency,
-                "timestamp": datetime.now().isoformat(),
-                "ai_provider": "GeminiAI",
-                "model_used": self.ai_provider.model_name,
-                "triage_input": triage_input
-            })
-
-            return response
-            
+                assessment=response.get('assessment', ''),
+                plan=response.get('plan', ''),
+                created_at=datetime.now().isoformat()
+            )
+            self.session_store.put(session_id, session)
+            if self.conversation_log is not None:
+                self.conversation_log.log_session(session_id, session)
+        outcome = "degraded" if response.get("degraded") else "success"
+        timer.finish(outcome)
+
+        # Log successful request
+        self._log_request(request_id, outcome, latency)
+
+        # Add metadata to response
+        response.update({
+            "request_id": request_id,
+            "session_id": session_id,  # Important: This links triage to chat
+            "latency": latency,
+            "timestamp": datetime.now().isoformat(),
+            "ai_provider": self.ai_provider.display_name,
+            "model_used": response.get("model_used", self.model_router.summary_model),
+            "cache_hit": cache_hit,
+            "semantic_hit": semantic_hit,
+            "coalesced": coalesced,
+            "triage_input": triage_input
+        })
+
+        return response
+
+    def _rule_response(self, triage_input: Dict[str, Any], timer: RequestTimer) -> Optional[Dict[str, Any]]:
+        """Templated SOAP response when a pre-triage rule matches, else None"""
+        if self.rule_engine is None:
+            return None
+        with timer.stage("rules"):
+            rule = self.rule_engine.match(triage_input)
+            if rule is None:
+                return None
+            response = self.rule_engine.respond(rule, triage_input)
+        PARSE_PATHS.inc("rules")
+        return {**response, "model_used": None, "parse_path": "rules"}
+
+    def _finish_rule_triage(self, request_id: str, timer: RequestTimer, triage_input: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+        """Finish a rule-answered triage and queue the model call that enriches its session"""
+        response = self._finish_triage(request_id, timer, triage_input, response)
+        response["enrichment"] = self._schedule_enrichment(response["session_id"], triage_input, response["assessment"])
+        return response
+
+    def _schedule_enrichment(self, session_id: str, triage_input: Dict[str, Any], rule_assessment: str) -> str:
+        """Run the model for a rule-answered triage in the background; returns pending/skipped/disabled"""
+        if not self.rule_enrichment:
+            return "disabled"
+        if not self._enrich_slots.acquire(blocking=False):
+            RULE_ENRICHMENTS.inc("skipped")
+            return "skipped"
+        self._enrich_pool.submit(self._enrich_session, session_id, triage_input, rule_assessment)
+        return "pending"
+
+    def _enrich_session(self, session_id: str, triage_input: Dict[str, Any], rule_assessment: str):
+        """Replace the templated assessment and plan of a session with the model's"""
+        try:
+            # Nobody waits on this call, so it queues behind every client request
+            # and is shed first when the rate limit is tight
+            response = self._generate_ai_response(triage_input, priority=BACKGROUND_PRIORITY)
+        except AdmissionRejected as e:
+            self.logger.info(f"Enrichment of rule-answered session {session_id} shed: {e}")
+            RULE_ENRICHMENTS.inc("shed")
+            return
         except Exception as e:
-            latency = f"{(datetime.now() - start_time).total_seconds():.3f}s"
-            self._log_request(request_id, f"error: {str(e)}", latency)
-            
-            return {
-                "subjective": f"Patient reports: {data.get('symptoms', '')}",
-                "objective": "Evaluation unavailable",
-                "assessment": "Service temporarily unavailable",
-                "plan": "Please try again later",
-                "nextStep": "Contact support",
-                "start_chat": False,
-                "error": str(e),
-                "request_id": request_id,
-                "latency": latency,
-                "timestamp": datetime.now().isoformat()
-            }
+            self.logger.warning(f"Enrichment of rule-answered session {session_id} failed: {e}")
+            RULE_ENRICHMENTS.inc("failed")
+            return
+        finally:
+            self._enrich_slots.release()
+        if response.get("degraded"):
+            RULE_ENRICHMENTS.inc("degraded")
+            return
+
+        def enrich(session: TriageSession) -> Optional[TriageSession]:
+            # A chat turn that already updated the session wins
+            if session.assessment != rule_assessment:
+                return None
+            session.assessment = response.get('assessment') or session.assessment
+            session.plan = response.get('plan') or session.plan
+            session.last_summary = response.get('summary') or session.last_summary
+            session.updated_at = datetime.now().isoformat()
+            return session
+
+        # Brings back a session the store evicted, from the conversation log
+        if self._load_session(session_id) is None:
+            RULE_ENRICHMENTS.inc("stale")
+            return
+        session = self.session_store.update(session_id, enrich)
+        if session is None:
+            RULE_ENRICHMENTS.inc("stale")
+            return
+        if self.conversation_log is not None:
+            self.conversation_log.log_session(session_id, session)
+        RULE_ENRICHMENTS.inc("updated")
+
+    def _triage_error(self, request_id: str, timer: RequestTimer, data: Dict[str, Any], error: Exception) -> Dict[str, Any]:
+        """Build the fallback triage response"""
+        latency = timer.latency_text()
+        timer.finish("error")
+        self._log_request(request_id, f"error: {str(error)}", latency)
+        
+        return {
+            "subjective": f"Patient reports: {data.get('symptoms', '')}",
+            "objective": "Evaluation unavailable",
+            "assessment": "Service temporarily unavailable",
+            "plan": "Please try again later",
+            "nextStep": "Contact support",
+            "start_chat": False,
+            "error": str(error),
+            "request_id": request_id,
+            "latency": latency,
+            "timestamp": datetime.now().isoformat()
+        }
     
-    def run_chat(self, payload: Any, session_id: Optional[str] = None) -> Dict[str, Any]:
+    def run_chat(self, payload: Any, session_id: Optional[str] = None, trace: Optional[str] = None) -> Dict[str, Any]:
         """
         Run chat conversation with optional triage context.
         Accepts either:
           - a plain string representing the latest user message
           - a dict containing a 'message' string or legacy 'messages' list
           - a list of message dicts in the format [{"role": "user", "content": "..."}, ...]
+        trace is the X-Trace header value ("1" or "profile") and adds span
+        timings to the response.
         Returns AI response for conversation
         """
         request_id = str(uuid.uuid4())
-        start_time = datetime.now()
+        timer = start_request("chat")
+        timer.trace = self.tracer.start(request_id, timer.endpoint, timer.started, trace)
         
         try:
-            messages: List[Dict[str, str]] = []
+            messages, triage_context, prompt_tokens = self._start_chat(payload, session_id, timer)
+
+            # Get AI response for chat with context
+            with timer.stage("upstream"):
+                model_used, ai_response_text = self.model_router.call(
+                    "chat", self.ai_provider.chat_complete, messages, triage_context, prompt_tokens=prompt_tokens,
+                    on_attempt=self._admit(self._priority(triage_context)),
+                )
+
+            return self._finish_chat(request_id, timer, session_id, messages, triage_context, ai_response_text,
+                                     model_used, prompt_tokens)
+            
+        except AdmissionRejected as e:
+            self._reject_request(request_id, timer, e)
+            raise
+        except Exception as e:
+            return self._chat_error(request_id, timer, e)
+
+    async def arun_chat(self, payload: Any, session_id: Optional[str] = None, trace: Optional[str] = None) -> Dict[str, Any]:
+        """Async counterpart of run_chat used by the ASGI server; session I/O runs in a worker thread"""
+        request_id = str(uuid.uuid4())
+        timer = start_request("chat")
+        timer.trace = self.tracer.start(request_id, timer.endpoint, timer.started, trace, profile_allowed=False)
+
+        try:
+            messages, triage_context, prompt_tokens = await asyncio.to_thread(
+                self._start_chat, payload, session_id, timer
+            )
+
+            with timer.stage("upstream"):
+                model_used, ai_response_text = await self.model_router.call_async(
+                    "chat", self.ai_provider.chat_complete_async, messages, triage_context,
+                    prompt_tokens=prompt_tokens, on_attempt=self._admit_async(self._priority(triage_context)),
+                )
+
+            return await asyncio.to_thread(
+                self._finish_chat, request_id, timer, session_id, messages, triage_context, ai_response_text,
+                model_used, prompt_tokens,
+            )
+
+        except AdmissionRejected as e:
+            self._reject_request(request_id, timer, e)
+            raise
+        except Exception as e:
+            return self._chat_error(request_id, timer, e)
+
+    def run_chat_stream(self, payload: Any, session_id: Optional[str] = None, trace: Optional[str] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Streaming variant of run_chat.
+        Yields (event, data) pairs: "token" for each text chunk, "section" when a
+        SOAP section is complete, then a single "done" (or "error") event carrying
+        the same payload run_chat would return. The session is updated once, at the end.
+        """
+        request_id = str(uuid.uuid4())
+        timer = start_request("chat_stream")
+        timer.trace = self.tracer.start(request_id, timer.endpoint, timer.started, trace)
+
+        try:
+            messages, triage_context, prompt_tokens = self._start_chat(payload, session_id, timer)
+            tracker = _SectionTracker(self, messages, triage_context)
+
+            model_used = None
+            with timer.stage("upstream"):
+                chunks = self.model_router.call_stream(
+                    "chat", self.ai_provider.chat_complete_stream, messages, triage_context, prompt_tokens=prompt_tokens,
+                    on_attempt=self._admit(self._priority(triage_context)),
+                )
+                for model_used, chunk in chunks:
+                    yield "token", {"text": chunk}
+                    for section in tracker.feed(chunk):
+                        yield "section", section
+
+            for section in tracker.close():
+                yield "section", section
+
+            yield "done", self._finish_chat(request_id, timer, session_id, messages, triage_context, tracker.text(),
+                                            model_used or self.model_router.chat_model, prompt_tokens)
+
+        except Exception as e:
+            yield "error", self._chat_error(request_id, timer, e)
+        finally:
+            # The client went away mid-stream (GeneratorExit) before "done" or "error"
+            if not timer.finished:
+                self._cancel_request(request_id, timer)
+
+    def _start_chat(self, payload: Any, session_id: Optional[str], timer: RequestTimer):
+        """Coerce the chat payload into messages, look up triage context and size the prompt.
 
-            if isinstance(payload, str):
-                message_text = payload.strip()
+        Returns (messages, triage_context, prompt_tokens).
+        """
+        with timer.stage("normalize"):
+            messages, triage_context = self._coerce_chat(payload, session_id)
+        return messages, triage_context, self._chat_prompt_tokens(messages, triage_context, timer)
+
+    def _coerce_chat(self, payload: Any, session_id: Optional[str]):
+        messages: List[Dict[str, str]] = []
+
+        if isinstance(payload, str):
+            message_text = payload.strip()
+            if not message_text:
+                raise ValueError("Message cannot be empty")
+            messages = [{"role": "user", "content": message_text}]
+        elif isinstance(payload, dict):
+            if "message" in payload and isinstance(payload["message"], str):
+                message_text = payload["message"].strip()
                 if not message_text:
                     raise ValueError("Message cannot be empty")
                 messages = [{"role": "user", "content": message_text}]
-            elif isinstance(payload, dict):
-                if "message" in payload and isinstance(payload["message"], str):
-                    message_text = payload["message"].strip()
-                    if not message_text:
-                        raise ValueError("Message cannot be empty")
-                    messages = [{"role": "user", "content": message_text}]
-                elif "messages" in payload and isinstance(payload["messages"], list):
-                    messages = payload["messages"]
-                else:
-                    raise ValueError("Payload must contain 'message' string or 'messages' list")
-            elif isinstance(payload, list):
-                messages = payload
+            elif "messages" in payload and isinstance(payload["messages"], list):
+                messages = payload["messages"]
             else:
-                raise ValueError("Unsupported payload type for chat")
+                raise ValueError("Payload must contain 'message' string or 'messages' list")
+        elif isinstance(payload, list):
+            messages = payload
+        else:
+            raise ValueError("Unsupported payload type for chat")
 
-            if not messages:
-                raise ValueError("Messages list cannot be empty")
+        if not messages:
+            raise ValueError("Messages list cannot be empty")
 
-            # Get triage context if session_id is provided
-            triage_context = None
-            if session_id and session_id in self.triage_sessions:
-                triage_context = self.triage_sessions[session_id]
-                print(f"Using triage context for session: {session_id}")
-            
-            # Get AI response for chat with context
-            ai_response_text = self.ai_provider.chat_complete(messages, triage_context)
+        # Get triage context if session_id is provided
+        triage_context = None
+        session = self._load_session(session_id) if session_id else None
+        if session is not None:
+            triage_context = session.to_dict()
+            self.logger.info(f"Using triage context for session: {session_id}")
+            # The session already holds earlier turns; only the newest one is new
+            if session.history:
+                messages = session.history + [messages[-1]]
+
+        # Keep the prompt within budget by condensing the oldest turns
+        history_summary = triage_context.get('history_summary', '') if triage_context else ''
+        messages, history_summary = fit_history(messages, history_summary, self.chat_token_budget)
+        if triage_context is not None:
+            triage_context['history_summary'] = history_summary
 
-            # Build reference data for parsing
-            last_user_message = messages[-1]["content"] if messages else ""
-            triage_reference = triage_context.copy() if isinstance(triage_context, dict) else {}
-            if "symptoms" not in triage_reference or not triage_reference.get("symptoms"):
-                triage_reference["symptoms"] = last_user_message
+        return messages, triage_context
 
-            # Parse AI response into SOAP structure
+    def _load_session(self, session_id: str) -> Optional[TriageSession]:
+        """Session from the store, or rebuilt from the conversation log and stored again"""
+        session = self.session_store.get(session_id)
+        if session is None and self.conversation_log is not None:
+            session = self.conversation_log.load_session(session_id)
+            if session is not None:
+                self.logger.info(f"Rebuilt session {session_id} from the conversation log")
+                self.session_store.put(session_id, session)
+        return session
+
+    def _chat_prompt_tokens(self, messages: List[Dict[str, str]], triage_context: Optional[Dict[str, Any]], timer: RequestTimer) -> int:
+        """Estimated prompt size, used to route long chat turns to the stronger model"""
+        with timer.stage("prompt_build"):
+            return estimate_tokens(self.ai_provider.build_chat_message(messages, triage_context))
+
+    def _chat_reference(self, messages: List[Dict[str, str]], triage_context: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Reference data used to fill defaults when parsing a chat reply"""
+        last_user_message = messages[-1]["content"] if messages else ""
+        triage_reference = triage_context.copy() if isinstance(triage_context, dict) else {}
+        if "symptoms" not in triage_reference or not triage_reference.get("symptoms"):
+            triage_reference["symptoms"] = last_user_message
+        return triage_reference
+
+    def _finish_chat(self, request_id: str, timer: RequestTimer, session_id: Optional[str], messages: List[Dict[str, str]], triage_context: Optional[Dict[str, Any]], ai_response_text: str, model_used: str, prompt_tokens: int) -> Dict[str, Any]:
+        """Parse the chat reply, update the session and attach metadata"""
+        # Build reference data for parsing
+        last_user_message = messages[-1]["content"] if messages else ""
+        triage_reference = self._chat_reference(messages, triage_context)
+
+        # Parse AI response into SOAP structure
+        with timer.stage("parse"):
             summary_sections = self._parse_ai_response(ai_response_text, triage_reference)
 
-            # Calculate latency
-            latency = f"{(datetime.now() - start_time).total_seconds():.3f}s"
-
-            # Log successful request
-            self._log_request(request_id, "chat_success", latency)
-
-            # Update stored session context if available
-            if session_id:
-                stored_session = self.triage_sessions.get(session_id, {})
-                if not isinstance(stored_session, dict):
-                    stored_session = {}
-                stored_session.update({
-                    "symptoms": stored_session.get("symptoms") or last_user_message,
-                    "assessment": summary_sections.get("assessment", stored_session.get("assessment", "")),
-                    "plan": summary_sections.get("plan", stored_session.get("plan", "")),
-                    "medical_history": stored_session.get("medical_history", ""),
-                    "current_medications": stored_session.get("current_medications", ""),
-                    "severity": stored_session.get("severity"),
-                    "duration": stored_session.get("duration"),
-                    "gender": stored_session.get("gender"),
-                    "last_summary": summary_sections.get("summary", ""),
-                    "updated_at": datetime.now().isoformat()
-                })
-                self.triage_sessions[session_id] = stored_session
-
-            summary_payload = {
-                **summary_sections,
-                "request_id": request_id,
-                "latency": latency,
-                "timestamp": datetime.now().isoformat(),
-                "ai_provider": "GeminiAI",
-                "model_used": self.ai_provider.model_name,
-                "message_count": len(messages),
-                "has_triage_context": triage_context is not None,
-                "raw_response": ai_response_text
-            }
-
-            if session_id:
-                summary_payload["session_id"] = session_id
-
-            return summary_payload
-            
-        except Exception as e:
-            latency = f"{(datetime.now() - start_time).total_seconds():.3f}s"
-            self._log_request(request_id, f"chat_error: {str(e)}", latency)
-            
-            return {
-                "response": "I apologize, but I'm having trouble responding right now. Please try again.",
-                "error": str(e),
-                "request_id": request_id,
-                "latency": latency,
-                "timestamp": datetime.now().isoformat(),
-                "has_triage_context": False
-            }
+        # Calculate latency
+        latency = timer.latency_text()
+
+        # Log successful request
+        self._log_request(request_id, "chat_success", latency)
+
+        # Update stored session context if available
+        if session_id:
+            with timer.stage("session_update"):
+                stored_session = TriageSession.from_dict(triage_context or {})
+                stored_session.symptoms = stored_session.symptoms or last_user_message
+                stored_session.assessment = summary_sections.get("assessment", stored_session.assessment)
+                stored_session.plan = summary_sections.get("plan", stored_session.plan)
+                stored_session.last_summary = summary_sections.get("summary", "")
+                stored_session.updated_at = datetime.now().isoformat()
+                # Remember the condensed reply rather than the raw model output
+                assistant_turn = {"role": "assistant", "content": stored_session.last_summary or ai_response_text[:1000]}
+                stored_session.history, stored_session.history_summary = fit_history(
+                    messages + [assistant_turn], stored_session.history_summary, self.chat_token_budget
+                )
+                self.session_store.put(session_id, stored_session)
+                if self.conversation_log is not None:
+                    self.conversation_log.log_turn(
+                        session_id, last_user_message, assistant_turn["content"], stored_session
+                    )
+
+        summary_payload = {
+            **summary_sections,
+            "request_id": request_id,
+            "latency": latency,
+            "timestamp": datetime.now().isoformat(),
+            "ai_provider": self.ai_provider.display_name,
+            "model_used": model_used,
+            "message_count": len(messages),
+            "prompt_tokens_estimate": prompt_tokens,
+            "has_triage_context": triage_context is not None,
+            "raw_response": ai_response_text
+        }
+
+        if session_id:
+            summary_payload["session_id"] = session_id
+
+        self._finish_request(timer, "success", summary_payload)
+        return summary_payload
+
+    def _chat_error(self, request_id: str, timer: RequestTimer, error: Exception) -> Dict[str, Any]:
+        """Build the fallback chat response"""
+        latency = timer.latency_text()
+        self._log_request(request_id, f"chat_error: {str(error)}", latency)
+        
+        error_payload = {
+            "response": "I apologize, but I'm having trouble responding right now. Please try again.",
+            "error": str(error),
+            "request_id": request_id,
+            "latency": latency,
+            "timestamp": datetime.now().isoformat(),
+            "has_triage_context": False
+        }
+        self._finish_request(timer, "error", error_payload)
+        return error_payload
+
+    def _reject_request(self, request_id: str, timer: RequestTimer, error: AdmissionRejected):
+        """Record a request shed by admission control; the caller re-raises"""
+        self._log_request(request_id, f"rejected ({error.status}): {error}", timer.latency_text())
+        if timer.trace is not None:
+            self.tracer.finish(timer.trace, "rejected")
+        timer.finish("rejected")
+
+    def _cancel_request(self, request_id: str, timer: RequestTimer):
+        """Record a request abandoned by its client; stops the trace's profiler"""
+        self._log_request(request_id, "cancelled", timer.latency_text())
+        if timer.trace is not None:
+            self.tracer.finish(timer.trace, "cancelled")
+        timer.finish("cancelled")
+
+    def _priority(self, triage_data: Optional[Dict[str, Any]]) -> int:
+        """Admission priority: clinical severity (1-10), higher goes first"""
+        severity = (triage_data or {}).get('severity')
+        return severity if isinstance(severity, int) else DEFAULT_PRIORITY
+
+    def _admit(self, priority: int) -> Callable[[], None]:
+        """on_attempt hook taking one admission token per upstream attempt, retries and fallback included"""
+        def admit():
+            with stage("admission"):
+                self.admission.acquire(priority)
+        return admit
+
+    def _admit_async(self, priority: int) -> Callable[[], Awaitable[None]]:
+        async def admit():
+            with stage("admission"):
+                await self.admission.acquire_async(priority)
+        return admit
+
+    def _finish_request(self, timer: RequestTimer, outcome: str, payload: Dict[str, Any]):
+        """Record request metrics and attach the trace when the request was traced"""
+        if timer.trace is not None:
+            payload["trace"] = self.tracer.finish(timer.trace, outcome)
+        timer.finish(outcome)
     
     def get_session_info(self, session_id: str) -> Optional[Dict[str, Any]]:
         """Get triage session information"""
-        return self.triage_sessions.get(session_id)
+        session = self._load_session(session_id)
+        return session.to_dict() if session is not None else None
+
+    def get_session_stats(self) -> Dict[str, Any]:
+        """Get session store size and eviction counters"""
+        stats = self.session_store.stats()
+        if self.conversation_log is not None:
+            stats["conversation_log"] = self.conversation_log.stats()
+        return stats
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Get response cache size and hit/miss counters"""
+        return {
+            **self.response_cache.stats(),
+            "single_flight": self.inflight_requests.stats(),
+            "semantic": self.semantic_cache.stats(),
+        }
     
-    def _generate_ai_response(self, triage_input: Dict[str, Any]) -> Dict[str, Any]:
-        """Generate response using AI provider"""
-        prompt = self._build_soap_prompt(triage_input)
-        system_message = self._get_system_prompt()
+    def _generate_ai_response(self, triage_input: Dict[str, Any], priority: Optional[int] = None) -> Dict[str, Any]:
+        """Generate response using AI provider; priority defaults to the triage severity"""
+        prompt, system_message = self._summary_prompt(triage_input)
+        admit = self._admit(self._priority(triage_input) if priority is None else priority)
 
-        ai_response = self.ai_provider.complete(prompt, system_message)
+        try:
+            complete = self.ai_provider.complete_json if self.structured_output else self.ai_provider.complete
+            with stage("upstream"):
+                model_used, ai_response = self.model_router.call(
+                    "summary", complete, prompt, system_message, on_attempt=admit
+                )
+        except CircuitOpenError:
+            return self._degraded_response(triage_input)
 
-        # Parse AI response into structured format
-        return self._parse_ai_response(ai_response, triage_input)
+        return self._summary_result(ai_response, model_used, triage_input)
+
+    async def _agenerate_ai_response(self, triage_input: Dict[str, Any]) -> Dict[str, Any]:
+        """Async counterpart of _generate_ai_response"""
+        prompt, system_message = self._summary_prompt(triage_input)
+
+        try:
+            complete = (self.ai_provider.complete_json_async if self.structured_output
+                        else self.ai_provider.complete_async)
+            with stage("upstream"):
+                model_used, ai_response = await self.model_router.call_async(
+                    "summary", complete, prompt, system_message,
+                    on_attempt=self._admit_async(self._priority(triage_input)),
+                )
+        except CircuitOpenError:
+            return self._degraded_response(triage_input)
+
+        return self._summary_result(ai_response, model_used, triage_input)
+
+    def _summary_prompt(self, triage_input: Dict[str, Any]) -> Tuple[str, str]:
+        with stage("prompt_build"):
+            return self._build_soap_prompt(triage_input), self._get_system_prompt()
+
+    def _summary_result(self, ai_response: str, model_used: str, triage_input: Dict[str, Any]) -> Dict[str, Any]:
+        """Parse AI response into structured format"""
+        with stage("parse"):
+            sections, parse_path = self._parse_summary(ai_response, triage_input)
+        return {**sections, "model_used": model_used, "parse_path": parse_path}
 
     def _build_soap_prompt(self, triage_input: Dict[str, Any]) -> str:
         """Build SOAP format prompt for AI"""
         age = triage_input.get('age')
         severity = triage_input.get('severity')
-        duration = triage_input.get('duration')
-        gender = triage_input.get('gender')
-        medical_history = triage_input.get('medical_history')
-        current_medications = triage_input.get('current_medications')
-        symptoms = triage_input.get('symptoms', '')
-
-        age_text = age if age is not None else "Not provided"
-        severity_text = severity if severity is not None else "Not provided"
-        duration_text = duration if duration else "Not provided"
-        gender_text = gender if gender else "Not provided"
-        medical_history_text = medical_history if medical_history else "None provided"
-        current_medications_text = current_medications if current_medications else "None provided"
-
-        return f"""
-You are a professional healthcare assistant specialized in patient triage. 
-Provide accurate, clinically appropriate SOAP notes. Be concise but thorough.
-Focus on patient safety and appropriate next steps. 
-Create a clinical SOAP note for patient triage based on this information:
-
-Patient Age: {age_text}
-Reported Severity (1-10): {severity_text}
-Symptom Duration: {duration_text}
-Gender: {gender_text}
-Symptoms: {symptoms}
-Medical History: {medical_history_text}
-Current Medications: {current_medications_text}
-
-Please provide a concise SOAP note with these exact sections:
-- Subjective: Patient's reported symptoms in their own words
-- Objective: Clinical observations and vital signs
-- Assessment: Clinical impression and triage priority
-- Plan: Recommended actions
-- Next Step: Specific recommendation
-- start_chat: Boolean variable (True/False) - True if teleconsultation chat is needed
-"""
+        return self.soap_prompt.render(
+            age=age if age is not None else "Not provided",
+            severity=severity if severity is not None else "Not provided",
+            duration=triage_input.get('duration') or "Not provided",
+            gender=triage_input.get('gender') or "Not provided",
+            symptoms=triage_input.get('symptoms', ''),
+            medical_history=triage_input.get('medical_history') or "None provided",
+            current_medications=triage_input.get('current_medications') or "None provided",
+        )
     
     def _get_system_prompt(self) -> str:
         """Get system prompt for AI"""
-        return """You are a professional healthcare assistant specialized in patient triage. 
-Provide accurate, clinically appropriate SOAP notes. Be concise but thorough.
-Focus on patient safety and appropriate next steps. 
-Your goal is to create a complete SOAP note of the case, ask the nescessary questions to complete and return the SOAP note. 
-Please format your response exactly like this:
-Subjective: [patient symptoms description]
-Objective: [clinical observations] 
-Assessment: [clinical impression and priority]
-Plan: [recommended actions]
-Next Step: [specific recommendation]
-start_chat: [True/False]
-"""
+        return self.soap_prompt.system
 
     def _parse_ai_response(self, ai_response: str, triage_input: Dict[str, Any]) -> Dict[str, Any]:
         """Parse AI response into structured format"""
+        return self._parse_with_path(ai_response, triage_input, structured=False)[0]
+
+    def _parse_summary(self, ai_response: str, triage_input: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+        """Parse a /generate_summary reply and count the path taken"""
+        sections, parse_path = self._parse_with_path(ai_response, triage_input, self.structured_output)
+        PARSE_PATHS.inc(parse_path)
+        return sections, parse_path
+
+    def _parse_with_path(self, ai_response: str, triage_input: Dict[str, Any], structured: bool) -> Tuple[Dict[str, Any], str]:
+        """Return (sections, parse path); structured replies fall back to the text parser"""
+        defaults = self._soap_defaults(triage_input)
+        if structured:
+            sections = parse_soap_json(ai_response, defaults)
+            if sections is not None:
+                return sections, "json"
         try:
-            # Initialize with defaults
-            sections = {
-                "subjective": f"Patient reports: {triage_input.get('symptoms', '')}",
-                "objective": "Clinical evaluation needed",
-                "assessment": "Professional assessment required", 
-                "plan": "Follow medical advice",
-                "nextStep": "Teleconsultation recommended",
-                "summary": triage_input.get('summary', "") or triage_input.get('last_summary', ""),
-                "start_chat": False
-            }
-            
-            lines = ai_response.split('\n')
-            current_section = None
-            
-            for line in lines:
-                line = line.strip()
-                
-                # Detect section headers
-                if line.lower().startswith('subjective'):
-                    current_section = 'subjective'
-                    if ':' in line:
-                        sections['subjective'] = line.split(':', 1)[1].strip()
-                    continue
-                elif line.lower().startswith('objective'):
-                    current_section = 'objective'
-                    if ':' in line:
-                        sections['objective'] = line.split(':', 1)[1].strip()
-                    continue
-                elif line.lower().startswith('assessment'):
-                    current_section = 'assessment'
-                    if ':' in line:
-                        sections['assessment'] = line.split(':', 1)[1].strip()
-                    continue
-                elif line.lower().startswith('plan'):
-                    current_section = 'plan'
-                    if ':' in line:
-                        sections['plan'] = line.split(':', 1)[1].strip()
-                    continue
-                elif 'next step' in line.lower():
-                    current_section = 'nextStep'
-                    if ':' in line:
-                        sections['nextStep'] = line.split(':', 1)[1].strip()
-                    continue
-                elif line.lower().startswith('summary'):
-                    current_section = 'summary'
-                    if ':' in line:
-                        sections['summary'] = line.split(':', 1)[1].strip()
-                    continue
-                elif 'start_chat' in line.lower():
-                    current_section = 'start_chat'
-                    if ':' in line:
-                        start_chat_value = line.split(':', 1)[1].strip().lower()
-                        sections['start_chat'] = start_chat_value in ['true', 'yes', '1', 'verdadeiro', 'sim']
-                    continue
-                
-                # Add content to current section
-                if current_section and line and current_section != 'start_chat':
-                    if not line.startswith('-') and not line.startswith('**'):
-                        if sections[current_section] != "":
-                            sections[current_section] += " " + line
-                        else:
-                            sections[current_section] = line
-            
-            return {
-                "subjective": sections["subjective"],
-                "objective": sections["objective"],
-                "assessment": sections["assessment"],
-                "plan": sections["plan"],
-                "nextStep": sections["nextStep"],
-                "summary": sections["summary"],
-                "start_chat": sections["start_chat"]
-            }
+            return parse_soap(ai_response, defaults), "text_fallback" if structured else "text"
             
         except Exception as e:
-            print(f"AI response parsing failed: {e}")
-            print(f"AI Response was: {ai_response}")
+            self.logger.warning(f"AI response parsing failed: {e}")
+            self.logger.debug(f"AI Response was: {ai_response}")
             # Fallback response
-            return {
-                "subjective": f"Patient reports: {triage_input.get('symptoms', '')}",
-                "objective": "AI evaluation completed",
-                "assessment": "Requires professional review",
-                "plan": "Follow healthcare provider guidance",
-                "nextStep": "Teleconsultation recommended",
-                "summary": triage_input.get('summary', "") or "Summary unavailable.",
-                "start_chat": self._should_start_chat(triage_input.get('symptoms', ''))
-            }
+            return self._fallback_sections(triage_input), "fallback"
+
+    def _fallback_sections(self, triage_input: Dict[str, Any]) -> Dict[str, Any]:
+        """Keyword-based SOAP sections used when the model output is unusable"""
+        return {
+            "subjective": f"Patient reports: {triage_input.get('symptoms', '')}",
+            "objective": "AI evaluation completed",
+            "assessment": "Requires professional review",
+            "plan": "Follow healthcare provider guidance",
+            "nextStep": "Teleconsultation recommended",
+            "summary": triage_input.get('summary', "") or "Summary unavailable.",
+            "start_chat": self._should_start_chat(triage_input.get('symptoms', ''))
+        }
+
+    def _degraded_response(self, triage_input: Dict[str, Any]) -> Dict[str, Any]:
+        """Fail-fast response while the upstream circuit breaker is open"""
+        self.logger.warning("Upstream circuit breaker open; returning keyword fallback")
+        return {**self._fallback_sections(triage_input), "degraded": True, "model_used": None, "parse_path": "degraded"}
     
+    def _soap_defaults(self, triage_input: Dict[str, Any]) -> Dict[str, Any]:
+        """Section values used when the model leaves a section out"""
+        return {
+            "subjective": f"Patient reports: {triage_input.get('symptoms', '')}",
+            "objective": "Clinical evaluation needed",
+            "assessment": "Professional assessment required",
+            "plan": "Follow medical advice",
+            "nextStep": "Teleconsultation recommended",
+            "summary": triage_input.get('summary', "") or triage_input.get('last_summary', ""),
+            "start_chat": False
+        }
+
     def _should_start_chat(self, symptoms: str) -> bool:
         """Determine if chat should be started based on symptoms"""
         symptoms_lower = symptoms.lower()
@@ -549,4 +1117,27 @@ start_chat: [True/False]
     
     def _log_request(self, request_id: str, status: str, latency: str):
         """Log request information"""
-        print(f"TriageAgent - Request {request_id} - Status: {status} - Latency: {latency}")
+        self.logger.info(f"Request {request_id} - Status: {status} - Latency: {latency}")
+
+
+class _SectionTracker:
+    """Follows a streamed reply and reports each SOAP section once it is complete.
+
+    A section is complete when the next header line arrives (or the stream
+    ends). Values come from the same SoapParser that _parse_ai_response uses,
+    so streamed sections always match the final parsed summary.
+    """
+
+    def __init__(self, agent: Agent, messages: List[Dict[str, str]], triage_context: Optional[Dict[str, Any]]):
+        self._parser = SoapParser(agent._soap_defaults(agent._chat_reference(messages, triage_context)))
+        self._chunks: List[str] = []
+
+    def text(self) -> str:
+        return "".join(self._chunks)
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        self._chunks.append(chunk)
+        return [{"section": section, "content": content} for section, content in self._parser.feed(chunk)]
+
+    def close(self) -> List[Dict[str, Any]]:
+        return [{"section": section, "content": content} for section, content in self._parser.close()]
@@ -0,0 +1,91 @@
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from prompts import CHAT_PROMPT
+
+
+class AIProvider(ABC):
+    """Base class for model providers used by Agent.
+
+    Subclasses implement complete and chat_complete; the async and streaming
+    variants fall back to those when a provider has no native version.
+    ``model`` names the model to call; None means the provider's model_name.
+    """
+
+    # Name reported as "ai_provider" in responses
+    display_name = "AI"
+    model_name = ""
+    # True when system_message is sent as a system-level instruction rather
+    # than prepended to the prompt
+    supports_system_instruction = False
+    # True when complete_json constrains decoding to JSON; otherwise the
+    # prompt alone asks for it
+    supports_json_mode = False
+
+    @abstractmethod
+    def complete(self, prompt: str, system_message: Optional[str] = None, model: Optional[str] = None) -> str:
+        """Reply text for a single prompt"""
+
+    @abstractmethod
+    def chat_complete(self, messages: List[Dict[str, str]], triage_context: Optional[Dict] = None, model: Optional[str] = None) -> str:
+        """Reply text for the latest turn of a conversation"""
+
+    def complete_json(self, prompt: str, system_message: Optional[str] = None, model: Optional[str] = None) -> str:
+        """Like complete, for prompts whose reply must be a JSON object"""
+        return self.complete(prompt, system_message, model)
+
+    async def complete_async(self, prompt: str, system_message: Optional[str] = None, model: Optional[str] = None) -> str:
+        return await asyncio.to_thread(self.complete, prompt, system_message, model)
+
+    async def complete_json_async(self, prompt: str, system_message: Optional[str] = None, model: Optional[str] = None) -> str:
+        return await asyncio.to_thread(self.complete_json, prompt, system_message, model)
+
+    async def chat_complete_async(self, messages: List[Dict[str, str]], triage_context: Optional[Dict] = None, model: Optional[str] = None) -> str:
+        return await asyncio.to_thread(self.chat_complete, messages, triage_context, model)
+
+    def chat_complete_stream(self, messages: List[Dict[str, str]], triage_context: Optional[Dict] = None, model: Optional[str] = None) -> Iterator[str]:
+        yield self.chat_complete(messages, triage_context, model)
+
+    def build_chat_request(self, messages: List[Dict[str, str]], triage_context: Optional[Dict]) -> Tuple[Optional[str], str]:
+        """Return (system instruction, message) for the chat session"""
+        # Build context-aware prompt if triage info is available
+        if triage_context:
+            return CHAT_PROMPT.system, self._build_context_prompt(triage_context, messages)
+        # Send the last message (most recent) to get response
+        return None, messages[-1]["content"]
+
+    def build_chat_message(self, messages: List[Dict[str, str]], triage_context: Optional[Dict]) -> str:
+        """Build the message sent to the chat session, system instruction included"""
+        system_message, message = self.build_chat_request(messages, triage_context)
+        return f"{system_message}\n\n{message}" if system_message else message
+
+    def _build_context_prompt(self, triage_context: Dict, messages: List[Dict[str, str]]) -> str:
+        """Build a prompt that includes triage context"""
+        age = triage_context.get('age')
+        severity = triage_context.get('severity')
+        parts = [CHAT_PROMPT.render(
+            age=age if age is not None else 'Not specified',
+            severity=severity if severity is not None else 'Not specified',
+            duration=triage_context.get('duration') or 'Not specified',
+            gender=triage_context.get('gender') or 'Not specified',
+            symptoms=triage_context.get('symptoms') or 'Not specified',
+            medical_history=triage_context.get('medical_history') or 'None provided',
+            current_medications=triage_context.get('current_medications') or 'None provided',
+            assessment=triage_context.get('assessment', 'Not assessed'),
+            plan=triage_context.get('plan', 'No plan yet'),
+        )]
+
+        history_summary = triage_context.get('history_summary')
+        if history_summary:
+            parts.append(f"EARLIER CONVERSATION (condensed):\n{history_summary}\n\n")
+
+        parts.append("CONVERSATION HISTORY:\n")
+        # Add conversation history
+        for msg in messages:
+            role = "Patient" if msg["role"] == "user" else "Assistant"
+            parts.append(f"{role}: {msg['content']}\n")
+        
+        parts.append("\nPlease continue the conversation while keeping the patient's triage context in mind.")
+        
+        return "".join(parts)
@@ -1,72 +1,245 @@
-from flask import Flask, request, jsonify
-import json
+"""Flask entry point for the triage agent.
+
+create_app() builds the WSGI app; the Agent is created once per process on
+first use (or by gunicorn's post_fork hook, see gunicorn.conf.py), so a
+preloading master never holds provider clients, threads or database handles
+that would be shared across forks.
+
+    gunicorn -c gunicorn.conf.py app:app
+"""
+import time
+
+# Measured from here so reported startup covers imports as well
+_IMPORT_STARTED = time.perf_counter()
+
+from flask import Blueprint, Flask, Request, Response, request, jsonify, stream_with_context
+import math
+import os
+import threading
 from pathlib import Path
+from typing import Any, Dict, Optional
 from dotenv import load_dotenv
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.serving import WSGIRequestHandler
 from agent import Agent
+from admission import AdmissionRejected
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY
+from serialization import FastJSONProvider, dumps, loads, maybe_gzip, shape, wants_compact
+
 
-resolved_path = Path(__file__).resolve()
-candidate_paths = []
-
-# Collect .env files from current directory up to filesystem root
-for parent in resolved_path.parents:
-    candidate_paths.append(parent / ".env")
-
-# Include common locations when running inside Docker containers
-candidate_paths.extend([
-    Path("/app/.env"),
-    Path("/.env"),
-])
-
-seen = set()
-for candidate in candidate_paths:
-    if candidate in seen:
-        continue
-    seen.add(candidate)
-    if candidate.exists():
-        load_dotenv(candidate)
-        break
-else:
+def load_environment():
+    """Load the nearest .env (DOTENV_PATH, then this directory upwards, then Docker paths)"""
+    explicit = os.getenv('DOTENV_PATH')
+    if explicit:
+        load_dotenv(explicit)
+        return
+
+    resolved_path = Path(__file__).resolve()
+    # Collect .env files from current directory up to filesystem root, then
+    # common locations when running inside Docker containers
+    candidate_paths = [parent / ".env" for parent in resolved_path.parents]
+    candidate_paths.extend([Path("/app/.env"), Path("/.env")])
+
+    seen = set()
+    for candidate in candidate_paths:
+        if candidate in seen:
+            continue
+        seen.add(candidate)
+        if candidate.exists():
+            load_dotenv(candidate)
+            return
     load_dotenv()
 
-app = Flask(__name__)
 
-# Initialize agent once at startup
-agent = Agent()
+load_environment()
+
+# Body size limits, checked from Content-Length (or while reading a chunked
+# body) before anything is parsed; 0 disables
+MAX_REQUEST_BYTES = int(os.getenv('MAX_REQUEST_BYTES', str(1024 * 1024)))
+BATCH_MAX_REQUEST_BYTES = int(os.getenv('BATCH_MAX_REQUEST_BYTES', str(256 * 1024 * 1024)))
+
+
+class TriageRequest(Request):
+    """Request with a larger body limit for the batch endpoint"""
+
+    @property
+    def max_content_length(self) -> Optional[int]:
+        if self.endpoint == "triage.generate_summary_batch":
+            return BATCH_MAX_REQUEST_BYTES or None
+        return MAX_REQUEST_BYTES or None
+
+
+# How long an idle client connection stays open for the next request; pooling
+# clients (the Node backend) should drop idle sockets before this. Also the
+# default of gunicorn's keepalive, see gunicorn.conf.py
+KEEPALIVE_TIMEOUT_SECONDS = int(os.getenv('KEEPALIVE_TIMEOUT_SECONDS', '75'))
+
+
+class KeepAliveRequestHandler(WSGIRequestHandler):
+    """Development server handler that keeps HTTP/1.1 connections open between requests"""
+
+    protocol_version = "HTTP/1.1"
+    timeout = KEEPALIVE_TIMEOUT_SECONDS or None
+
+    def log_error(self, format: str, *args: Any) -> None:
+        # An idle keep-alive connection timing out is expected
+        if not format.startswith("Request timed out"):
+            super().log_error(format, *args)
+
+
+routes = Blueprint("triage", __name__)
+
+_agent: Optional[Agent] = None
+_agent_lock = threading.Lock()
+_agent_error: Optional[str] = None
+# Seconds from module import to app ready, and spent building the Agent
+startup_timings: Dict[str, Any] = {"import_seconds": round(time.perf_counter() - _IMPORT_STARTED, 4)}
+
+
+def get_agent() -> Agent:
+    """The Agent for this process, created on first call"""
+    global _agent, _agent_error
+    if _agent is not None:
+        return _agent
+    with _agent_lock:
+        if _agent is None:
+            started = time.perf_counter()
+            try:
+                agent = Agent()
+            except Exception as e:
+                _agent_error = str(e)
+                raise
+            finished = time.perf_counter()
+            startup_timings.update({
+                "pid": os.getpid(),
+                "agent_init_seconds": round(finished - started, 4),
+                "ready_seconds": round(finished - _IMPORT_STARTED, 4),
+            })
+            REGISTRY.gauge("triage_startup_seconds", "Seconds from app import to agent ready",
+                           lambda: startup_timings["ready_seconds"])
+            print(f"Agent ready in {startup_timings['agent_init_seconds'] * 1000:.0f}ms "
+                  f"({startup_timings['ready_seconds'] * 1000:.0f}ms since import, pid {os.getpid()})")
+            _agent_error = None
+            _agent = agent
+    return _agent
+
+
+def agent_ready() -> bool:
+    return _agent is not None
+
+
+def readiness():
+    """Body and status for the readiness probe; builds the Agent but never calls the model"""
+    try:
+        get_agent()
+    except Exception:
+        return {"status": "unavailable", "error": _agent_error, **startup_timings}, 503
+    return {"status": "ready", **startup_timings}, 200
+
+
+def create_app(preload_agent: bool = False) -> Flask:
+    """Build the Flask app; preload_agent creates the Agent now instead of on first use"""
+    app = Flask(__name__)
+    app.request_class = TriageRequest
+    app.json = FastJSONProvider(app)
+    app.register_blueprint(routes)
+    if preload_agent:
+        get_agent()
+    return app
+
+
+def service_error_response(data: dict, error: Exception) -> dict:
+    """Error payload returned when the agent itself raises"""
+    return {
+        "subjective": f"Patient reports: {data.get('symptoms', 'no symptoms reported')}",
+        "objective": "Evaluation unavailable",
+        "assessment": "Service error occurred",
+        "plan": "Please try again",
+        "nextStep": "Contact support",
+        "start_chat": False,
+        "error": str(error)
+    }
+
+def rejected_response(error: AdmissionRejected):
+    """Body, status and headers for a call shed by admission control"""
+    body = {"error": str(error), "reason": error.reason, "retry_after": round(error.retry_after, 3)}
+    return body, error.status, {"Retry-After": str(max(1, math.ceil(error.retry_after)))}
+
+def wants_cache_bypass(data: dict, cache_control: str) -> bool:
+    """True when the caller asked to skip the response cache"""
+    return bool(data.get('bypass_cache')) or 'no-cache' in (cache_control or '').lower()
+
+def parse_chat_request(data: dict):
+    """Extract the chat payload and session id, or an error message"""
+    message = data.get('message')
+    messages = data.get('messages')
+    session_id = data.get('session_id')
+
+    if isinstance(message, str) and message.strip():
+        return {"message": message}, session_id, None
+    if isinstance(messages, list) and len(messages) > 0:
+        return messages, session_id, None
+    return None, session_id, "message must be a non-empty string or messages array"
+
+def json_response(payload: Any, status: int = 200) -> Response:
+    return Response(dumps(payload), status=status, mimetype="application/json")
+
+def format_sse(event: str, data: dict) -> str:
+    """Encode one Server-Sent Events message"""
+    return f"event: {event}\ndata: {dumps(data).decode('utf-8')}\n\n"
 
-@app.route("/chat", methods=["POST"])
+def stream_chat_response(payload, session_id, trace=None, compact=False):
+    chat_events = get_agent().run_chat_stream(payload, session_id, trace)
+    events = (
+        format_sse(event, shape(data, compact) if event == "done" else data)
+        for event, data in chat_events
+    )
+    response = Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    # Close the agent's stream as soon as the client disconnects so it records the request
+    response.call_on_close(chat_events.close)
+    return response
+
+@routes.route("/chat", methods=["POST"])
 def chat_prompt():
     data = request.get_json()
     if data is None:
         return jsonify({"error": "No JSON data received"}), 400
     if not isinstance(data, dict):
         return jsonify({"error": "Invalid JSON format"}), 400
-    message = data.get('message')
-    messages = data.get('messages')
-    session_id = data.get('session_id')
-
-    if isinstance(message, str) and message.strip():
-        payload = {"message": message}
-    elif isinstance(messages, list) and len(messages) > 0:
-        payload = messages
-    else:
-        return jsonify({"error": "message must be a non-empty string or messages array"}), 400
+    payload, session_id, error = parse_chat_request(data)
+    if error:
+        return jsonify({"error": error}), 400
+    compact = wants_compact(data, request.headers.get('Prefer', ''))
+    if request.accept_mimetypes.best == "text/event-stream":
+        return stream_chat_response(payload, session_id, request.headers.get("X-Trace"), compact)
     try:
-        aiResponse = agent.run_chat(payload, session_id)
-        return json.dumps(aiResponse), 200, {'Content-Type': 'application/json'}
+        aiResponse = get_agent().run_chat(payload, session_id, request.headers.get("X-Trace"))
+        return json_response(shape(aiResponse, compact))
+    except AdmissionRejected as e:
+        body, status, headers = rejected_response(e)
+        return jsonify(body), status, headers
     except Exception as e:
         # Return error response in same format
-        error_response = {
-            "subjective": f"Patient reports: {data.get('symptoms', 'no symptoms reported')}",
-            "objective": "Evaluation unavailable",
-            "assessment": "Service error occurred",
-            "plan": "Please try again",
-            "nextStep": "Contact support",
-            "start_chat": False,
-            "error": str(e)
-        }
-        return json.dumps(error_response), 200, {'Content-Type': 'application/json'}
-
-@app.route("/generate_summary", methods=["POST"])
+        return json_response(service_error_response(data, e))
+
+@routes.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    data = request.get_json()
+    if data is None:
+        return jsonify({"error": "No JSON data received"}), 400
+    if not isinstance(data, dict):
+        return jsonify({"error": "Invalid JSON format"}), 400
+    payload, session_id, error = parse_chat_request(data)
+    if error:
+        return jsonify({"error": error}), 400
+    compact = wants_compact(data, request.headers.get('Prefer', ''))
+    return stream_chat_response(payload, session_id, request.headers.get("X-Trace"), compact)
+
+@routes.route("/generate_summary", methods=["POST"])
 def generate_summary():
     data = request.get_json()
     if data is None:
@@ -76,23 +249,115 @@ def generate_summary():
     
     try:
         # Run agent with the data
-        aiResponse = agent.run(data)
+        use_cache = not wants_cache_bypass(data, request.headers.get('Cache-Control', ''))
+        aiResponse = get_agent().run(data, use_cache=use_cache)
         
         # Return as JSON string (backend expects to parse it)
-        return json.dumps(aiResponse), 200, {'Content-Type': 'application/json'}
+        return json_response(shape(aiResponse, wants_compact(data, request.headers.get('Prefer', ''))))
         
+    except AdmissionRejected as e:
+        body, status, headers = rejected_response(e)
+        return jsonify(body), status, headers
     except Exception as e:
         # Return error response in same format
-        error_response = {
-            "subjective": f"Patient reports: {data.get('symptoms', 'no symptoms reported')}",
-            "objective": "Evaluation unavailable",
-            "assessment": "Service error occurred",
-            "plan": "Please try again",
-            "nextStep": "Contact support",
-            "start_chat": False,
-            "error": str(e)
-        }
-        return json.dumps(error_response), 200, {'Content-Type': 'application/json'}
+        return json_response(service_error_response(data, e))
+
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', '1000'))
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+def iter_ndjson_items(stream):
+    """Decode request lines lazily; undecodable lines become per-item errors"""
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield loads(line)
+        except ValueError as e:
+            yield ValueError(f"Invalid JSON line: {e}")
+
+def shape_batch_result(result: Dict[str, Any], compact: bool) -> Dict[str, Any]:
+    if compact and "result" in result:
+        return {**result, "result": shape(result["result"], compact)}
+    return result
+
+@routes.route("/generate_summary/batch", methods=["POST"])
+def generate_summary_batch():
+    """
+    Bulk triage. Accepts {"items": [...]} or a JSON array and returns
+    {"results": [...]} in input order. With Content-Type or Accept set to
+    application/x-ndjson the items are read and results written one per line,
+    so large batches are never held in memory.
+    """
+    use_cache = not wants_cache_bypass(request.args, request.headers.get('Cache-Control', ''))
+    compact = wants_compact(request.args, request.headers.get('Prefer', ''))
+    streaming_input = request.mimetype == NDJSON_MIMETYPE
+    streaming_output = streaming_input or request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+    if streaming_input:
+        items = iter_ndjson_items(request.stream)
+    else:
+        data = request.get_json()
+        items = data.get('items') if isinstance(data, dict) else data
+        if not isinstance(items, list):
+            return jsonify({"error": "Body must be a JSON array or an object with an 'items' array"}), 400
+        if not streaming_output and len(items) > BATCH_MAX_ITEMS:
+            return jsonify({"error": f"Batch exceeds {BATCH_MAX_ITEMS} items; use {NDJSON_MIMETYPE} streaming"}), 413
+
+    if streaming_output:
+        lines = (
+            dumps(shape_batch_result(result, compact)) + b"\n"
+            for result in get_agent().iter_batch(items, use_cache=use_cache)
+        )
+        return Response(stream_with_context(lines), mimetype=NDJSON_MIMETYPE)
+
+    results = get_agent().run_batch(items, use_cache=use_cache)
+    return json_response({"results": [shape_batch_result(result, compact) for result in results]})
+
+
+@routes.route("/sessions/stats", methods=["GET"])
+def session_stats():
+    return jsonify(get_agent().get_session_stats()), 200
+
+@routes.route("/cache/stats", methods=["GET"])
+def cache_stats():
+    return jsonify(get_agent().get_cache_stats()), 200
+
+@routes.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
+
+@routes.after_request
+def compress_response(response: Response) -> Response:
+    """Gzip large JSON bodies; streamed responses (SSE, NDJSON) are left alone"""
+    if response.is_streamed or response.mimetype != "application/json" or "Content-Encoding" in response.headers:
+        return response
+    response.vary.add("Accept-Encoding")
+    body, compressed = maybe_gzip(response.get_data(), request.headers.get("Accept-Encoding", ""))
+    if compressed:
+        response.set_data(body)
+        response.headers["Content-Encoding"] = "gzip"
+    return response
+
+@routes.app_errorhandler(RequestEntityTooLarge)
+def request_too_large(error):
+    return jsonify({"error": f"Request body exceeds {request.max_content_length} bytes"}), 413
+
+@routes.route("/healthz", methods=["GET"])
+def liveness():
+    """Liveness probe: the process is serving requests"""
+    return jsonify({"status": "ok", "agent_ready": agent_ready()}), 200
+
+@routes.route("/readyz", methods=["GET"])
+def readiness_probe():
+    """Readiness probe: the Agent is built; the model is not called"""
+    body, status = readiness()
+    return jsonify(body), status
+
+app = create_app()
 
 if __name__ == "__main__":
-    app.run(port=5000, host="0.0.0.0")
+    # Development server only; use gunicorn.conf.py or asgi.py in production
+    get_agent()
+    app.run(port=int(os.getenv('PORT', '5000')), host="0.0.0.0", threaded=True,
+            request_handler=KeepAliveRequestHandler)
@@ -0,0 +1,403 @@
+"""ASGI entry point for the triage agent.
+
+Serves the same routes as app.py, but awaits the model call instead of
+blocking a worker thread on it:
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --timeout-keep-alive 75
+
+/chat/stream sends Server-Sent Events as the reply arrives; the agent's
+stream is synchronous, so each chunk is pulled on a worker thread, and a
+client that disconnects closes it. /generate_summary/batch runs up to
+BATCH_MAX_WORKERS items at once on the event loop; NDJSON bodies are
+decoded as they arrive and NDJSON results are sent as they complete.
+
+The number of in-flight Gemini calls is capped by AI_MAX_CONCURRENCY;
+requests beyond the cap wait for a free slot; the cap is shared with any
+threads the worker runs. Session store and conversation log reads and
+writes (SQLite when configured) run on worker threads, off the event
+loop. The Agent is built during
+lifespan startup, so /readyz turns 200 as soon as the worker can serve.
+"""
+import asyncio
+import contextvars
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from admission import AdmissionRejected
+from app import (BATCH_MAX_ITEMS, BATCH_MAX_REQUEST_BYTES, MAX_REQUEST_BYTES, NDJSON_MIMETYPE, agent_ready,
+                 format_sse, get_agent, parse_chat_request, readiness, rejected_response, service_error_response,
+                 shape_batch_result, wants_cache_bypass)
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY, follow_thread
+from serialization import dumps, loads, maybe_gzip, shape, wants_compact
+
+JSON_HEADERS = [(b"content-type", b"application/json")]
+SSE_HEADERS = [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache"), (b"x-accel-buffering", b"no")]
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+async def _read_body(receive, limit: int) -> bytes:
+    """Read the request body, failing as soon as it passes limit bytes (0 = no limit)"""
+    chunks = []
+    size = 0
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if limit and size > limit:
+            raise _BodyTooLarge()
+        chunks.append(chunk)
+        more_body = message.get("more_body", False)
+    return b"".join(chunks)
+
+
+async def _send_json(send, payload: Any, status: int = 200, extra_headers: Optional[Dict[str, str]] = None,
+                     accept_encoding: str = ""):
+    body, compressed = maybe_gzip(dumps(payload), accept_encoding)
+    headers = JSON_HEADERS + [(b"vary", b"Accept-Encoding")]
+    if compressed:
+        headers.append((b"content-encoding", b"gzip"))
+    if extra_headers:
+        headers += [(key.lower().encode("latin-1"), value.encode("latin-1")) for key, value in extra_headers.items()]
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_text(send, text: str, content_type: str, status: int = 200):
+    headers = [(b"content-type", content_type.encode("latin-1"))]
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": text.encode("utf-8")})
+
+
+def _validate_json(data: Optional[Any]) -> Optional[Tuple[int, Dict[str, str]]]:
+    if data is None:
+        return 400, {"error": "No JSON data received"}
+    if not isinstance(data, dict):
+        return 400, {"error": "Invalid JSON format"}
+    return None
+
+
+def _header(scope, name: bytes) -> str:
+    for key, value in scope.get("headers", []):
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return ""
+
+
+def _media_type(value: str) -> str:
+    """First media type of a Content-Type or Accept value, without parameters"""
+    return value.split(",")[0].split(";")[0].strip().lower()
+
+
+def _accepts_event_stream(scope) -> bool:
+    return _media_type(_header(scope, b"accept")) == "text/event-stream"
+
+
+def _query(scope) -> Dict[str, str]:
+    return dict(parse_qsl(scope.get("query_string", b"").decode("latin-1")))
+
+
+async def _read_json(scope, receive, send, limit: int) -> Tuple[bool, Any]:
+    """Read and decode a JSON body; on failure sends the error response and returns (False, None)"""
+    declared = _header(scope, b"content-length")
+    try:
+        if limit and declared.isdigit() and int(declared) > limit:
+            raise _BodyTooLarge()
+        body = await _read_body(receive, limit)
+    except _BodyTooLarge:
+        await _send_json(send, {"error": f"Request body exceeds {limit} bytes"}, 413)
+        return False, None
+    try:
+        return True, loads(body) if body else None
+    except ValueError:
+        await _send_json(send, {"error": "Invalid JSON format"}, 400)
+        return False, None
+
+
+async def _watch_disconnect(receive, disconnected: asyncio.Event):
+    """Set disconnected once the client goes away; call after the body is read"""
+    while (await receive())["type"] != "http.disconnect":
+        pass
+    disconnected.set()
+
+
+async def chat_prompt(scope, data: Any) -> Tuple[int, Any]:
+    invalid = _validate_json(data)
+    if invalid:
+        return invalid
+    payload, session_id, error = parse_chat_request(data)
+    if error:
+        return 400, {"error": error}
+    try:
+        response = await get_agent().arun_chat(payload, session_id, _header(scope, b"x-trace"))
+        return 200, shape(response, wants_compact(data, _header(scope, b"prefer")))
+    except AdmissionRejected as e:
+        body, status, headers = rejected_response(e)
+        return status, body, headers
+    except Exception as e:
+        return 200, service_error_response(data, e)
+
+
+async def chat_stream(scope, receive, send):
+    """Server-Sent Events variant of /chat, like app.py's /chat/stream"""
+    ok, data = await _read_json(scope, receive, send, MAX_REQUEST_BYTES)
+    if not ok:
+        return
+    invalid = _validate_json(data)
+    if invalid:
+        status, body = invalid
+        await _send_json(send, body, status)
+        return
+    payload, session_id, error = parse_chat_request(data)
+    if error:
+        await _send_json(send, {"error": error}, 400)
+        return
+    compact = wants_compact(data, _header(scope, b"prefer"))
+
+    events = get_agent().run_chat_stream(payload, session_id, _header(scope, b"x-trace"))
+    # The agent's stream is synchronous: each event is pulled on a worker
+    # thread, always inside the same context so the request's stages are timed
+    context = contextvars.copy_context()
+    loop = asyncio.get_running_loop()
+    disconnected = asyncio.Event()
+    watcher = asyncio.ensure_future(_watch_disconnect(receive, disconnected))
+    pending = None
+    try:
+        await send({"type": "http.response.start", "status": 200, "headers": SSE_HEADERS})
+        while not disconnected.is_set():
+            pending = loop.run_in_executor(None, context.run, _pull, events)
+            item = await pending
+            if item is None:
+                break
+            event, event_data = item
+            message = format_sse(event, shape(event_data, compact) if event == "done" else event_data)
+            await send({"type": "http.response.body", "body": message.encode("utf-8"), "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        watcher.cancel()
+        # Closing an unfinished stream records the request as cancelled; a
+        # pull still running on its thread is closed once it returns
+        if pending is None or pending.done():
+            context.run(events.close)
+        else:
+            pending.add_done_callback(lambda _: context.run(events.close))
+
+
+def _pull(events):
+    # Each pull may land on a different worker; profile whichever runs it
+    with follow_thread():
+        return next(events, None)
+
+
+async def _iter_ndjson(receive, limit: int, disconnected: asyncio.Event,
+                       on_end: Callable[[], None]) -> AsyncIterator[Any]:
+    """Decode body lines as they arrive, like app.py's iter_ndjson_items.
+
+    Undecodable lines and a body past limit become per-item errors; on_end is
+    called once the whole body has been read.
+    """
+    buffered = b""
+    size = 0
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            disconnected.set()
+            return
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if limit and size > limit:
+            yield ValueError(f"Request body exceeds {limit} bytes")
+            return
+        more_body = message.get("more_body", False)
+        lines = (buffered + chunk).split(b"\n")
+        buffered = lines.pop() if more_body else b""
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield loads(line)
+            except ValueError as e:
+                yield ValueError(f"Invalid JSON line: {e}")
+    on_end()
+
+
+async def _iter_items(items) -> AsyncIterator[Any]:
+    for item in items:
+        yield item
+
+
+async def generate_summary_batch(scope, receive, send):
+    """Bulk triage, like app.py's /generate_summary/batch; NDJSON is read and written incrementally"""
+    query = _query(scope)
+    use_cache = not wants_cache_bypass(query, _header(scope, b"cache-control"))
+    compact = wants_compact(query, _header(scope, b"prefer"))
+    streaming_input = _media_type(_header(scope, b"content-type")) == NDJSON_MIMETYPE
+    streaming_output = streaming_input or _media_type(_header(scope, b"accept")) == NDJSON_MIMETYPE
+    disconnected = asyncio.Event()
+    watchers = []
+
+    def watch_disconnect():
+        watchers.append(asyncio.ensure_future(_watch_disconnect(receive, disconnected)))
+
+    if streaming_input:
+        declared = _header(scope, b"content-length")
+        if BATCH_MAX_REQUEST_BYTES and declared.isdigit() and int(declared) > BATCH_MAX_REQUEST_BYTES:
+            await _send_json(send, {"error": f"Request body exceeds {BATCH_MAX_REQUEST_BYTES} bytes"}, 413)
+            return
+        items = _iter_ndjson(receive, BATCH_MAX_REQUEST_BYTES, disconnected, watch_disconnect)
+    else:
+        ok, data = await _read_json(scope, receive, send, BATCH_MAX_REQUEST_BYTES)
+        if not ok:
+            return
+        listed = data.get('items') if isinstance(data, dict) else data
+        if not isinstance(listed, list):
+            await _send_json(send, {"error": "Body must be a JSON array or an object with an 'items' array"}, 400)
+            return
+        if not streaming_output and len(listed) > BATCH_MAX_ITEMS:
+            await _send_json(send, {"error": f"Batch exceeds {BATCH_MAX_ITEMS} items; use {NDJSON_MIMETYPE} streaming"},
+                             413)
+            return
+        items = _iter_items(listed)
+        watch_disconnect()
+
+    results = get_agent().aiter_batch(items, use_cache=use_cache)
+    try:
+        if not streaming_output:
+            collected = [shape_batch_result(result, compact) async for result in results]
+            await _send_json(send, {"results": collected}, accept_encoding=_header(scope, b"accept-encoding"))
+            return
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", NDJSON_MIMETYPE.encode("latin-1"))]})
+        async for result in results:
+            if disconnected.is_set():
+                break
+            line = dumps(shape_batch_result(result, compact)) + b"\n"
+            await send({"type": "http.response.body", "body": line, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        # Cancels items still running if the client went away
+        await results.aclose()
+        for watcher in watchers:
+            watcher.cancel()
+
+
+async def generate_summary(scope, data: Any) -> Tuple[int, Any]:
+    invalid = _validate_json(data)
+    if invalid:
+        return invalid
+    try:
+        use_cache = not wants_cache_bypass(data, _header(scope, b"cache-control"))
+        response = await get_agent().arun(data, use_cache=use_cache)
+        return 200, shape(response, wants_compact(data, _header(scope, b"prefer")))
+    except AdmissionRejected as e:
+        body, status, headers = rejected_response(e)
+        return status, body, headers
+    except Exception as e:
+        return 200, service_error_response(data, e)
+
+
+async def session_stats(scope, data: Any) -> Tuple[int, Any]:
+    return 200, await asyncio.to_thread(get_agent().get_session_stats)
+
+
+async def cache_stats(scope, data: Any) -> Tuple[int, Any]:
+    return 200, await asyncio.to_thread(get_agent().get_cache_stats)
+
+
+async def metrics(scope, data: Any) -> Tuple[int, Any]:
+    return 200, REGISTRY.render()
+
+
+async def liveness(scope, data: Any) -> Tuple[int, Any]:
+    return 200, {"status": "ok", "agent_ready": agent_ready()}
+
+
+async def readiness_probe(scope, data: Any) -> Tuple[int, Any]:
+    if agent_ready():
+        body, status = readiness()
+    else:
+        body, status = await asyncio.to_thread(readiness)
+    return status, body
+
+
+# path -> (method, handler, reads JSON body)
+ROUTES = {
+    "/chat": ("POST", chat_prompt, True),
+    "/generate_summary": ("POST", generate_summary, True),
+    "/sessions/stats": ("GET", session_stats, False),
+    "/cache/stats": ("GET", cache_stats, False),
+    "/metrics": ("GET", metrics, False),
+    "/healthz": ("GET", liveness, False),
+    "/readyz": ("GET", readiness_probe, False),
+}
+
+# path -> (method, handler); these handlers read the body and send the response themselves
+STREAMING_ROUTES = {
+    "/chat/stream": ("POST", chat_stream),
+    "/generate_summary/batch": ("POST", generate_summary_batch),
+}
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            try:
+                # Off the event loop: provider setup may block
+                await asyncio.to_thread(get_agent)
+            except Exception as e:
+                await send({"type": "lifespan.startup.failed", "message": str(e)})
+                return
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    path = scope["path"]
+    if path == "/chat" and _accepts_event_stream(scope):
+        path = "/chat/stream"
+    streaming = STREAMING_ROUTES.get(path)
+    if streaming is not None:
+        method, handler = streaming
+        if scope["method"] != method:
+            await _send_json(send, {"error": "Method not allowed"}, 405)
+            return
+        await handler(scope, receive, send)
+        return
+
+    route = ROUTES.get(path)
+    if route is None:
+        await _send_json(send, {"error": "Not found"}, 404)
+        return
+    method, handler, reads_body = route
+    if scope["method"] != method:
+        await _send_json(send, {"error": "Method not allowed"}, 405)
+        return
+
+    data = None
+    if reads_body:
+        ok, data = await _read_json(scope, receive, send, MAX_REQUEST_BYTES)
+        if not ok:
+            return
+
+    # Handlers return (status, payload) or (status, payload, extra headers)
+    status, payload, *extra = await handler(scope, data)
+    if isinstance(payload, str):
+        await _send_text(send, payload, METRICS_CONTENT_TYPE, status)
+    else:
+        await _send_json(send, payload, status, extra[0] if extra else None, _header(scope, b"accept-encoding"))
@@ -0,0 +1,49 @@
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable, Iterator, Optional
+
+
+def iter_ordered(fn: Callable[[Any], Any], items: Iterable[Any], max_workers: int,
+                 window: Optional[int] = None) -> Iterator[Any]:
+    """Apply fn to items on a thread pool, yielding results in input order.
+
+    Items are pulled lazily and at most `window` of them are in flight or
+    buffered at once, so an unbounded input stream runs in bounded memory.
+    A slow item holds back the results behind it but never the workers.
+    """
+    window = window or max_workers * 2
+    pending = deque()
+    iterator = iter(items)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="triage-batch") as executor:
+        try:
+            for item in iterator:
+                pending.append(executor.submit(fn, item))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            # Consumer stopped early (e.g. client disconnected): drop queued work
+            for future in pending:
+                future.cancel()
+
+
+async def aiter_ordered(fn: Callable[[Any], Awaitable[Any]], items: AsyncIterable[Any],
+                        max_concurrency: int) -> AsyncIterator[Any]:
+    """Coroutine counterpart of iter_ordered for an async source.
+
+    At most ``max_concurrency`` calls run at once and results are yielded in
+    input order. Calls still pending when the consumer stops are cancelled.
+    """
+    pending = deque()
+    try:
+        async for item in items:
+            pending.append(asyncio.ensure_future(fn(item)))
+            if len(pending) >= max_concurrency:
+                yield await pending.popleft()
+        while pending:
+            yield await pending.popleft()
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,95 @@
+"""Microbenchmarks for the CPU-bound steps of the triage request path.
+
+    cd app/flask-ai
+    python -m benchmarks.bench_micro -o micro.json
+
+Times _normalize_triage_input, _build_soap_prompt, _build_context_prompt
+(at several history lengths), _parse_ai_response (short and long model
+output) and a near-duplicate cache lookup in a bucket of 500 entries. Each
+case reports the best of several timeit repeats in ns/op.
+"""
+import argparse
+import timeit
+from typing import Any, Callable, Dict
+
+from benchmarks.common import emit, environment, use_mock_provider
+
+RAW_TRIAGE = {
+    "symptoms": "  Headache and fever for two days, mild nausea  ",
+    "severity": "6",
+    "duration": "2 days",
+    "age": "34.0",
+    "gender": "female",
+    "medicalHistory": "Migraine; hypertension",
+    "currentMedications": "Losartan 50mg",
+}
+
+SHORT_RESPONSE = """Subjective: Patient reports headache and fever for two days with mild nausea.
+Objective: No vital signs provided; self-reported temperature 38.2C.
+Assessment: Likely viral syndrome, moderate priority.
+Plan: Hydration, antipyretics, monitor symptoms.
+Next Step: Teleconsultation recommended
+start_chat: True"""
+
+
+def _long_response() -> str:
+    filler = " ".join(["Monitor temperature, hydration and any new neurological symptom."] * 40)
+    return SHORT_RESPONSE.replace("Plan: ", f"Plan: {filler}\n- bullet that is skipped\n", 1)
+
+
+def time_case(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number)) / number
+    return {"ns_per_op": round(best * 1e9, 1), "ops_per_s": round(1 / best, 1), "loops": number}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="timeit repeats per case (best is kept)")
+    parser.add_argument("-o", "--output", help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    use_mock_provider()
+    from agent import Agent
+
+    agent = Agent()
+    triage_input = agent._normalize_triage_input(RAW_TRIAGE)
+    context = {**triage_input, "assessment": "Likely viral syndrome", "plan": "Hydration and rest"}
+    long_response = _long_response()
+
+    cases = {
+        "normalize_triage_input": lambda: agent._normalize_triage_input(RAW_TRIAGE),
+        "build_soap_prompt": lambda: agent._build_soap_prompt(triage_input),
+        "parse_ai_response_short": lambda: agent._parse_ai_response(SHORT_RESPONSE, triage_input),
+        "parse_ai_response_long": lambda: agent._parse_ai_response(long_response, triage_input),
+    }
+    from semantic_cache import SemanticCache
+
+    semantic_cache = SemanticCache(max_entries=1000)
+    # Same clinical terms as the lookup, so all 500 land in its bucket and get scored
+    for index in range(500):
+        semantic_cache.put({**triage_input, "symptoms": f"{triage_input['symptoms']} (report {index}, day {index % 9})"},
+                           {"assessment": "Synthetic"})
+    cases["semantic_cache_lookup_500"] = lambda: semantic_cache.get(triage_input)
+
+    for history_length in (1, 10, 50):
+        messages = [
+            {"role": "user" if turn % 2 == 0 else "assistant",
+             "content": f"Message {turn}: the headache gets worse in the evening and with bright light."}
+            for turn in range(history_length)
+        ]
+        cases[f"build_context_prompt_{history_length}_messages"] = (
+            lambda messages=messages: agent.ai_provider._build_context_prompt(context, messages)
+        )
+
+    emit({
+        "benchmark": "micro",
+        "environment": environment(),
+        "config": {"repeat": args.repeat},
+        "results": {name: time_case(fn, args.repeat) for name, fn in cases.items()},
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
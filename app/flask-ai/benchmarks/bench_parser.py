@@ -0,0 +1,119 @@
+"""Regression benchmark for the SOAP response parser.
+
+    cd app/flask-ai
+    python -m benchmarks.bench_parser -o parser.json
+
+Checks Agent._parse_ai_response against soap_corpus.json: "golden" cases must
+match the outputs of the previous parser (legacy_soap_parser) exactly, and
+"fixed" cases must match their recorded expectation, where the old parser is
+known to be wrong. Streaming the same text through SoapParser in small chunks
+must give the same result, and so must parse_soap_json on the expected
+sections encoded as a structured-output reply. Then times the text parser,
+the JSON parser and the legacy parser per case in ns/op. Exits non-zero if
+any case regresses.
+
+Cases where the text parser is slower than the legacy one (speedup < 1) are
+listed under "slower" and reported on stderr, but do not fail the run:
+single timings are noisy, and on replies of a few short lines the new parser
+does work the legacy one skipped (e.g. reading "**Plan:**" headers, which the
+legacy parser dropped as bullet lines).
+"""
+import argparse
+import json
+import os
+import sys
+from typing import Any, Dict, List
+
+from benchmarks.bench_micro import time_case
+from benchmarks.common import emit, environment, use_mock_provider
+from benchmarks.legacy_soap_parser import parse_ai_response as legacy_parse
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "soap_corpus.json")
+
+
+def stream_parse(agent, text: str, reference: Dict[str, Any], chunk_chars: int) -> Dict[str, Any]:
+    from soap_parser import SoapParser
+
+    parser = SoapParser(agent._soap_defaults(reference))
+    for start in range(0, len(text), chunk_chars):
+        parser.feed(text[start:start + chunk_chars])
+    parser.close()
+    return parser.result()
+
+
+def as_json_reply(expected: Dict[str, Any]) -> str:
+    """The structured-output reply a model would send for these sections"""
+    return json.dumps(expected, ensure_ascii=False)
+
+
+def check_case(agent, case: Dict[str, Any], chunk_chars: int) -> List[str]:
+    failures = []
+    parsed = agent._parse_ai_response(case["response"], case["reference"])
+    if parsed != case["expected"]:
+        failures.append("parse")
+    if stream_parse(agent, case["response"], case["reference"], chunk_chars) != case["expected"]:
+        failures.append("stream")
+    from soap_parser import parse_soap_json
+
+    if parse_soap_json(as_json_reply(case["expected"]), agent._soap_defaults(case["reference"])) != case["expected"]:
+        failures.append("json")
+    return failures
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="timeit repeats per case (best is kept)")
+    parser.add_argument("--chunk-chars", type=int, default=7, help="chunk size for the streaming check")
+    parser.add_argument("-o", "--output", help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    use_mock_provider()
+    from agent import Agent
+
+    agent = Agent()
+    with open(CORPUS_PATH, "r", encoding="utf-8") as handle:
+        corpus = json.load(handle)
+
+    results = []
+    regressions = 0
+    for kind in ("golden", "fixed"):
+        for case in corpus[kind]:
+            failures = check_case(agent, case, args.chunk_chars)
+            regressions += bool(failures)
+            text, reference = case["response"], case["reference"]
+            new = time_case(lambda: agent._parse_ai_response(text, reference), args.repeat)
+            old = time_case(lambda: legacy_parse(text, reference), args.repeat)
+            json_text = as_json_reply(case["expected"])
+            structured = time_case(lambda: agent._parse_with_path(json_text, reference, structured=True), args.repeat)
+            speedup = round(old["ns_per_op"] / new["ns_per_op"], 2) if new["ns_per_op"] else None
+            results.append({
+                "case": case["name"],
+                "kind": kind,
+                "chars": len(text),
+                "ok": not failures,
+                "failures": failures,
+                "parser": new,
+                "json_parser": structured,
+                "legacy_parser": old,
+                "speedup": speedup,
+                "slower": speedup is not None and speedup < 1,
+            })
+
+    slower = [result["case"] for result in results if result["slower"]]
+    for result in results:
+        if result["slower"]:
+            print(f"slower than legacy: {result['case']} (speedup {result['speedup']})", file=sys.stderr)
+
+    emit({
+        "benchmark": "parser",
+        "environment": environment(),
+        "config": {"repeat": args.repeat, "chunk_chars": args.chunk_chars},
+        "regressions": regressions,
+        "slower": slower,
+        "results": results,
+    }, args.output)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""Benchmark for the pre-triage rule engine.
+
+    cd app/flask-ai
+    python -m benchmarks.bench_rules -o rules.json
+
+Times RuleEngine.match on the bundled table (a red-flag hit, a short miss
+and a long miss) against a baseline that runs one word-boundary regex per
+keyword, then repeats both on a synthetic table with --keywords keywords to
+show the automaton's cost following text length rather than table size.
+Also times Agent.run for a rule-answered triage and for one that goes to
+the (zero-latency) mock model.
+"""
+import argparse
+import re
+from typing import Any, Callable, Dict
+
+from benchmarks.bench_micro import time_case
+from benchmarks.common import emit, environment, use_mock_provider
+
+HIT = {"symptoms": "Crushing chest pain radiating to the left arm", "severity": 9, "age": 58}
+MISS = {"symptoms": "Headache and mild fever for two days", "severity": 4, "age": 34}
+LONG_MISS = {
+    "symptoms": " ".join(["Intermittent headache in the evening, worse with screens and bright light,"
+                          " some nausea after meals and poor sleep."] * 8),
+    "severity": 5,
+    "age": 41,
+}
+
+
+def regex_baseline(engine) -> Callable[[Dict[str, Any]], Any]:
+    """First matching rule by scanning one compiled regex per keyword (no negation handling)"""
+    from triage_rules import fold
+
+    patterns = [
+        (rule, [re.compile(rf"(?<!\w){re.escape(fold(keyword))}(?!\w)") for keyword in rule.keywords])
+        for rule in engine.rules
+    ]
+
+    def match(triage_input: Dict[str, Any]):
+        text = fold(triage_input["symptoms"])
+        for rule, compiled in patterns:
+            if any(pattern.search(text) for pattern in compiled) and rule.applies(triage_input):
+                return rule
+        return None
+
+    return match
+
+
+def synthetic_engine(keyword_count: int):
+    from triage_rules import RuleEngine, TriageRule
+
+    rules = [
+        TriageRule(f"synthetic_{index}", [f"redflag{index} symptom{index * 7}"], {"assessment": "Synthetic"})
+        for index in range(keyword_count)
+    ]
+    return RuleEngine(rules, negations=["no", "denies"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="timeit repeats per case (best is kept)")
+    parser.add_argument("--keywords", type=int, default=1000, help="keywords in the synthetic table")
+    parser.add_argument("-o", "--output", help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    use_mock_provider(TRIAGE_RULES_ENRICH="false")
+    from agent import Agent
+    from triage_rules import DEFAULT_RULES_PATH, load_rule_engine
+
+    engine = load_rule_engine(DEFAULT_RULES_PATH)
+    baseline = regex_baseline(engine)
+    large = synthetic_engine(args.keywords)
+    large_baseline = regex_baseline(large)
+    agent = Agent()
+
+    cases = {
+        "load_rule_table": lambda: load_rule_engine(DEFAULT_RULES_PATH),
+        "match_hit": lambda: engine.match(HIT),
+        "match_miss": lambda: engine.match(MISS),
+        "match_miss_long": lambda: engine.match(LONG_MISS),
+        "regex_baseline_hit": lambda: baseline(HIT),
+        "regex_baseline_miss": lambda: baseline(MISS),
+        "regex_baseline_miss_long": lambda: baseline(LONG_MISS),
+        f"match_miss_{args.keywords}_keywords": lambda: large.match(MISS),
+        f"regex_baseline_miss_{args.keywords}_keywords": lambda: large_baseline(MISS),
+        "agent_run_rule_hit": lambda: agent.run(HIT),
+        "agent_run_model": lambda: agent.run(MISS, use_cache=False),
+    }
+
+    emit({
+        "benchmark": "rules",
+        "environment": environment(),
+        "config": {"repeat": args.repeat, "rules": len(engine.rules), "synthetic_keywords": args.keywords},
+        "results": {name: time_case(fn, args.repeat) for name, fn in cases.items()},
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
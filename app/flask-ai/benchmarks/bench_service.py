@@ -0,0 +1,181 @@
+"""Request-path benchmark for the Flask AI service against the mock provider.
+
+    cd app/flask-ai
+    python -m benchmarks.bench_service --concurrency 1,8,32 --turns 1,5,20 -o service.json
+
+Drives /generate_summary and multi-turn /chat through the Flask test client
+(in-process, no sockets) and over real HTTP (werkzeug server on localhost).
+It reports throughput, latency percentiles, errors and RSS growth for each
+transport, endpoint and concurrency level as JSON.
+"""
+import argparse
+import http.client
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+
+from benchmarks.common import emit, environment, latency_summary, rss_bytes, use_mock_provider
+
+
+class TestClientTransport:
+    name = "test_client"
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def post(self, path: str, payload: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        # Test clients are not thread-safe; keep one per worker thread
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.post(path, json=payload)
+        return response.status_code, response.get_json(force=True)
+
+    def close(self):
+        pass
+
+
+class HttpTransport:
+    name = "http"
+
+    def __init__(self, app):
+        from werkzeug.serving import make_server
+
+        # Per-request access logs would dominate the benchmark's own output
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        self.server = make_server("127.0.0.1", 0, app, threaded=True)
+        self.port = self.server.server_port
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        self._local = threading.local()
+
+    def post(self, path: str, payload: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+        body = json.dumps(payload)
+        connection.request("POST", path, body=body, headers={"Content-Type": "application/json"})
+        response = connection.getresponse()
+        data = response.read()
+        return response.status, json.loads(data)
+
+    def close(self):
+        self.server.shutdown()
+
+
+def _is_error(status: int, body: Dict[str, Any]) -> bool:
+    return status != 200 or "error" in body
+
+
+def _run_load(concurrency: int, tasks: int, task: Callable[[int], List[Tuple[str, float, bool]]]) -> Dict[str, Any]:
+    """Run task(i) for i in range(tasks) on `concurrency` threads and aggregate samples"""
+    rss_before = rss_bytes()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        batches = list(executor.map(task, range(tasks)))
+    elapsed = time.perf_counter() - started
+    rss_after = rss_bytes()
+
+    by_kind: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    for samples in batches:
+        for kind, latency, failed in samples:
+            by_kind.setdefault(kind, []).append(latency)
+            errors[kind] = errors.get(kind, 0) + int(failed)
+
+    total = sum(len(values) for values in by_kind.values())
+    return {
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "latency": {kind: latency_summary(values) for kind, values in by_kind.items()},
+        "errors": errors,
+        "rss_before_bytes": rss_before,
+        "rss_after_bytes": rss_after,
+        "rss_growth_bytes": rss_after - rss_before,
+    }
+
+
+def bench_summary(transport, concurrency: int, requests: int, run_id: str) -> Dict[str, Any]:
+    def task(i: int):
+        # Unique symptoms per request so every call reaches the provider
+        payload = {"symptoms": f"headache and fever #{run_id}-{i}", "severity": i % 10 + 1, "age": 20 + i % 60}
+        started = time.perf_counter()
+        status, body = transport.post("/generate_summary", payload)
+        return [("generate_summary", time.perf_counter() - started, _is_error(status, body))]
+
+    return _run_load(concurrency, requests, task)
+
+
+def bench_chat(transport, concurrency: int, conversations: int, turns: int, run_id: str) -> Dict[str, Any]:
+    def task(i: int):
+        samples = []
+        status, body = transport.post("/generate_summary", {"symptoms": f"persistent cough #{run_id}-{i}", "age": 40})
+        session_id = body.get("session_id")
+        for turn in range(turns):
+            message = f"Turn {turn}: the cough is worse at night and I feel tired. Should I worry?"
+            started = time.perf_counter()
+            status, body = transport.post("/chat", {"message": message, "session_id": session_id})
+            latency = time.perf_counter() - started
+            failed = _is_error(status, body)
+            samples.append(("chat_turn", latency, failed))
+            if turn == turns - 1:
+                samples.append(("chat_last_turn", latency, failed))
+        return samples
+
+    result = _run_load(concurrency, conversations, task)
+    result["turns"] = turns
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="/generate_summary requests per level")
+    parser.add_argument("--conversations", type=int, default=32, help="chat conversations per level")
+    parser.add_argument("--turns", default="1,5,20", help="comma-separated chat conversation lengths")
+    parser.add_argument("--transport", choices=["test_client", "http", "both"], default="both")
+    parser.add_argument("--mock-latency-ms", type=float, default=20.0, help="simulated upstream latency")
+    parser.add_argument("--cache", action="store_true", help="leave the response cache enabled")
+    parser.add_argument("-o", "--output", help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    overrides = {"MOCK_LATENCY_MS": args.mock_latency_ms}
+    if not args.cache:
+        overrides["RESPONSE_CACHE_MAX_ENTRIES"] = 0
+    use_mock_provider(**overrides)
+    from app import app  # imported after the environment points at the mock provider
+
+    levels = [int(level) for level in args.concurrency.split(",") if level]
+    turn_counts = [int(turns) for turns in args.turns.split(",") if turns]
+    transports = ["test_client", "http"] if args.transport == "both" else [args.transport]
+
+    results = []
+    for transport_name in transports:
+        transport = TestClientTransport(app) if transport_name == "test_client" else HttpTransport(app)
+        try:
+            for concurrency in levels:
+                run_id = f"{transport_name}-{concurrency}"
+                results.append({"transport": transport_name, "scenario": "generate_summary",
+                                **bench_summary(transport, concurrency, args.requests, run_id)})
+                for turns in turn_counts:
+                    results.append({"transport": transport_name, "scenario": "chat",
+                                    **bench_chat(transport, concurrency, args.conversations, turns, f"{run_id}-{turns}")})
+        finally:
+            transport.close()
+
+    emit({
+        "benchmark": "service",
+        "environment": environment(),
+        "config": {**vars(args), "output": None},
+        "results": results,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
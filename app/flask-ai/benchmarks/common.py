@@ -0,0 +1,75 @@
+"""Helpers shared by the benchmark scripts."""
+import json
+import os
+import platform
+import resource
+import sys
+import time
+from typing import Any, Dict, List
+
+FLASK_AI_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if FLASK_AI_DIR not in sys.path:
+    sys.path.insert(0, FLASK_AI_DIR)
+
+
+def use_mock_provider(latency_ms: float = 0.0, **overrides: str):
+    """Point the agent at the local mock provider before app/agent are imported"""
+    os.environ['AGENT_PROVIDER'] = 'mock'
+    os.environ.setdefault('MOCK_LATENCY_MS', str(latency_ms))
+    for key, value in overrides.items():
+        os.environ[key] = str(value)
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def latency_summary(latencies_s: List[float]) -> Dict[str, float]:
+    values = sorted(latencies_s)
+    to_ms = lambda seconds: round(seconds * 1000, 3)
+    return {
+        "count": len(values),
+        "mean_ms": to_ms(sum(values) / len(values)) if values else 0.0,
+        "p50_ms": to_ms(percentile(values, 0.50)),
+        "p95_ms": to_ms(percentile(values, 0.95)),
+        "p99_ms": to_ms(percentile(values, 0.99)),
+        "max_ms": to_ms(values[-1]) if values else 0.0,
+    }
+
+
+def rss_bytes() -> int:
+    """Current resident set size (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def emit(report: Dict[str, Any], output: str = None):
+    """Write the report as JSON to a file, or to stdout when no path is given"""
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if output:
+        with open(output, "w", encoding="utf-8") as handle:
+            handle.write(text + "\n")
+        print(f"Wrote {output}", file=sys.stderr)
+    else:
+        print(text)
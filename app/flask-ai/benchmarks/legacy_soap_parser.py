@@ -0,0 +1,81 @@
+"""The SOAP parser that Agent._parse_ai_response used before soap_parser.
+
+Kept verbatim (minus the exception fallback) as the reference for the golden
+corpus in bench_parser. Do not fix bugs here; its outputs are the baseline.
+"""
+from typing import Any, Dict
+
+
+def parse_ai_response(ai_response: str, triage_input: Dict[str, Any]) -> Dict[str, Any]:
+    # Initialize with defaults
+    sections = {
+        "subjective": f"Patient reports: {triage_input.get('symptoms', '')}",
+        "objective": "Clinical evaluation needed",
+        "assessment": "Professional assessment required", 
+        "plan": "Follow medical advice",
+        "nextStep": "Teleconsultation recommended",
+        "summary": triage_input.get('summary', "") or triage_input.get('last_summary', ""),
+        "start_chat": False
+    }
+
+    lines = ai_response.split('\n')
+    current_section = None
+
+    for line in lines:
+        line = line.strip()
+
+        # Detect section headers
+        if line.lower().startswith('subjective'):
+            current_section = 'subjective'
+            if ':' in line:
+                sections['subjective'] = line.split(':', 1)[1].strip()
+            continue
+        elif line.lower().startswith('objective'):
+            current_section = 'objective'
+            if ':' in line:
+                sections['objective'] = line.split(':', 1)[1].strip()
+            continue
+        elif line.lower().startswith('assessment'):
+            current_section = 'assessment'
+            if ':' in line:
+                sections['assessment'] = line.split(':', 1)[1].strip()
+            continue
+        elif line.lower().startswith('plan'):
+            current_section = 'plan'
+            if ':' in line:
+                sections['plan'] = line.split(':', 1)[1].strip()
+            continue
+        elif 'next step' in line.lower():
+            current_section = 'nextStep'
+            if ':' in line:
+                sections['nextStep'] = line.split(':', 1)[1].strip()
+            continue
+        elif line.lower().startswith('summary'):
+            current_section = 'summary'
+            if ':' in line:
+                sections['summary'] = line.split(':', 1)[1].strip()
+            continue
+        elif 'start_chat' in line.lower():
+            current_section = 'start_chat'
+            if ':' in line:
+                start_chat_value = line.split(':', 1)[1].strip().lower()
+                sections['start_chat'] = start_chat_value in ['true', 'yes', '1', 'verdadeiro', 'sim']
+            continue
+
+        # Add content to current section
+        if current_section and line and current_section != 'start_chat':
+            if not line.startswith('-') and not line.startswith('**'):
+                if sections[current_section] != "":
+                    sections[current_section] += " " + line
+                else:
+                    sections[current_section] = line
+
+    return {
+        "subjective": sections["subjective"],
+        "objective": sections["objective"],
+        "assessment": sections["assessment"],
+        "plan": sections["plan"],
+        "nextStep": sections["nextStep"],
+        "summary": sections["summary"],
+        "start_chat": sections["start_chat"]
+    }
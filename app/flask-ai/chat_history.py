@@ -0,0 +1,59 @@
+from typing import Dict, List, Tuple
+
+# Rough chars-per-token ratio for Gemini-style tokenizers
+CHARS_PER_TOKEN = 4
+# Longest excerpt of a single turn kept once it is folded into the summary
+SUMMARY_TURN_CHARS = 160
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate used for prompt budgets and reporting"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _turn_tokens(turn: Dict[str, str]) -> int:
+    # Role label and separators cost a few tokens per turn
+    return estimate_tokens(turn.get("content", "")) + 4
+
+
+def _excerpt(turn: Dict[str, str]) -> str:
+    role = "Patient" if turn.get("role") == "user" else "Assistant"
+    content = " ".join(turn.get("content", "").split())
+    if len(content) > SUMMARY_TURN_CHARS:
+        content = content[:SUMMARY_TURN_CHARS].rstrip() + "..."
+    return f"{role}: {content}"
+
+
+def fit_history(history: List[Dict[str, str]], summary: str, token_budget: int) -> Tuple[List[Dict[str, str]], str]:
+    """Keep the newest turns that fit the budget and fold older ones into the summary.
+
+    The newest turn is always kept. The summary is itself capped to a quarter
+    of the budget, dropping its oldest excerpts first, so the prompt stays
+    bounded however long the conversation runs.
+    """
+    if not history:
+        return [], summary
+
+    summary_budget = max(token_budget // 4, 1)
+    turn_budget = max(token_budget - min(estimate_tokens(summary), summary_budget), 0)
+
+    kept_from = len(history) - 1
+    used = _turn_tokens(history[-1])
+    while kept_from > 0 and used + _turn_tokens(history[kept_from - 1]) <= turn_budget:
+        kept_from -= 1
+        used += _turn_tokens(history[kept_from])
+
+    if kept_from == 0:
+        return list(history), summary
+
+    excerpts = [summary] if summary else []
+    excerpts.extend(_excerpt(turn) for turn in history[:kept_from])
+    # Drop the oldest excerpts until the summary fits its share of the budget
+    while len(excerpts) > 1 and estimate_tokens("\n".join(excerpts)) > summary_budget:
+        excerpts.pop(0)
+    folded = "\n".join(excerpts)
+    max_chars = summary_budget * CHARS_PER_TOKEN
+    if len(folded) > max_chars:
+        folded = folded[-max_chars:]
+
+    return list(history[kept_from:]), folded
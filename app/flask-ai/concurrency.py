@@ -0,0 +1,116 @@
+import asyncio
+import threading
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Optional
+
+
+class _Waiter:
+    __slots__ = ("granted", "event", "loop", "future")
+
+    def __init__(self, event: Optional[threading.Event] = None, loop: Optional[asyncio.AbstractEventLoop] = None,
+                 future: Optional[asyncio.Future] = None):
+        self.granted = False
+        self.event = event
+        self.loop = loop
+        self.future = future
+
+
+class ConcurrencyLimiter:
+    """Caps the number of in-flight provider calls.
+
+    Extra callers wait for a free slot instead of opening a new upstream
+    connection. Threads (Flask/WSGI, executor pools) and coroutines (ASGI)
+    share one count and one first-come queue, so a process serving both
+    never has more than max_in_flight calls upstream. A released slot is
+    handed straight to the oldest waiter, on whichever thread or loop it
+    waits.
+    """
+
+    def __init__(self, max_in_flight: int):
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        self.max_in_flight = max_in_flight
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._waiters: Deque[_Waiter] = deque()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def _try_acquire(self, waiter: _Waiter) -> bool:
+        """Take a free slot, or queue the waiter; call with the lock held"""
+        if self._in_flight < self.max_in_flight and not self._waiters:
+            self._in_flight += 1
+            return True
+        self._waiters.append(waiter)
+        return False
+
+    def release(self):
+        with self._lock:
+            if not self._waiters:
+                self._in_flight -= 1
+                return
+            # The slot passes to the waiter; in_flight stays the same
+            waiter = self._waiters.popleft()
+            waiter.granted = True
+        if waiter.event is not None:
+            waiter.event.set()
+            return
+        try:
+            waiter.loop.call_soon_threadsafe(_wake, waiter.future)
+        except RuntimeError:
+            # Its loop is closed, so nobody will use the slot
+            self.release()
+
+    def acquire(self):
+        """Block until a slot is free; pair with release()"""
+        waiter = _Waiter(event=threading.Event())
+        with self._lock:
+            if self._try_acquire(waiter):
+                return
+        waiter.event.wait()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+    async def acquire_async(self):
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(loop=loop, future=loop.create_future())
+        with self._lock:
+            if self._try_acquire(waiter):
+                return
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = waiter.granted
+                if not granted:
+                    self._waiters.remove(waiter)
+            # Cancelled after the slot was handed over: pass it on
+            if granted:
+                self.release()
+            raise
+
+    @asynccontextmanager
+    async def async_slot(self):
+        await self.acquire_async()
+        try:
+            yield self
+        finally:
+            self.release()
+
+
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
@@ -0,0 +1,327 @@
+"""Append-only conversation log for triage sessions.
+
+Every triage and chat turn is appended to a SQLite table as an event:
+
+    session   full TriageSession written by /generate_summary
+    turn      one patient message and the reply, plus the updated assessment
+    snapshot  the session rebuilt from earlier events by compaction
+
+Writes never block the request: events go on a queue and a background
+writer commits them in batches, so one fsync covers many events. A session
+is rebuilt from its newest session/snapshot record plus the turns after it,
+which lets the agent recover context after the session store evicts it, a
+restart, or on a worker that never saw the session. Compaction periodically
+replaces long runs of events with a snapshot, so rebuilding stays cheap.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from chat_history import fit_history
+from metrics import REGISTRY
+from session_store import TriageSession
+
+LOG_EVENTS = REGISTRY.counter(
+    "triage_conversation_log_events_total", "Conversation log events by kind and fate", ("kind", "result"))
+LOG_FLUSH = REGISTRY.histogram(
+    "triage_conversation_log_flush_seconds", "Time to commit one batch of conversation events")
+
+SESSION, TURN, SNAPSHOT = "session", "turn", "snapshot"
+
+# (session_id, kind, JSON data, created_at)
+_Event = Tuple[str, str, str, float]
+
+
+def replay(events: List[Tuple[str, Dict[str, Any]]], token_budget: int) -> Optional[TriageSession]:
+    """Rebuild a session from (kind, data) events in log order"""
+    session = None
+    for kind, data in events:
+        if kind in (SESSION, SNAPSHOT):
+            session = TriageSession.from_dict(data)
+        elif kind == TURN:
+            # Chat on a session id that never had a triage starts empty
+            session = session or TriageSession()
+            session.symptoms = session.symptoms or data.get("user", "")
+            session.assessment = data.get("assessment", session.assessment)
+            session.plan = data.get("plan", session.plan)
+            session.last_summary = data.get("last_summary", session.last_summary)
+            session.updated_at = data.get("updated_at", session.updated_at)
+            turns = [{"role": "user", "content": data.get("user", "")},
+                     {"role": "assistant", "content": data.get("assistant", "")}]
+            session.history, session.history_summary = fit_history(
+                session.history + turns, session.history_summary, token_budget
+            )
+    return session
+
+
+class ConversationLog:
+    """SQLite event log with a background batching writer.
+
+    ``append`` only enqueues; the writer commits up to ``batch_size`` events
+    per transaction, waiting at most ``flush_interval`` seconds for a batch
+    to fill. With ``durable`` the database runs synchronous=FULL, so each
+    commit is fsynced. Every ``compact_interval`` seconds the writer folds
+    sessions with more than ``compact_threshold`` events into a snapshot and
+    drops sessions idle for longer than ``retention_seconds`` (0 keeps all).
+    Events are dropped, not queued, once ``max_queue`` are pending.
+    """
+
+    def __init__(self, path: str, token_budget: int = 2000, batch_size: int = 64, flush_interval: float = 0.05,
+                 max_queue: int = 10000, compact_threshold: int = 32, compact_interval: float = 60.0,
+                 retention_seconds: float = 30 * 24 * 3600, durable: bool = True):
+        self.path = path
+        self.token_budget = token_budget
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.compact_threshold = compact_threshold
+        self.compact_interval = compact_interval
+        self.retention_seconds = retention_seconds
+        self.durable = durable
+        self._queue: "queue.Queue[Optional[_Event]]" = queue.Queue(maxsize=max_queue)
+        self._writer: Optional[threading.Thread] = None
+        self._writer_pid = None
+        self._writer_lock = threading.Lock()
+        self._unflushed = 0
+        self._flushed = threading.Condition()
+        conn = self._connect()
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS conversation_events ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, "
+                "kind TEXT NOT NULL, data TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_conversation_events_session ON conversation_events(session_id, id)"
+            )
+        finally:
+            conn.close()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={'FULL' if self.durable else 'NORMAL'}")
+        return conn
+
+    def _ensure_writer(self):
+        # Threads do not survive a fork; each worker process starts its own
+        if self._writer_pid == os.getpid():
+            return
+        with self._writer_lock:
+            if self._writer_pid != os.getpid():
+                self._writer = threading.Thread(target=self._run, name="conversation-log", daemon=True)
+                self._writer.start()
+                self._writer_pid = os.getpid()
+                atexit.register(self.close)
+
+    def append(self, session_id: str, kind: str, data: Dict[str, Any]):
+        """Queue an event; returns at once"""
+        self._ensure_writer()
+        event = (session_id, kind, json.dumps(data, separators=(",", ":"), ensure_ascii=False), time.time())
+        with self._flushed:
+            self._unflushed += 1
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            with self._flushed:
+                self._unflushed -= 1
+            LOG_EVENTS.inc(kind, "dropped")
+
+    def log_session(self, session_id: str, session: TriageSession):
+        self.append(session_id, SESSION, session.to_dict())
+
+    def log_turn(self, session_id: str, user: str, assistant: str, session: TriageSession):
+        self.append(session_id, TURN, {
+            "user": user,
+            "assistant": assistant,
+            "assessment": session.assessment,
+            "plan": session.plan,
+            "last_summary": session.last_summary,
+            "updated_at": session.updated_at,
+        })
+
+    def load_session(self, session_id: str) -> Optional[TriageSession]:
+        """Rebuild a session from its latest session/snapshot record and the turns after it.
+
+        Events still queued in this process are not visible yet.
+        """
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT kind, data FROM conversation_events WHERE session_id = ? AND id >= COALESCE("
+                "(SELECT MAX(id) FROM conversation_events WHERE session_id = ? AND kind IN (?, ?)), 0) "
+                "ORDER BY id",
+                (session_id, session_id, SESSION, SNAPSHOT),
+            ).fetchall()
+        finally:
+            conn.close()
+        if not rows:
+            return None
+        return replay([(kind, json.loads(data)) for kind, data in rows], self.token_budget)
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until every event appended so far is committed"""
+        deadline = time.monotonic() + timeout
+        with self._flushed:
+            while self._unflushed > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._writer is None or not self._writer.is_alive():
+                    return False
+                self._flushed.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 5.0):
+        """Commit pending events and stop the writer"""
+        if self._writer is None or self._writer_pid != os.getpid() or not self._writer.is_alive():
+            return
+        self._queue.put(None)
+        self._writer.join(timeout)
+
+    def _run(self):
+        conn = self._connect()
+        next_compaction = time.monotonic() + self.compact_interval
+        stopping = False
+        while not stopping:
+            try:
+                first = self._queue.get(timeout=max(next_compaction - time.monotonic(), 0.01))
+            except queue.Empty:
+                first = False
+            batch: List[_Event] = []
+            if first is None:
+                stopping = True
+            elif first:
+                batch.append(first)
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    try:
+                        event = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                    except queue.Empty:
+                        break
+                    if event is None:
+                        stopping = True
+                        break
+                    batch.append(event)
+            # Nothing raised here may end the thread: later appends would queue
+            # forever and flush() would only ever time out
+            if batch:
+                self._write(conn, batch)
+            if time.monotonic() >= next_compaction:
+                next_compaction = time.monotonic() + self.compact_interval
+                try:
+                    self.compact(conn)
+                except Exception:
+                    logging.exception("Conversation log compaction failed")
+                    self._rollback(conn)
+        conn.close()
+
+    @staticmethod
+    def _rollback(conn: sqlite3.Connection):
+        try:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+        except sqlite3.Error:
+            logging.exception("Conversation log rollback failed")
+
+    def _write(self, conn: sqlite3.Connection, batch: List[_Event]):
+        started = time.perf_counter()
+        result = "written"
+        try:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT INTO conversation_events (session_id, kind, data, created_at) VALUES (?, ?, ?, ?)", batch
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            self._rollback(conn)
+            result = "failed"
+            logging.exception(f"Conversation log write of {len(batch)} events failed")
+        finally:
+            with self._flushed:
+                self._unflushed -= len(batch)
+                self._flushed.notify_all()
+        LOG_FLUSH.observe(time.perf_counter() - started)
+        for _, kind, _, _ in batch:
+            LOG_EVENTS.inc(kind, result)
+
+    def compact(self, conn: Optional[sqlite3.Connection] = None) -> int:
+        """Snapshot sessions with long event runs and drop expired ones; returns sessions compacted"""
+        own = conn is None
+        conn = conn or self._connect()
+        try:
+            if self.retention_seconds > 0:
+                conn.execute(
+                    "DELETE FROM conversation_events WHERE session_id IN ("
+                    "SELECT session_id FROM conversation_events GROUP BY session_id HAVING MAX(created_at) < ?)",
+                    (time.time() - self.retention_seconds,),
+                )
+            session_ids = [row[0] for row in conn.execute(
+                "SELECT session_id FROM conversation_events GROUP BY session_id HAVING COUNT(*) > ?",
+                (self.compact_threshold,),
+            )]
+            for session_id in session_ids:
+                self._compact_session(conn, session_id)
+            return len(session_ids)
+        finally:
+            if own:
+                conn.close()
+
+    def _compact_session(self, conn: sqlite3.Connection, session_id: str):
+        # IMMEDIATE keeps other workers from appending between read and delete
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT id, kind, data FROM conversation_events WHERE session_id = ? ORDER BY id", (session_id,)
+            ).fetchall()
+            if not rows:
+                # Another worker compacted or expired it since the count
+                conn.execute("COMMIT")
+                return
+            session = replay([(kind, json.loads(data)) for _, kind, data in rows], self.token_budget)
+            last_id = rows[-1][0]
+            conn.execute("DELETE FROM conversation_events WHERE session_id = ? AND id <= ?", (session_id, last_id))
+            if session is not None:
+                conn.execute(
+                    "INSERT INTO conversation_events (session_id, kind, data, created_at) VALUES (?, ?, ?, ?)",
+                    (session_id, SNAPSHOT, json.dumps(session.to_dict(), separators=(",", ":"), ensure_ascii=False),
+                     time.time()),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._connect()
+        try:
+            sessions, events = conn.execute(
+                "SELECT COUNT(DISTINCT session_id), COUNT(*) FROM conversation_events"
+            ).fetchone()
+        finally:
+            conn.close()
+        return {"path": self.path, "sessions": sessions, "events": events, "queued": self.queue_depth}
+
+
+def create_conversation_log(token_budget: int) -> Optional[ConversationLog]:
+    """Build the log from CONVERSATION_LOG_* environment variables; None when no path is set"""
+    path = os.getenv('CONVERSATION_LOG_PATH', '').strip()
+    if not path:
+        return None
+    return ConversationLog(
+        path,
+        token_budget=token_budget,
+        batch_size=int(os.getenv('CONVERSATION_LOG_BATCH_SIZE', '64')),
+        flush_interval=float(os.getenv('CONVERSATION_LOG_FLUSH_MS', '50')) / 1000.0,
+        compact_threshold=int(os.getenv('CONVERSATION_LOG_COMPACT_EVENTS', '32')),
+        compact_interval=float(os.getenv('CONVERSATION_LOG_COMPACT_INTERVAL_SECONDS', '60')),
+        retention_seconds=float(os.getenv('CONVERSATION_LOG_RETENTION_DAYS', '30')) * 24 * 3600,
+        durable=os.getenv('CONVERSATION_LOG_FSYNC', 'true').strip().lower() in ('1', 'true', 'yes'),
+    )
@@ -0,0 +1,38 @@
+"""Production gunicorn settings for the Flask AI service.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+The master preloads the app (Flask and the agent module, not the Gemini SDK
+or any provider client) and forks; each worker then builds its own Agent in
+post_fork, before it accepts requests. Worker threads serve concurrent
+requests while model calls block on I/O.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+# In-memory sessions are per process, so more than one worker needs
+# SESSION_BACKEND=sqlite
+_default_workers = multiprocessing.cpu_count() if os.getenv('SESSION_BACKEND', 'memory') == 'sqlite' else 1
+workers = int(os.getenv('WEB_CONCURRENCY', str(_default_workers)))
+worker_class = "gthread"
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+
+preload_app = True
+# Model calls and SSE streams can run long; AI_TIMEOUT_SECONDS bounds each attempt
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+# Idle keep-alive connections wait in the worker's poller, not on a thread, so
+# pooled clients can hold them open between calls
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', os.getenv('KEEPALIVE_TIMEOUT_SECONDS', '75')))
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG') or None
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    """Build this worker's Agent before it takes traffic"""
+    from app import get_agent
+
+    get_agent()
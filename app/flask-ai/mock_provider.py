@@ -0,0 +1,164 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from ai_provider import AIProvider
+from resilience import UpstreamUnavailable
+
+_SYMPTOMS_LINE = re.compile(r"^(?:Symptoms|- Initial Symptoms):\s*(.*)$", re.MULTILINE)
+_URGENT_KEYWORDS = ("chest pain", "shortness of breath", "dor no peito", "falta de ar", "unconscious", "bleeding")
+_CHAT_KEYWORDS = ("fever", "headache", "cough", "cold", "pain", "nausea", "febre", "dor", "tosse")
+_JSON_KEYS = {"Subjective": "subjective", "Objective": "objective", "Assessment": "assessment",
+              "Plan": "plan", "Next Step": "nextStep", "Summary": "summary"}
+_FILLER = (
+    "Monitor symptoms closely, keep hydrated and rest. Record temperature twice a day and note any "
+    "new symptom, its time of onset and intensity. Bring this note and current medications to the visit. "
+)
+
+
+class MockAIProvider(AIProvider):
+    """Local provider that returns well-formed SOAP text without calling a model.
+
+    Output is a pure function of the prompt, so runs are reproducible. Latency,
+    error rate and response size are configurable so the service's own
+    throughput and tail latency can be measured in isolation:
+
+    MOCK_LATENCY_MS        mean simulated upstream latency (default 50)
+    MOCK_LATENCY_DIST      fixed | uniform | exponential | lognormal (default fixed)
+    MOCK_LATENCY_JITTER    spread: +/- fraction for uniform, sigma for lognormal (default 0.5)
+    MOCK_ERROR_RATE        probability in [0, 1] that a call raises a retryable error (default 0)
+    MOCK_RESPONSE_CHARS    approximate minimum response length (default 0, no padding)
+    MOCK_STREAM_CHUNK_CHARS  chunk size for streamed chat replies (default 24)
+    MOCK_SEED              seed for latency and error sampling (default 0)
+    """
+
+    display_name = "MockAI"
+    supports_json_mode = True
+
+    def __init__(self):
+        self.model_name = os.getenv('MOCK_MODEL_NAME', 'mock-soap')
+        self.latency_ms = float(os.getenv('MOCK_LATENCY_MS', '50'))
+        self.latency_dist = os.getenv('MOCK_LATENCY_DIST', 'fixed').strip().lower()
+        self.latency_jitter = float(os.getenv('MOCK_LATENCY_JITTER', '0.5'))
+        self.error_rate = float(os.getenv('MOCK_ERROR_RATE', '0'))
+        self.response_chars = int(os.getenv('MOCK_RESPONSE_CHARS', '0'))
+        self.stream_chunk_chars = max(int(os.getenv('MOCK_STREAM_CHUNK_CHARS', '24')), 1)
+        if self.latency_dist not in ('fixed', 'uniform', 'exponential', 'lognormal'):
+            raise ValueError(f"Unknown MOCK_LATENCY_DIST '{self.latency_dist}'")
+        self._random = random.Random(int(os.getenv('MOCK_SEED', '0')))
+        self._random_lock = threading.Lock()
+        print(f"Using mock model: {self.model_name} ({self.latency_dist} {self.latency_ms:g}ms, "
+              f"error rate {self.error_rate:g})")
+
+    def _sample(self):
+        """Draw (delay seconds, should fail) from the configured distributions"""
+        mean = self.latency_ms / 1000.0
+        with self._random_lock:
+            if self.latency_dist == 'uniform':
+                spread = mean * self.latency_jitter
+                delay = self._random.uniform(mean - spread, mean + spread)
+            elif self.latency_dist == 'exponential':
+                delay = self._random.expovariate(1.0 / mean) if mean > 0 else 0.0
+            elif self.latency_dist == 'lognormal':
+                sigma = self.latency_jitter
+                # Choose mu so the distribution mean equals the configured mean
+                delay = self._random.lognormvariate(math.log(mean) - sigma * sigma / 2, sigma) if mean > 0 else 0.0
+            else:
+                delay = mean
+            fail = self._random.random() < self.error_rate
+        return max(delay, 0.0), fail
+
+    def _sections(self, prompt: str, chat: bool) -> Tuple[List[Tuple[str, str]], bool]:
+        """([(header, text), ...], start_chat) for a reply to this prompt"""
+        match = None
+        for match in _SYMPTOMS_LINE.finditer(prompt):
+            pass
+        symptoms = match.group(1).strip() if match else "unspecified symptoms"
+        lowered = symptoms.lower()
+        urgent = any(keyword in lowered for keyword in _URGENT_KEYWORDS)
+        start_chat = not urgent and any(keyword in lowered for keyword in _CHAT_KEYWORDS)
+        # Stable per-prompt reference so identical prompts give identical text
+        reference = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+
+        sections = [
+            ("Subjective", f"Patient reports {symptoms}."),
+            ("Objective", "No vital signs available; findings based on self-report."),
+            ("Assessment", f"{'High priority, possible emergency' if urgent else 'Low to moderate priority'} (ref {reference})."),
+            ("Plan", f"{'Immediate in-person evaluation' if urgent else 'Symptomatic care and follow-up'}."),
+            ("Next Step", 'Seek emergency care' if urgent else 'Teleconsultation recommended'),
+        ]
+        if chat:
+            sections.append(("Summary", f"We discussed {symptoms} and the recommended next step."))
+
+        length = sum(len(header) + len(text) + 3 for header, text in sections) + len(f"start_chat: {start_chat}")
+        if length < self.response_chars:
+            padding = (_FILLER * (self.response_chars // len(_FILLER) + 1))[: self.response_chars - length]
+            # Pad the Plan section so parsed sections grow with the response
+            sections[3] = ("Plan", f"{sections[3][1]} {padding.strip()}")
+        return sections, start_chat
+
+    def _respond(self, prompt: str, chat: bool) -> str:
+        sections, start_chat = self._sections(prompt, chat)
+        lines = [f"{header}: {text}" for header, text in sections]
+        lines.append(f"start_chat: {start_chat}")
+        return "\n".join(lines)
+
+    def _respond_json(self, prompt: str) -> str:
+        sections, start_chat = self._sections(prompt, chat=False)
+        reply = {_JSON_KEYS[header]: text for header, text in sections}
+        reply["start_chat"] = start_chat
+        return json.dumps(reply)
+
+    def complete(self, prompt: str, system_message: Optional[str] = None, model: Optional[str] = None) -> str:
+        delay, fail = self._sample()
+        time.sleep(delay)
+        if fail:
+            raise UpstreamUnavailable("Mock AI service error: simulated upstream failure")
+        return self._respond(prompt, chat=False)
+
+    async def complete_async(self, prompt: str, system_message: Optional[str] = None, model: Optional[str] = None) -> str:
+        delay, fail = self._sample()
+        await asyncio.sleep(delay)
+        if fail:
+            raise UpstreamUnavailable("Mock AI service error: simulated upstream failure")
+        return self._respond(prompt, chat=False)
+
+    def complete_json(self, prompt: str, system_message: Optional[str] = None, model: Optional[str] = None) -> str:
+        delay, fail = self._sample()
+        time.sleep(delay)
+        if fail:
+            raise UpstreamUnavailable("Mock AI service error: simulated upstream failure")
+        return self._respond_json(prompt)
+
+    async def complete_json_async(self, prompt: str, system_message: Optional[str] = None, model: Optional[str] = None) -> str:
+        delay, fail = self._sample()
+        await asyncio.sleep(delay)
+        if fail:
+            raise UpstreamUnavailable("Mock AI service error: simulated upstream failure")
+        return self._respond_json(prompt)
+
+    def chat_complete(self, messages: List[Dict[str, str]], triage_context: Optional[Dict] = None, model: Optional[str] = None) -> str:
+        delay, fail = self._sample()
+        time.sleep(delay)
+        if fail:
+            raise UpstreamUnavailable("Mock chat error: simulated upstream failure")
+        return self._respond(self.build_chat_message(messages, triage_context), chat=True)
+
+    async def chat_complete_async(self, messages: List[Dict[str, str]], triage_context: Optional[Dict] = None, model: Optional[str] = None) -> str:
+        delay, fail = self._sample()
+        await asyncio.sleep(delay)
+        if fail:
+            raise UpstreamUnavailable("Mock chat error: simulated upstream failure")
+        return self._respond(self.build_chat_message(messages, triage_context), chat=True)
+
+    def chat_complete_stream(self, messages: List[Dict[str, str]], triage_context: Optional[Dict] = None, model: Optional[str] = None) -> Iterator[str]:
+        text = self.chat_complete(messages, triage_context, model)
+        for start in range(0, len(text), self.stream_chunk_chars):
+            yield text[start:start + self.stream_chunk_chars]
@@ -0,0 +1,140 @@
+"""Per-operation model selection for provider calls.
+
+Initial triage ("summary") goes to the stronger model; chat turns go to a
+lighter one unless their prompt is long enough to need the stronger model.
+Each model has its own ResiliencePolicy, so an overloaded model opens its
+own breaker, and a call that fails on overload moves to the fallback model.
+"""
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from concurrency import ConcurrencyLimiter
+from metrics import REGISTRY
+from resilience import CircuitBreaker, CircuitOpenError, ResiliencePolicy, create_resilience_policy, is_retryable
+
+MODEL_LATENCY = REGISTRY.histogram(
+    "triage_model_latency_seconds", "Provider call latency by model, retries included", ("model", "operation", "outcome"))
+MODEL_FALLBACKS = REGISTRY.counter(
+    "triage_model_fallbacks_total", "Calls moved to the fallback model after an overload", ("operation",))
+
+
+def is_overload(error: BaseException) -> bool:
+    """True when another model may succeed where this one failed"""
+    return isinstance(error, CircuitOpenError) or is_retryable(error)
+
+
+class ModelRouter:
+    """Picks the model for each provider call and falls back on overload.
+
+    ``call`` and friends pass the chosen model name as the last argument of
+    ``fn`` and return it alongside the result, so callers can report the
+    model that actually answered. ``on_attempt`` is handed to each model's
+    policy, so it runs once per attempt across retries and the fallback.
+    """
+
+    def __init__(self, summary_model: str, chat_model: str, fallback_model: Optional[str] = None,
+                 chat_max_tokens: int = 0, policy_factory: Callable[[], ResiliencePolicy] = create_resilience_policy):
+        self.summary_model = summary_model
+        self.chat_model = chat_model
+        self.fallback_model = fallback_model or None
+        self.chat_max_tokens = chat_max_tokens
+        self._policies: Dict[str, ResiliencePolicy] = {}
+        for model in (summary_model, chat_model, self.fallback_model):
+            if model and model not in self._policies:
+                self._policies[model] = policy_factory()
+
+    def models_for(self, operation: str, prompt_tokens: int = 0) -> List[str]:
+        """Models to try for a call, primary first"""
+        primary = self.summary_model
+        if operation == "chat" and not (self.chat_max_tokens and prompt_tokens > self.chat_max_tokens):
+            primary = self.chat_model
+        if self.fallback_model and self.fallback_model != primary:
+            return [primary, self.fallback_model]
+        return [primary]
+
+    def policy(self, model: str) -> ResiliencePolicy:
+        return self._policies[model]
+
+    @property
+    def breaker_state(self) -> str:
+        """Worst breaker state across models"""
+        states = [policy.breaker.state for policy in self._policies.values()]
+        return max(states, key=CircuitBreaker.STATE_VALUES.__getitem__)
+
+    def _failed(self, models: List[str], index: int, operation: str, error: Exception, started: float) -> bool:
+        """Record a failed model; True when the next model should be tried"""
+        model = models[index]
+        MODEL_LATENCY.observe(time.perf_counter() - started, model, operation, "error")
+        if index + 1 < len(models) and is_overload(error):
+            MODEL_FALLBACKS.inc(operation)
+            logging.getLogger(__name__).warning(
+                f"Model {model} unavailable for {operation} ({error}); falling back to {models[index + 1]}"
+            )
+            return True
+        return False
+
+    def call(self, operation: str, fn: Callable[..., Any], *args, prompt_tokens: int = 0,
+             on_attempt: Optional[Callable[[], Any]] = None) -> Tuple[str, Any]:
+        models = self.models_for(operation, prompt_tokens)
+        for index, model in enumerate(models):
+            started = time.perf_counter()
+            try:
+                result = self._policies[model].call(operation, fn, *args, model, on_attempt=on_attempt)
+            except Exception as e:
+                if self._failed(models, index, operation, e, started):
+                    continue
+                raise
+            MODEL_LATENCY.observe(time.perf_counter() - started, model, operation, "success")
+            return model, result
+
+    async def call_async(self, operation: str, fn: Callable[..., Awaitable[Any]], *args, prompt_tokens: int = 0,
+                         on_attempt: Optional[Callable[[], Awaitable[Any]]] = None) -> Tuple[str, Any]:
+        models = self.models_for(operation, prompt_tokens)
+        for index, model in enumerate(models):
+            started = time.perf_counter()
+            try:
+                result = await self._policies[model].call_async(operation, fn, *args, model, on_attempt=on_attempt)
+            except Exception as e:
+                if self._failed(models, index, operation, e, started):
+                    continue
+                raise
+            MODEL_LATENCY.observe(time.perf_counter() - started, model, operation, "success")
+            return model, result
+
+    def call_stream(self, operation: str, fn: Callable[..., Iterator[str]], *args, prompt_tokens: int = 0,
+                    on_attempt: Optional[Callable[[], Any]] = None) -> Iterator[Tuple[str, str]]:
+        """Yield (model, chunk); falls back only before the first chunk"""
+        models = self.models_for(operation, prompt_tokens)
+        for index, model in enumerate(models):
+            started = time.perf_counter()
+            chunks = self._policies[model].call_stream(operation, fn, *args, model, on_attempt=on_attempt)
+            try:
+                first = next(chunks, None)
+            except Exception as e:
+                if self._failed(models, index, operation, e, started):
+                    continue
+                raise
+            try:
+                if first is not None:
+                    yield model, first
+                for chunk in chunks:
+                    yield model, chunk
+            except Exception:
+                MODEL_LATENCY.observe(time.perf_counter() - started, model, operation, "error")
+                raise
+            MODEL_LATENCY.observe(time.perf_counter() - started, model, operation, "success")
+            return
+
+
+def create_model_router(default_model: str, max_workers: int = 32,
+                        limiter: Optional[ConcurrencyLimiter] = None) -> ModelRouter:
+    """Build the router from AI_MODEL_* environment variables; every model's attempts share the limiter"""
+    return ModelRouter(
+        summary_model=os.getenv('AI_MODEL_SUMMARY') or default_model,
+        chat_model=os.getenv('AI_MODEL_CHAT') or default_model,
+        fallback_model=os.getenv('AI_MODEL_FALLBACK') or None,
+        chat_max_tokens=int(os.getenv('AI_MODEL_CHAT_MAX_TOKENS', '1500')),
+        policy_factory=lambda: create_resilience_policy(max_workers=max_workers, limiter=limiter),
+    )
@@ -0,0 +1,144 @@
+"""Versioned prompt templates for the triage agent.
+
+Each prompt is a constant system instruction plus a user template whose
+literal text is split from its {field} placeholders once, at import, so a
+request only fills in the patient fields. Providers that accept a
+system-level instruction receive the constant part separately instead of
+prepending it to every prompt.
+
+Bump a prompt's version whenever its text changes (or the parser that reads
+the reply does): the response cache keys on the key of the SOAP prompt in use.
+"""
+from string import Formatter
+from typing import Any, List, Tuple
+
+
+class PromptTemplate:
+    """A system instruction and a user template with {field} placeholders"""
+
+    __slots__ = ("name", "version", "system", "_segments")
+
+    def __init__(self, name: str, version: int, system: str, template: str):
+        self.name = name
+        self.version = version
+        self.system = system
+        # [(literal text, field name or None), ...]
+        self._segments: List[Tuple[str, Any]] = [
+            (literal, field) for literal, field, _, _ in Formatter().parse(template)
+        ]
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}-v{self.version}"
+
+    def render(self, **fields: Any) -> str:
+        parts = []
+        for literal, field in self._segments:
+            parts.append(literal)
+            if field is not None:
+                parts.append(str(fields[field]))
+        return "".join(parts)
+
+
+_ROLE = """You are a professional healthcare assistant specialized in patient triage.
+Provide accurate, clinically appropriate SOAP notes. Be concise but thorough.
+Focus on patient safety and appropriate next steps."""
+
+# Patient fields shared by the text and JSON SOAP prompts
+_SOAP_CASE = """Create a clinical SOAP note for patient triage based on this information:
+
+Patient Age: {age}
+Reported Severity (1-10): {severity}
+Symptom Duration: {duration}
+Gender: {gender}
+Symptoms: {symptoms}
+Medical History: {medical_history}
+Current Medications: {current_medications}
+"""
+
+SOAP_PROMPT = PromptTemplate(
+    "soap",
+    2,
+    system=f"""{_ROLE}
+Your goal is to create a complete SOAP note of the case, ask the necessary questions to complete and return the SOAP note.
+Please format your response exactly like this:
+Subjective: [patient symptoms description]
+Objective: [clinical observations]
+Assessment: [clinical impression and priority]
+Plan: [recommended actions]
+Next Step: [specific recommendation]
+start_chat: [True/False]
+""",
+    template=_SOAP_CASE + """
+Please provide a concise SOAP note with these exact sections:
+- Subjective: Patient's reported symptoms in their own words
+- Objective: Clinical observations and vital signs
+- Assessment: Clinical impression and triage priority
+- Plan: Recommended actions
+- Next Step: Specific recommendation
+- start_chat: Boolean variable (True/False) - True if teleconsultation chat is needed
+""",
+)
+
+# Structured-output variant: the reply is one JSON object matching
+# SOAP_RESPONSE_SCHEMA, checked by soap_parser.parse_soap_json
+SOAP_JSON_PROMPT = PromptTemplate(
+    "soap-json",
+    1,
+    system=f"""{_ROLE}
+Your goal is to create a complete SOAP note of the case.
+Respond with a single JSON object and nothing else, with exactly these keys:
+"subjective" (string), "objective" (string), "assessment" (string), "plan" (string),
+"nextStep" (string) and "start_chat" (boolean).
+""",
+    template=_SOAP_CASE + """
+Return the SOAP note as JSON:
+- subjective: Patient's reported symptoms in their own words
+- objective: Clinical observations and vital signs
+- assessment: Clinical impression and triage priority
+- plan: Recommended actions
+- nextStep: Specific recommendation
+- start_chat: true if teleconsultation chat is needed, otherwise false
+""",
+)
+
+# Response schema for providers with native JSON mode (Gemini enum type names)
+SOAP_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "subjective": {"type": "STRING"},
+        "objective": {"type": "STRING"},
+        "assessment": {"type": "STRING"},
+        "plan": {"type": "STRING"},
+        "nextStep": {"type": "STRING"},
+        "start_chat": {"type": "BOOLEAN"},
+    },
+    "required": ["subjective", "objective", "assessment", "plan", "nextStep", "start_chat"],
+}
+
+CHAT_PROMPT = PromptTemplate(
+    "chat",
+    2,
+    system=f"""{_ROLE}
+Your goal is to create a complete SOAP note of the case, ask the necessary questions to complete and return the SOAP note.
+Please format your response exactly like this:
+Subjective: [patient symptoms description]
+Objective: [clinical observations]
+Assessment: [clinical impression and priority]
+Plan: [recommended actions]
+Next Step: [specific recommendation]
+Summary: [humanized summary of the response]
+""",
+    template="""PATIENT TRIAGE CONTEXT (remember this information):
+- Age: {age}
+- Severity: {severity}
+- Duration: {duration}
+- Gender: {gender}
+- Initial Symptoms: {symptoms}
+- Medical History: {medical_history}
+- Current Medications: {current_medications}
+- Current Assessment: {assessment}
+- Current Plan: {plan}
+
+""",
+)
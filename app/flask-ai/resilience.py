@@ -0,0 +1,381 @@
+import asyncio
+import contextvars
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Any, Awaitable, Callable, Iterator, Optional
+
+from concurrency import ConcurrencyLimiter
+from metrics import REGISTRY, follow_thread
+
+UPSTREAM_RETRIES = REGISTRY.counter(
+    "triage_upstream_retries_total", "Provider calls retried after a transient failure", ("operation",))
+UPSTREAM_FAILURES = REGISTRY.counter(
+    "triage_upstream_failures_total", "Failed provider attempts by reason", ("operation", "reason"))
+BREAKER_TRANSITIONS = REGISTRY.counter(
+    "triage_circuit_breaker_transitions_total", "Circuit breaker state changes", ("state",))
+
+# Error class names (google.api_core and HTTP clients) worth another attempt
+_RETRYABLE_NAMES = frozenset((
+    "ServiceUnavailable", "ResourceExhausted", "InternalServerError", "DeadlineExceeded",
+    "TooManyRequests", "BadGateway", "GatewayTimeout", "Aborted",
+))
+
+
+class UpstreamUnavailable(Exception):
+    """Transient provider failure; the call may succeed if retried"""
+
+
+class UpstreamTimeout(UpstreamUnavailable):
+    """A provider call ran past its deadline"""
+
+
+class CircuitOpenError(Exception):
+    """The circuit breaker is open and the provider is not being called"""
+
+
+class WorkersBusy(Exception):
+    """Every upstream worker is still running an overrun call; this one never started"""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """True for timeouts, overload and connection errors, including wrapped ones"""
+    while error is not None:
+        if isinstance(error, (UpstreamUnavailable, TimeoutError, ConnectionError)):
+            return True
+        if type(error).__name__ in _RETRYABLE_NAMES:
+            return True
+        error = error.__cause__
+    return False
+
+
+class CircuitBreaker:
+    """Stops calling the provider after repeated transient failures.
+
+    closed: calls go through; ``failure_threshold`` consecutive retryable
+    failures open the breaker. open: calls fail fast with CircuitOpenError
+    until ``reset_timeout`` has passed. half_open: one probe call is let
+    through; success closes the breaker, failure opens it again.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+    # Numeric state for the metrics gauge
+    STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        if failure_threshold < 1:
+            raise ValueError("failure_threshold must be at least 1")
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def _set_state(self, state: str):
+        if state != self._state:
+            self._state = state
+            BREAKER_TRANSITIONS.inc(state)
+
+    def allow(self) -> bool:
+        """Reserve a call; False means fail fast"""
+        with self._lock:
+            if self._state == self.OPEN:
+                if self._clock() - self._opened_at < self.reset_timeout:
+                    return False
+                self._set_state(self.HALF_OPEN)
+            if self._state == self.HALF_OPEN:
+                if self._probing:
+                    return False
+                self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._probing = False
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+                self._set_state(self.OPEN)
+
+    def release(self):
+        """Give back a reservation whose call failed for a non-upstream reason"""
+        with self._lock:
+            self._probing = False
+
+
+class _Slot:
+    """A limiter slot held for one attempt.
+
+    Released once: by the caller when the attempt ends, or, when the
+    attempt overran its deadline, by the worker thread once the SDK returns.
+    """
+
+    __slots__ = ("_limiter",)
+
+    def __init__(self, limiter: Optional[ConcurrencyLimiter]):
+        self._limiter = limiter
+
+    def hand_to(self, future: Future):
+        limiter, self._limiter = self._limiter, None
+        if limiter is not None:
+            future.add_done_callback(lambda _: limiter.release())
+
+    def release(self):
+        limiter, self._limiter = self._limiter, None
+        if limiter is not None:
+            limiter.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+
+class ResiliencePolicy:
+    """Deadline, jittered retry and circuit breaker around provider calls.
+
+    Each attempt gets ``timeout`` seconds. Retryable failures are retried up
+    to ``max_retries`` times after a full-jitter exponential backoff; other
+    errors propagate at once and do not count against the breaker.
+
+    Sync calls enforce the deadline by running the attempt on a small worker
+    pool; an attempt that overruns keeps its pool thread until the SDK
+    returns, but the caller is released. Async calls are cancelled instead.
+    With a ``limiter``, each attempt holds one of its slots (waiting for it
+    does not count against the deadline), and an overrun attempt keeps its
+    slot until the SDK returns, so abandoned calls still count against the
+    cap. Size ``max_workers`` above the limiter's cap and no attempt ever
+    queues behind them; without a limiter, an attempt that timed out still
+    queued raises WorkersBusy and does not count against the breaker.
+    Streams are retried only until their first chunk arrives, and the
+    deadline applies to that first chunk. A call that is cancelled, or a
+    stream its consumer closes, gives its breaker reservation back.
+
+    ``on_attempt`` runs before every attempt, retries included, and before
+    the attempt's deadline starts; the agent takes an admission token there.
+    An error it raises ends the call without counting against the breaker.
+    """
+
+    def __init__(self, timeout: Optional[float] = 30.0, max_retries: int = 2, backoff: float = 0.5,
+                 backoff_max: float = 8.0, breaker: Optional[CircuitBreaker] = None, max_workers: int = 32,
+                 limiter: Optional[ConcurrencyLimiter] = None):
+        self.timeout = timeout if timeout and timeout > 0 else None
+        self.max_retries = max(max_retries, 0)
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.limiter = limiter
+        self._max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    def _backoff_delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff * (2 ** attempt)))
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="upstream")
+            return self._executor
+
+    def _slot(self) -> _Slot:
+        if self.limiter is not None:
+            self.limiter.acquire()
+        return _Slot(self.limiter)
+
+    @asynccontextmanager
+    async def _async_slot(self):
+        if self.limiter is None:
+            yield
+            return
+        async with self.limiter.async_slot():
+            yield
+
+    def _attempt(self, fn: Callable[..., Any], args, slot: _Slot) -> Any:
+        if self.timeout is None:
+            return fn(*args)
+        # The request's context goes along, so a profiled request samples the worker
+        future = self._get_executor().submit(contextvars.copy_context().run, _run_followed, fn, args)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            if future.cancel():
+                raise WorkersBusy("No upstream worker free before the deadline") from None
+            # Still running upstream: it keeps the slot until it returns
+            slot.hand_to(future)
+            raise UpstreamTimeout(f"Upstream call exceeded {self.timeout:g}s deadline") from None
+
+    def _should_retry(self, operation: str, error: Exception, attempt: int) -> bool:
+        """Record a failed attempt; True when it is worth another try"""
+        if not is_retryable(error):
+            self.breaker.release()
+            return False
+        UPSTREAM_FAILURES.inc(operation, "timeout" if isinstance(error, UpstreamTimeout) else "error")
+        self.breaker.record_failure()
+        if attempt >= self.max_retries:
+            return False
+        if not self.breaker.allow():
+            # The breaker opened on this failure; stop retrying
+            return False
+        UPSTREAM_RETRIES.inc(operation)
+        return True
+
+    def _admit(self, operation: str):
+        if not self.breaker.allow():
+            UPSTREAM_FAILURES.inc(operation, "circuit_open")
+            raise CircuitOpenError("Upstream circuit breaker is open")
+
+    def _before_attempt(self, on_attempt: Optional[Callable[[], Any]]):
+        if on_attempt is None:
+            return
+        try:
+            on_attempt()
+        except Exception:
+            # Nothing reached the provider
+            self.breaker.release()
+            raise
+
+    @contextmanager
+    def _reservation(self):
+        """Release the breaker when a call ends without recording an outcome.
+
+        Exceptions are recorded by _should_retry; cancellation, interpreter
+        exit and a closed generator are not, and would otherwise leave a
+        half-open breaker waiting on a probe that never reports back.
+        """
+        try:
+            yield
+        except Exception:
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+
+    def call(self, operation: str, fn: Callable[..., Any], *args,
+             on_attempt: Optional[Callable[[], Any]] = None) -> Any:
+        self._admit(operation)
+        with self._reservation():
+            attempt = 0
+            while True:
+                self._before_attempt(on_attempt)
+                try:
+                    with self._slot() as slot:
+                        result = self._attempt(fn, args, slot)
+                except Exception as e:
+                    if not self._should_retry(operation, e, attempt):
+                        raise
+                    time.sleep(self._backoff_delay(attempt))
+                    attempt += 1
+                    continue
+                self.breaker.record_success()
+                return result
+
+    async def call_async(self, operation: str, fn: Callable[..., Awaitable[Any]], *args,
+                         on_attempt: Optional[Callable[[], Awaitable[Any]]] = None) -> Any:
+        self._admit(operation)
+        with self._reservation():
+            attempt = 0
+            while True:
+                if on_attempt is not None:
+                    try:
+                        await on_attempt()
+                    except Exception:
+                        self.breaker.release()
+                        raise
+                try:
+                    async with self._async_slot():
+                        if self.timeout is None:
+                            result = await fn(*args)
+                        else:
+                            try:
+                                result = await asyncio.wait_for(fn(*args), self.timeout)
+                            except asyncio.TimeoutError:
+                                raise UpstreamTimeout(f"Upstream call exceeded {self.timeout:g}s deadline") from None
+                except Exception as e:
+                    if not self._should_retry(operation, e, attempt):
+                        raise
+                    await asyncio.sleep(self._backoff_delay(attempt))
+                    attempt += 1
+                    continue
+                self.breaker.record_success()
+                return result
+
+    def call_stream(self, operation: str, fn: Callable[..., Iterator[str]], *args,
+                    on_attempt: Optional[Callable[[], Any]] = None) -> Iterator[str]:
+        self._admit(operation)
+        with self._reservation():
+            attempt = 0
+            while True:
+                self._before_attempt(on_attempt)
+                # Held until the stream ends, not just its first chunk
+                slot = self._slot()
+                try:
+                    chunks = fn(*args)
+                    # A stream that never starts is bounded by the same deadline as a call
+                    first = self._attempt(next, (chunks, None), slot)
+                except Exception as e:
+                    slot.release()
+                    if not self._should_retry(operation, e, attempt):
+                        raise
+                    time.sleep(self._backoff_delay(attempt))
+                    attempt += 1
+                    continue
+                break
+            try:
+                if first is not None:
+                    yield first
+                yield from chunks
+            except Exception as e:
+                # Output already reached the caller, so this cannot be retried
+                if is_retryable(e):
+                    UPSTREAM_FAILURES.inc(operation, "error")
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.release()
+                raise
+            finally:
+                slot.release()
+            self.breaker.record_success()
+
+
+def _run_followed(fn: Callable[..., Any], args) -> Any:
+    with follow_thread():
+        return fn(*args)
+
+
+def create_resilience_policy(max_workers: int = 32, limiter: Optional[ConcurrencyLimiter] = None) -> ResiliencePolicy:
+    """Build the provider call policy from AI_* environment variables"""
+    return ResiliencePolicy(
+        timeout=float(os.getenv('AI_TIMEOUT_SECONDS', '30')),
+        max_retries=int(os.getenv('AI_MAX_RETRIES', '2')),
+        backoff=float(os.getenv('AI_RETRY_BACKOFF_SECONDS', '0.5')),
+        backoff_max=float(os.getenv('AI_RETRY_BACKOFF_MAX_SECONDS', '8')),
+        breaker=CircuitBreaker(
+            failure_threshold=int(os.getenv('AI_BREAKER_FAILURE_THRESHOLD', '5')),
+            reset_timeout=float(os.getenv('AI_BREAKER_RESET_SECONDS', '30')),
+        ),
+        max_workers=max_workers,
+        limiter=limiter,
+    )
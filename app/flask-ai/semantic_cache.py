@@ -0,0 +1,365 @@
+"""Near-duplicate cache of triage summaries.
+
+The exact response cache only hits when the normalized input is identical.
+This cache also serves triages whose complaint is worded differently
+("dor de cabeça há 2 dias" / "headache for two days") but which share the
+same age band, severity bucket, gender, history and medications, and
+whose complaint names the same clinical terms and negation cues: "no chest
+pain" never matches "chest pain", and "vomiting blood" never matches
+"vomiting", however close their vectors are.
+
+Symptoms and duration are folded, common Portuguese complaint terms and
+number words are mapped to one English form, and the result is hashed
+into a fixed-size vector of character 3-grams and words (L2-normalized,
+so a dot product is the cosine similarity). Entries live in buckets keyed
+on the exact-match fields; a lookup scores only its bucket and takes the
+best of the top-k candidates at or above the similarity threshold.
+
+Everything is computed locally. NumPy is used when it is installed (one
+matrix-vector product per lookup); otherwise vectors are sparse dicts.
+"""
+import heapq
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from metrics import REGISTRY
+from triage_rules import fold
+
+try:
+    import numpy
+except ImportError:  # optional: pip install numpy
+    numpy = None
+
+SEMANTIC_LOOKUPS = REGISTRY.counter(
+    "triage_semantic_cache_lookups_total", "Near-duplicate cache lookups by result", ("result",))
+SEMANTIC_LOOKUP_SECONDS = REGISTRY.histogram(
+    "triage_semantic_cache_lookup_seconds", "Time to embed and search the near-duplicate cache")
+
+# Folded phrase -> canonical form, applied longest phrase first
+CANONICAL_TERMS = {
+    "dor de cabeca": "headache", "head ache": "headache", "cefaleia": "headache",
+    "dor no peito": "chest pain", "dor toracica": "chest pain",
+    "dor de garganta": "sore throat", "garganta inflamada": "sore throat",
+    "dor de barriga": "abdominal pain", "dor abdominal": "abdominal pain", "dor de estomago": "abdominal pain",
+    "stomach ache": "abdominal pain", "stomachache": "abdominal pain", "stomach pain": "abdominal pain",
+    "belly pain": "abdominal pain",
+    "dor nas costas": "back pain", "dor lombar": "back pain",
+    "falta de ar": "shortness of breath", "nariz escorrendo": "runny nose", "coriza": "runny nose",
+    "febre": "fever", "tosse": "cough", "enjoo": "nausea", "nausea": "nausea",
+    "vomito": "vomiting", "vomitos": "vomiting", "vomitando": "vomiting", "throwing up": "vomiting",
+    "diarreia": "diarrhea", "tontura": "dizziness", "cansaco": "fatigue", "fadiga": "fatigue",
+    "tiredness": "fatigue", "dor": "pain",
+    "hora": "hour", "horas": "hours", "dia": "day", "dias": "days", "semana": "week", "semanas": "weeks",
+    "mes": "month", "meses": "months", "ontem": "yesterday",
+    "sangue": "blood", "sangrando": "bleeding", "sangramento": "bleeding", "hemorragia": "bleeding",
+    "desmaio": "fainting", "desmaiou": "fainting", "convulsao": "seizure", "confusao": "confusion",
+    "dormencia": "numbness", "fraqueza": "weakness", "inchaco": "swelling", "manchas": "rash",
+    "one": "1", "two": "2", "dois": "2", "duas": "2", "three": "3", "tres": "3",
+    "four": "4", "quatro": "4", "five": "5", "cinco": "5",
+}
+STOPWORDS = frozenset((
+    "a", "an", "the", "and", "for", "since", "with", "of", "in", "my", "i", "have", "has", "had", "been", "am",
+    "de", "do", "da", "e", "o", "os", "as", "com", "desde", "ha", "faz", "eu", "estou", "tenho", "que", "em",
+))
+# Negation cues; kept in the text and required to match exactly (see clinical_signature)
+NEGATIONS = frozenset((
+    "no", "not", "none", "denies", "denied", "without", "never",
+    "sem", "nao", "nega", "negou", "nenhum", "nenhuma", "nunca",
+))
+# Words that change the clinical picture, beyond the canonical complaint terms
+RED_FLAG_WORDS = frozenset((
+    "blood", "bloody", "bleeding", "black", "chest", "breath", "breathing", "breathe", "unconscious",
+    "fainting", "fainted", "seizure", "confusion", "confused", "numbness", "weakness", "slurred", "drooping",
+    "paralysis", "suicidal", "suicide", "pregnant", "swelling", "swollen", "rash", "stiff", "neck",
+    "severe", "sudden", "worst", "blue", "allergic", "anaphylaxis", "burn", "fracture", "head", "injury",
+))
+_CANONICAL_RE = re.compile(
+    r"\b(" + "|".join(re.escape(term) for term in sorted(CANONICAL_TERMS, key=len, reverse=True)) + r")\b"
+)
+_TOKEN_RE = re.compile(r"\w+")
+
+# Every word of a canonical complaint term ("chest pain" -> "chest", "pain")
+CLINICAL_WORDS = frozenset(
+    word for term in CANONICAL_TERMS.values() for word in term.split()
+    if word not in STOPWORDS and not word.isdigit()
+    and word not in ("hour", "hours", "day", "days", "week", "weeks", "month", "months", "yesterday")
+) | RED_FLAG_WORDS
+
+AGE_BANDS = ((1, "infant"), (13, "child"), (18, "teen"), (40, "adult"), (65, "middle_aged"))
+SEVERITY_BUCKETS = ((3, "mild"), (6, "moderate"), (8, "severe"))
+
+
+def canonical_text(text: str) -> str:
+    """Folded text with canonical terms and without stopwords"""
+    text = _CANONICAL_RE.sub(lambda match: CANONICAL_TERMS[match.group(1)], fold(text))
+    return " ".join(token for token in _TOKEN_RE.findall(text) if token not in STOPWORDS)
+
+
+def age_band(age: Optional[int]) -> str:
+    if age is None:
+        return "unknown"
+    for limit, band in AGE_BANDS:
+        if age < limit:
+            return band
+    return "older"
+
+
+def severity_bucket(severity: Optional[int]) -> str:
+    if severity is None:
+        return "unknown"
+    for limit, bucket in SEVERITY_BUCKETS:
+        if severity <= limit:
+            return bucket
+    return "critical"
+
+
+def clinical_signature(text: str) -> str:
+    """Negation cues and clinical words in canonical text, sorted; near-duplicates must share it.
+
+    Vectors of "no chest pain" and "chest pain" are over 0.9 alike, so
+    similarity alone cannot tell a negated or extra red-flag term apart.
+    """
+    tokens = set(text.split())
+    return f"{' '.join(sorted(tokens & NEGATIONS))}|{' '.join(sorted(tokens & CLINICAL_WORDS))}"
+
+
+def bucket_key(triage_input: Dict[str, Any], namespace: str = "") -> Tuple[str, ...]:
+    """Fields a near-duplicate must match exactly"""
+    return (
+        namespace,
+        clinical_signature(canonical_text(triage_input.get("symptoms") or "")),
+        age_band(triage_input.get("age")),
+        severity_bucket(triage_input.get("severity")),
+        fold(triage_input.get("gender") or ""),
+        canonical_text(triage_input.get("medical_history") or ""),
+        canonical_text(triage_input.get("current_medications") or ""),
+    )
+
+
+class HashedNgramEmbedder:
+    """Hashes character 3-grams and words into ``dimensions`` buckets (signed), L2-normalized"""
+
+    def __init__(self, dimensions: int = 1024):
+        self.dimensions = dimensions
+
+    def features(self, text: str) -> Dict[int, float]:
+        counts: Dict[int, float] = {}
+        padded = f" {text} "
+        grams = [padded[i:i + 3] for i in range(len(padded) - 2)]
+        grams.extend(f"w:{token}" for token in text.split())
+        for gram in grams:
+            # hash() is salted per process, which is fine for an in-memory index
+            hashed = hash(gram)
+            index = hashed % self.dimensions
+            counts[index] = counts.get(index, 0.0) + (1.0 if hashed & (1 << 20) else -1.0)
+        norm = sum(value * value for value in counts.values()) ** 0.5
+        return {index: value / norm for index, value in counts.items() if value} if norm else {}
+
+    def embed(self, text: str) -> Any:
+        features = self.features(text)
+        if numpy is None:
+            return features
+        vector = numpy.zeros(self.dimensions, dtype=numpy.float32)
+        if features:
+            vector[list(features)] = list(features.values())
+        return vector
+
+
+class _Bucket:
+    """Vectors of one bucket: NumPy rows reused through a free list, or an
+    inverted index (feature -> {slot: weight}) of the sparse vectors"""
+
+    __slots__ = ("matrix", "vectors", "postings", "entries", "free")
+
+    def __init__(self, dimensions: int):
+        self.matrix = numpy.zeros((1, dimensions), dtype=numpy.float32) if numpy is not None else None
+        self.vectors: List[Any] = []
+        self.postings: Dict[int, Dict[int, float]] = {}
+        # slot -> entry id (None when free)
+        self.entries: List[Optional[int]] = []
+        self.free: List[int] = []
+
+    def add(self, entry_id: int, vector: Any) -> int:
+        if self.free:
+            slot = self.free.pop()
+            self.entries[slot] = entry_id
+        else:
+            slot = len(self.entries)
+            self.entries.append(entry_id)
+            if numpy is None:
+                self.vectors.append(None)
+            elif slot == len(self.matrix):
+                self.matrix = numpy.vstack([self.matrix, numpy.zeros_like(self.matrix)])
+        if numpy is None:
+            self.vectors[slot] = vector
+            for index, value in vector.items():
+                self.postings.setdefault(index, {})[slot] = value
+        else:
+            self.matrix[slot] = vector
+        return slot
+
+    def remove(self, slot: int):
+        self.entries[slot] = None
+        self.free.append(slot)
+        if numpy is None:
+            for index in self.vectors[slot]:
+                posting = self.postings[index]
+                del posting[slot]
+                if not posting:
+                    del self.postings[index]
+            self.vectors[slot] = None
+        else:
+            self.matrix[slot] = 0.0
+
+    @property
+    def size(self) -> int:
+        return len(self.entries) - len(self.free)
+
+    def top_k(self, query: Any, k: int) -> List[Tuple[float, int]]:
+        """(similarity, entry id) of the k most similar live entries, best first"""
+        if numpy is not None:
+            scores = self.matrix[:len(self.entries)] @ query
+            if len(scores) > k:
+                candidates = numpy.argpartition(scores, -k)[-k:]
+            else:
+                candidates = numpy.arange(len(scores))
+            ranked = [(float(scores[slot]), self.entries[slot]) for slot in candidates]
+            ranked = [(score, entry_id) for score, entry_id in ranked if entry_id is not None]
+        else:
+            totals: Dict[int, float] = {}
+            for index, weight in query.items():
+                for slot, value in self.postings.get(index, {}).items():
+                    totals[slot] = totals.get(slot, 0.0) + weight * value
+            ranked = [(score, self.entries[slot]) for slot, score in totals.items()]
+        return heapq.nlargest(k, ranked, key=lambda item: item[0])
+
+
+class SemanticCache:
+    """Bounded near-duplicate cache with LRU eviction and a time-to-live.
+
+    A lookup returns the cached value of the most similar live entry in the
+    input's bucket when its similarity reaches ``threshold``. At most
+    ``max_entries`` entries are kept across all buckets. Values are
+    shallow-copied in and out, like ResponseCache.
+    """
+
+    def __init__(self, max_entries: int = 0, ttl_seconds: float = 3600, threshold: float = 0.95, top_k: int = 5,
+                 dimensions: int = 1024, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self.top_k = max(1, top_k)
+        self.embedder = HashedNgramEmbedder(dimensions)
+        self._clock = clock
+        self._buckets: Dict[Tuple[str, ...], _Bucket] = {}
+        # entry id -> (bucket key, slot, expires_at, value), least recently used first
+        self._entries: "OrderedDict[int, Tuple[Tuple[str, ...], int, float, Dict[str, Any]]]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _text(self, triage_input: Dict[str, Any]) -> str:
+        return canonical_text(f"{triage_input.get('symptoms') or ''} {triage_input.get('duration') or ''}")
+
+    def get(self, triage_input: Dict[str, Any], namespace: str = "") -> Optional[Tuple[Dict[str, Any], float]]:
+        """(cached value, similarity) of the closest match above the threshold, or None"""
+        if not self.enabled:
+            return None
+        started = time.perf_counter()
+        key = bucket_key(triage_input, namespace)
+        query = self.embedder.embed(self._text(triage_input))
+        result = None
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                now = self._clock()
+                for similarity, entry_id in bucket.top_k(query, self.top_k):
+                    if similarity < self.threshold:
+                        break
+                    _, slot, expires_at, value = self._entries[entry_id]
+                    if now >= expires_at:
+                        self._remove(entry_id)
+                        self.expirations += 1
+                        continue
+                    self._entries.move_to_end(entry_id)
+                    result = (dict(value), similarity)
+                    break
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        SEMANTIC_LOOKUP_SECONDS.observe(time.perf_counter() - started)
+        SEMANTIC_LOOKUPS.inc("hit" if result is not None else "miss")
+        return result
+
+    def put(self, triage_input: Dict[str, Any], value: Dict[str, Any], namespace: str = ""):
+        if not self.enabled:
+            return
+        key = bucket_key(triage_input, namespace)
+        vector = self.embedder.embed(self._text(triage_input))
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = _Bucket(self.embedder.dimensions)
+            entry_id = self._next_id
+            self._next_id += 1
+            slot = bucket.add(entry_id, vector)
+            self._entries[entry_id] = (key, slot, self._clock() + self.ttl_seconds, dict(value))
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, entry_id: int):
+        key, slot, _, _ = self._entries.pop(entry_id)
+        bucket = self._buckets[key]
+        bucket.remove(slot)
+        if bucket.size == 0:
+            del self._buckets[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "backend": "numpy" if numpy is not None else "python",
+                "size": len(self._entries),
+                "buckets": len(self._buckets),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+def create_semantic_cache() -> SemanticCache:
+    """Build the near-duplicate cache from SEMANTIC_CACHE_* environment variables (off by default)"""
+    return SemanticCache(
+        max_entries=int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES', '0')),
+        ttl_seconds=float(os.getenv('SEMANTIC_CACHE_TTL_SECONDS', '3600')),
+        threshold=float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.95')),
+        top_k=int(os.getenv('SEMANTIC_CACHE_TOP_K', '5')),
+        dimensions=int(os.getenv('SEMANTIC_CACHE_DIMENSIONS', '1024')),
+    )
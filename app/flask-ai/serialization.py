@@ -0,0 +1,83 @@
+"""JSON encoding, response shaping and compression for the HTTP layer.
+
+orjson is used when it is installed and the stdlib json module otherwise;
+both produce compact UTF-8 JSON. FastJSONProvider plugs the same encoder
+into Flask, so ``request.get_json()`` and ``jsonify`` use it too.
+"""
+import gzip
+import json
+import os
+from typing import Any, Dict, Tuple
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional: pip install orjson
+    orjson = None
+
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+# Fields left out of compact responses; large and rarely read by clients
+COMPACT_OMIT = ("raw_response", "triage_input")
+
+GZIP_MIN_BYTES = int(os.getenv('GZIP_MIN_BYTES', '1024'))
+GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', '5'))
+
+
+def dumps(payload: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def loads(data: Any) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by dumps/loads above"""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if kwargs.get("indent"):
+            # Debug pretty-printing
+            return super().dumps(obj, **kwargs)
+        return dumps(obj).decode("utf-8")
+
+    def loads(self, s: Any, **kwargs: Any) -> Any:
+        return loads(s)
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj), mimetype=self.mimetype)
+
+
+def wants_compact(data: Any, prefer: str) -> bool:
+    """True when the caller asked for a compact payload ("compact": true or Prefer: return=minimal)"""
+    compact = data.get('compact') if hasattr(data, 'get') else None
+    if isinstance(compact, str):
+        compact = compact.strip().lower() in ('1', 'true', 'yes')
+    return bool(compact) or 'return=minimal' in (prefer or '').lower()
+
+
+def shape(payload: Dict[str, Any], compact: bool) -> Dict[str, Any]:
+    if not compact or not isinstance(payload, dict):
+        return payload
+    return {key: value for key, value in payload.items() if key not in COMPACT_OMIT}
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    for coding in (accept_encoding or '').lower().split(','):
+        name, _, params = coding.strip().partition(';')
+        if name.strip() in ('gzip', '*'):
+            return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+def maybe_gzip(body: bytes, accept_encoding: str) -> Tuple[bytes, bool]:
+    """Compress bodies of at least GZIP_MIN_BYTES for clients that accept gzip (0 disables)"""
+    if GZIP_MIN_BYTES <= 0 or len(body) < GZIP_MIN_BYTES or not accepts_gzip(accept_encoding):
+        return body, False
+    return gzip.compress(body, compresslevel=GZIP_LEVEL), True
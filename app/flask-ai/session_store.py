@@ -0,0 +1,424 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field, fields, replace
+from typing import Any, Callable, Dict, List, Optional
+
+
+@dataclass(slots=True)
+class TriageSession:
+    """Triage context kept between /generate_summary and follow-up /chat calls"""
+    symptoms: str = ""
+    severity: Optional[int] = None
+    duration: Optional[str] = ""
+    age: Optional[int] = None
+    gender: Optional[str] = ""
+    medical_history: str = ""
+    current_medications: str = ""
+    assessment: str = ""
+    plan: str = ""
+    last_summary: str = ""
+    created_at: str = ""
+    updated_at: str = ""
+    # Rolling chat window and condensed older turns (see chat_history.fit_history)
+    history: List[Dict[str, str]] = field(default_factory=list)
+    history_summary: str = ""
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TriageSession":
+        known = {f.name for f in fields(cls)}
+        return cls(**{key: value for key, value in data.items() if key in known})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def approx_size(self) -> int:
+        """Rough byte footprint used for the store's memory budget"""
+        size = 64
+        for f in fields(self):
+            value = getattr(self, f.name)
+            if isinstance(value, str):
+                size += len(value)
+            elif isinstance(value, list):
+                size += sum(len(turn.get("content", "")) + 48 for turn in value)
+            else:
+                size += 8
+        return size
+
+
+class SessionStore(ABC):
+    """Storage backend for triage sessions"""
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[TriageSession]:
+        """Return the session or None if unknown or expired"""
+
+    @abstractmethod
+    def put(self, session_id: str, session: TriageSession) -> None:
+        """Insert or replace a session"""
+
+    @abstractmethod
+    def update(self, session_id: str,
+               fn: Callable[[TriageSession], Optional[TriageSession]]) -> Optional[TriageSession]:
+        """Atomically replace a session with fn(session); fn returns None to leave it as is.
+
+        Returns the stored result, or None when the session is unknown,
+        expired or fn declined.
+        """
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        """Remove a session if present"""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        """Size and eviction counters"""
+
+    def __contains__(self, session_id: str) -> bool:
+        return self.get(session_id) is not None
+
+
+class _Entry:
+    __slots__ = ("session", "size", "last_access")
+
+    def __init__(self, session: TriageSession, size: int, last_access: float):
+        self.session = session
+        self.size = size
+        self.last_access = last_access
+
+
+class InMemorySessionStore(SessionStore):
+    """Process-local store with LRU and idle-TTL eviction.
+
+    Entries are kept in access order, so both the least recently used and
+    the longest idle session sit at the front of the dict.
+    """
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024,
+                 idle_ttl_seconds: float = 3600, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions_capacity = 0
+        self.evictions_ttl = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, session_id: str) -> Optional[TriageSession]:
+        with self._lock:
+            now = self._clock()
+            entry = self._entries.get(session_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            if self._is_expired(entry, now):
+                self._remove(session_id)
+                self.evictions_ttl += 1
+                self.misses += 1
+                return None
+            entry.last_access = now
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            return entry.session
+
+    def put(self, session_id: str, session: TriageSession) -> None:
+        size = session.approx_size()
+        with self._lock:
+            self._store(session_id, session, size, self._clock())
+
+    def update(self, session_id: str,
+               fn: Callable[[TriageSession], Optional[TriageSession]]) -> Optional[TriageSession]:
+        with self._lock:
+            now = self._clock()
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            if self._is_expired(entry, now):
+                self._remove(session_id)
+                self.evictions_ttl += 1
+                return None
+            # fn works on a copy, so readers holding the stored session never see it half-updated
+            session = fn(replace(entry.session))
+            if session is None:
+                return None
+            self._store(session_id, session, session.approx_size(), now)
+            return session
+
+    def _store(self, session_id: str, session: TriageSession, size: int, now: float):
+        if session_id in self._entries:
+            self._remove(session_id)
+        self._entries[session_id] = _Entry(session, size, now)
+        self._bytes += size
+        self._evict_expired(now)
+        self._evict_over_budget()
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            if session_id in self._entries:
+                self._remove(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "size": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "idle_ttl_seconds": self.idle_ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions_capacity": self.evictions_capacity,
+                "evictions_ttl": self.evictions_ttl,
+            }
+
+    def _is_expired(self, entry: _Entry, now: float) -> bool:
+        return self.idle_ttl_seconds > 0 and now - entry.last_access > self.idle_ttl_seconds
+
+    def _remove(self, session_id: str):
+        entry = self._entries.pop(session_id)
+        self._bytes -= entry.size
+
+    def _evict_expired(self, now: float):
+        while self._entries:
+            session_id, entry = next(iter(self._entries.items()))
+            if not self._is_expired(entry, now):
+                break
+            self._remove(session_id)
+            self.evictions_ttl += 1
+
+    def _evict_over_budget(self):
+        # Never evict the entry that was just written
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+        ):
+            session_id = next(iter(self._entries))
+            self._remove(session_id)
+            self.evictions_capacity += 1
+
+
+class _ConnectionPool:
+    """Small pool of SQLite connections, rebuilt after a fork"""
+
+    def __init__(self, path: str, size: int):
+        self.path = path
+        self.size = size
+        self._pid = None
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        with self._lock:
+            # Connections must not cross a fork (e.g. gunicorn --preload)
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._idle = queue.LifoQueue()
+                self._created = 0
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                if self._created < self.size:
+                    self._created += 1
+                    return self._connect()
+        return self._idle.get()
+
+    def release(self, conn: sqlite3.Connection):
+        self._idle.put(conn)
+
+
+class SQLiteSessionStore(SessionStore):
+    """File-backed store shared by every worker process on the host.
+
+    Uses SQLite in WAL mode so readers in one worker do not block the
+    writer in another. TTL and capacity limits are enforced by periodic
+    sweeps instead of on every write.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024,
+                 idle_ttl_seconds: float = 3600, pool_size: int = 4, sweep_interval: int = 100,
+                 clock: Callable[[], float] = time.time):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.sweep_interval = sweep_interval
+        # Skip rewriting last_access on reads that happen in quick succession
+        self.touch_interval = idle_ttl_seconds / 10 if idle_ttl_seconds > 0 else 60
+        self._clock = clock
+        self._pool = _ConnectionPool(path, pool_size)
+        self._counter_lock = threading.Lock()
+        self._puts_since_sweep = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions_capacity = 0
+        self.evictions_ttl = 0
+        self._execute(
+            "CREATE TABLE IF NOT EXISTS triage_sessions ("
+            "session_id TEXT PRIMARY KEY, data TEXT NOT NULL, "
+            "size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._execute("CREATE INDEX IF NOT EXISTS idx_triage_sessions_last_access ON triage_sessions(last_access)")
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        conn = self._pool.acquire()
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            self._pool.release(conn)
+
+    def _count(self, name: str, amount: int = 1):
+        with self._counter_lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def __len__(self) -> int:
+        return self._execute("SELECT COUNT(*) FROM triage_sessions")[0][0]
+
+    def get(self, session_id: str) -> Optional[TriageSession]:
+        rows = self._execute(
+            "SELECT data, last_access FROM triage_sessions WHERE session_id = ?", (session_id,)
+        )
+        if not rows:
+            self._count("misses")
+            return None
+        data, last_access = rows[0]
+        now = self._clock()
+        if self.idle_ttl_seconds > 0 and now - last_access > self.idle_ttl_seconds:
+            self.delete(session_id)
+            self._count("evictions_ttl")
+            self._count("misses")
+            return None
+        if now - last_access > self.touch_interval:
+            self._execute(
+                "UPDATE triage_sessions SET last_access = ? WHERE session_id = ?", (now, session_id)
+            )
+        self._count("hits")
+        return TriageSession.from_dict(json.loads(data))
+
+    def put(self, session_id: str, session: TriageSession) -> None:
+        data = json.dumps(session.to_dict(), separators=(",", ":"))
+        self._execute(
+            "INSERT OR REPLACE INTO triage_sessions (session_id, data, size, last_access) VALUES (?, ?, ?, ?)",
+            (session_id, data, len(data), self._clock()),
+        )
+        with self._counter_lock:
+            self._puts_since_sweep += 1
+            sweep = self._puts_since_sweep >= self.sweep_interval
+            if sweep:
+                self._puts_since_sweep = 0
+        if sweep:
+            self.sweep()
+
+    def update(self, session_id: str,
+               fn: Callable[[TriageSession], Optional[TriageSession]]) -> Optional[TriageSession]:
+        conn = self._pool.acquire()
+        try:
+            # IMMEDIATE takes the write lock before the read, so no other worker writes in between
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT data, last_access FROM triage_sessions WHERE session_id = ?", (session_id,)
+                ).fetchone()
+                now = self._clock()
+                session = None
+                if row is not None and not (self.idle_ttl_seconds > 0 and now - row[1] > self.idle_ttl_seconds):
+                    session = fn(TriageSession.from_dict(json.loads(row[0])))
+                if session is not None:
+                    data = json.dumps(session.to_dict(), separators=(",", ":"))
+                    conn.execute(
+                        "UPDATE triage_sessions SET data = ?, size = ?, last_access = ? WHERE session_id = ?",
+                        (data, len(data), now, session_id),
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            return session
+        finally:
+            self._pool.release(conn)
+
+    def delete(self, session_id: str) -> None:
+        self._execute("DELETE FROM triage_sessions WHERE session_id = ?", (session_id,))
+
+    def sweep(self):
+        """Drop idle sessions, then the least recently used ones over budget"""
+        conn = self._pool.acquire()
+        try:
+            if self.idle_ttl_seconds > 0:
+                cursor = conn.execute(
+                    "DELETE FROM triage_sessions WHERE last_access < ?",
+                    (self._clock() - self.idle_ttl_seconds,),
+                )
+                self._count("evictions_ttl", max(cursor.rowcount, 0))
+            count, total_bytes = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM triage_sessions"
+            ).fetchone()
+            excess = max(count - self.max_entries, 0)
+            if total_bytes > self.max_bytes and count:
+                average = total_bytes / count
+                excess = max(excess, int((total_bytes - self.max_bytes) / average) + 1)
+            if excess:
+                cursor = conn.execute(
+                    "DELETE FROM triage_sessions WHERE session_id IN ("
+                    "SELECT session_id FROM triage_sessions ORDER BY last_access LIMIT ?)",
+                    (excess,),
+                )
+                self._count("evictions_capacity", max(cursor.rowcount, 0))
+        finally:
+            self._pool.release(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        count, total_bytes = self._execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM triage_sessions"
+        )[0]
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "size": count,
+            "bytes": total_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "idle_ttl_seconds": self.idle_ttl_seconds,
+            # Counters below are per worker process
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions_capacity": self.evictions_capacity,
+            "evictions_ttl": self.evictions_ttl,
+        }
+
+
+def create_session_store() -> SessionStore:
+    """Build the session store configured through environment variables"""
+    backend = os.getenv('SESSION_BACKEND', 'memory').strip().lower()
+    limits = {
+        "max_entries": int(os.getenv('SESSION_MAX_ENTRIES', '10000')),
+        "max_bytes": int(os.getenv('SESSION_MAX_BYTES', str(64 * 1024 * 1024))),
+        "idle_ttl_seconds": float(os.getenv('SESSION_IDLE_TTL_SECONDS', '3600')),
+    }
+    if backend == 'memory':
+        return InMemorySessionStore(**limits)
+    if backend == 'sqlite':
+        return SQLiteSessionStore(
+            os.getenv('SESSION_DB_PATH', '/tmp/triage_sessions.db'),
+            pool_size=int(os.getenv('SESSION_DB_POOL_SIZE', '4')),
+            **limits,
+        )
+    raise ValueError(f"Unknown SESSION_BACKEND '{backend}' (expected 'memory' or 'sqlite')")
@@ -0,0 +1,111 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class _AsyncCall:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Collapses concurrent calls that share a key into one execution.
+
+    The first caller for a key runs the function; callers that arrive
+    while it is in flight wait for it and receive the same result (or
+    exception). Results are not retained once the call finishes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._async_calls: Dict[Tuple[int, Hashable], _AsyncCall] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def in_flight(self) -> int:
+        return len(self._calls) + len(self._async_calls)
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Run fn once per key; returns (result, shared) where shared is True for followers"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.leaders += 1
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result, False
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Coroutine variant of do for callers on the same event loop.
+
+        The shared call runs as its own task and every caller awaits it
+        through a shield, so cancelling any one caller, the leader included,
+        leaves the others waiting on the result. The task is only cancelled
+        once every caller has given up on it.
+        """
+        loop = asyncio.get_running_loop()
+        loop_key = (id(loop), key)
+        call = self._async_calls.get(loop_key)
+        leader = call is None
+        if leader:
+            call = _AsyncCall(loop.create_task(fn()))
+            self._async_calls[loop_key] = call
+            self.leaders += 1
+            call.task.add_done_callback(lambda _: self._forget_async(loop_key, call))
+        else:
+            self.coalesced += 1
+        call.waiters += 1
+        try:
+            result = await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                self._forget_async(loop_key, call)
+                call.task.cancel()
+            raise
+        return result, not leader
+
+    def _forget_async(self, loop_key: Tuple[int, Hashable], call: "_AsyncCall"):
+        if self._async_calls.get(loop_key) is call:
+            del self._async_calls[loop_key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": self.in_flight(),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,245 @@
+"""Single-pass parser for SOAP-formatted model output.
+
+Each line is stripped once and its text before the first colon is looked up
+in one dispatch table of header names; body fragments are collected per
+section and joined once at the end. Headers
+are recognised only at the start of a line, with optional markdown (``#``,
+``**bold**``, numbering) and in English or Portuguese:
+
+    **Plan:** Rest and fluids        -> plan
+    ## Avaliação: Baixa prioridade   -> assessment
+    Next Steps: Teleconsultation     -> nextStep
+
+SoapParser is incremental: feed() it chunks of a streamed reply and it
+reports each section as soon as the next header closes it.
+
+parse_soap_json reads structured-output replies instead: one JSON object
+with the same keys, checked against the expected types in a single pass.
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+TEXT_SECTIONS = ("subjective", "objective", "assessment", "plan", "nextStep", "summary")
+
+TRUE_VALUES = frozenset(("true", "yes", "1", "verdadeiro", "sim"))
+
+_SECTION_FOR_NAME = {
+    "subjective": "subjective", "subjetivo": "subjective",
+    "objective": "objective", "objetivo": "objective",
+    "assessment": "assessment", "avaliação": "assessment", "avaliacao": "assessment",
+    "plan": "plan", "plano": "plan",
+    "summary": "summary", "resumo": "summary",
+    "next step": "nextStep", "next steps": "nextStep",
+    "recommended next step": "nextStep", "recommended next steps": "nextStep",
+    "próximo passo": "nextStep", "próximos passos": "nextStep",
+    "proximo passo": "nextStep", "proximos passos": "nextStep",
+    "start_chat": "start_chat",
+}
+
+# Keys a structured reply must carry; "summary" is optional
+_REQUIRED_JSON_SECTIONS = ("subjective", "objective", "assessment", "plan", "nextStep")
+
+# Markdown and numbering around a header name: "## 1. **Plan**"
+_HEADER_DECORATION = " \t#>*_0123456789.)"
+
+# Longest header text worth looking up ("recommended next steps (optional)")
+_MAX_HEADER_CHARS = 48
+
+# Raw header text -> section (or None). Models repeat the same few headers, so
+# most lines resolve with one dict lookup; cleared when it grows too large.
+_header_cache: Dict[str, Optional[str]] = {}
+_HEADER_CACHE_MAX = 4096
+
+
+def _section_for_head(head: str) -> Optional[str]:
+    key = head.lower()
+    if "(" in key:
+        # "Plan (short term):"
+        key = key[:key.index("(")]
+    key = key.strip(_HEADER_DECORATION)
+    section = _SECTION_FOR_NAME.get(key)
+    if section is None and "  " in key:
+        section = _SECTION_FOR_NAME.get(" ".join(key.split()))
+    if len(_header_cache) >= _HEADER_CACHE_MAX:
+        _header_cache.clear()
+    _header_cache[head] = section
+    return section
+
+
+def match_header(line: str) -> Optional[Tuple[str, Optional[str]]]:
+    """Return (section, inline text) if the stripped line is a section header.
+
+    Inline text is None when the header has no colon ("Plan" on its own line).
+    """
+    head, colon, rest = line.partition(":")
+    if len(head) > _MAX_HEADER_CHARS:
+        return None
+    section = _header_cache.get(head, False)
+    if section is False:
+        section = _section_for_head(head)
+    if section is None:
+        return None
+    return section, _inline_text(head, rest) if colon else None
+
+
+def _inline_text(head: str, rest: str) -> str:
+    rest = rest.strip()
+    bold = head[:2]
+    if bold == "**" or bold == "__":
+        # "**Plan:** text" and "**Plan: text**"
+        if rest.startswith(bold):
+            rest = rest[2:].lstrip()
+        if rest.endswith(bold):
+            rest = rest[:-2].rstrip()
+    return rest
+
+
+def parse_start_chat(value: str) -> bool:
+    return value.strip(" *_.").lower() in TRUE_VALUES
+
+
+def _scan(text: str, fragments: Dict[str, List[str]], current: Optional[str], start_chat: Optional[bool],
+          closed: List[str]) -> Tuple[Optional[str], Optional[bool]]:
+    """Apply complete lines to fragments; return the open section and start_chat.
+
+    Sections closed by a header in text are appended to closed.
+    """
+    section_fragments = fragments.get(current) if current != "start_chat" else None
+    header_cache = _header_cache
+    for line in text.split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+        # match_header, inlined: this loop runs once per line of every reply
+        head, colon, rest = line.partition(":")
+        section = header_cache.get(head, False) if len(head) <= _MAX_HEADER_CHARS else None
+        if section is False:
+            section = _section_for_head(head)
+        if section is None:
+            if section_fragments is not None and line[0] != "-" and not line.startswith("**"):
+                section_fragments.append(line)
+            continue
+
+        if current is not None:
+            closed.append(current)
+        current = section
+        inline = _inline_text(head, rest) if colon else None
+        if current == "start_chat":
+            section_fragments = None
+            if inline is not None:
+                start_chat = parse_start_chat(inline)
+        else:
+            # A repeated header replaces what the section said before
+            section_fragments = fragments[current] = [inline] if inline else []
+    return current, start_chat
+
+
+def _result(fragments: Dict[str, List[str]], start_chat: Optional[bool], defaults: Dict[str, Any]) -> Dict[str, Any]:
+    # Copying defaults keeps their key order and leaves out only what the reply filled in
+    result = dict(defaults)
+    for section, section_fragments in fragments.items():
+        if section_fragments:
+            result[section] = " ".join(section_fragments)
+    if start_chat is not None:
+        result["start_chat"] = start_chat
+    return result
+
+
+class SoapParser:
+    """Incremental SOAP parser.
+
+    ``defaults`` supplies every section (and start_chat) and is the value of
+    any section the model leaves out or leaves empty. Complete lines are
+    parsed as they arrive; a trailing partial line waits for its newline or
+    close(). Body lines starting with "-" or "**" are skipped, as are lines
+    after a start_chat header, matching the previous parser.
+    """
+
+    __slots__ = ("_defaults", "_fragments", "_start_chat", "_current", "_partial")
+
+    def __init__(self, defaults: Dict[str, Any]):
+        self._defaults = defaults
+        self._fragments: Dict[str, List[str]] = {}
+        self._start_chat: Optional[bool] = None
+        self._current: Optional[str] = None
+        self._partial = ""
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Consume a chunk; return (section, value) for sections it completed"""
+        if "\n" not in chunk:
+            self._partial += chunk
+            return []
+        buffered = self._partial + chunk
+        cut = buffered.rindex("\n")
+        self._partial = buffered[cut + 1:]
+        return [(section, self.value(section)) for section in self._add_lines(buffered[:cut])]
+
+    def close(self) -> List[Tuple[str, Any]]:
+        """Flush the last partial line; return the sections still open"""
+        closed = self._add_lines(self._partial) if self._partial else []
+        self._partial = ""
+        if self._current is not None:
+            closed.append(self._current)
+            self._current = None
+        return [(section, self.value(section)) for section in closed]
+
+    def _add_lines(self, text: str) -> List[str]:
+        closed: List[str] = []
+        self._current, self._start_chat = _scan(text, self._fragments, self._current, self._start_chat, closed)
+        return closed
+
+    def value(self, section: str) -> Any:
+        if section == "start_chat":
+            return self._start_chat if self._start_chat is not None else self._defaults["start_chat"]
+        fragments = self._fragments.get(section)
+        return " ".join(fragments) if fragments else self._defaults[section]
+
+    def result(self) -> Dict[str, Any]:
+        return _result(self._fragments, self._start_chat, self._defaults)
+
+
+def parse_soap(text: str, defaults: Dict[str, Any]) -> Dict[str, Any]:
+    """Parse a complete reply in one pass"""
+    fragments: Dict[str, List[str]] = {}
+    _, start_chat = _scan(text, fragments, None, None, [])
+    return _result(fragments, start_chat, defaults)
+
+
+def parse_soap_json(text: str, defaults: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Parse a structured-output reply; None when it is not a valid SOAP object.
+
+    Accepts a bare object or one wrapped in a ```json fence. Every required
+    section must be a string and start_chat a boolean (or "true"/"false");
+    empty sections take their default like in the text parser.
+    """
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.strip("`").strip()
+        if text[:4].lower() == "json":
+            text = text[4:].lstrip()
+    if not text.startswith("{"):
+        return None
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+
+    result = {}
+    for section in TEXT_SECTIONS:
+        value = data.get(section)
+        if value is None and section not in _REQUIRED_JSON_SECTIONS:
+            value = ""
+        if not isinstance(value, str):
+            return None
+        value = value.strip()
+        result[section] = value if value else defaults[section]
+
+    start_chat = data.get("start_chat")
+    if isinstance(start_chat, str):
+        start_chat = parse_start_chat(start_chat)
+    if not isinstance(start_chat, bool):
+        return None
+    result["start_chat"] = start_chat
+    return result
@@ -0,0 +1,30 @@
+"""Shared fixtures; every test runs against the local mock provider."""
+import os
+import sys
+
+FLASK_AI_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if FLASK_AI_DIR not in sys.path:
+    sys.path.insert(0, FLASK_AI_DIR)
+
+os.environ['AGENT_PROVIDER'] = 'mock'
+os.environ['MOCK_LATENCY_MS'] = '0'
+
+import pytest  # noqa: E402
+
+
+class FakeClock:
+    """Manually advanced replacement for time.monotonic"""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
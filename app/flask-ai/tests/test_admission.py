@@ -0,0 +1,81 @@
+import asyncio
+import threading
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+
+
+def test_disabled_controller_admits_everything():
+    controller = AdmissionController(rate=0)
+    for _ in range(100):
+        controller.acquire()
+
+
+def test_burst_is_admitted_without_waiting(clock):
+    controller = AdmissionController(rate=1, burst=3, max_wait=0, clock=clock)
+    for _ in range(3):
+        controller.acquire()
+
+    with pytest.raises(AdmissionRejected) as raised:
+        controller.acquire()
+    assert raised.value.status == 429
+    assert raised.value.reason == "rate_limited"
+
+
+def test_tokens_refill_over_time(clock):
+    controller = AdmissionController(rate=2, burst=1, max_wait=0, clock=clock)
+    controller.acquire()
+    clock.advance(0.5)
+
+    controller.acquire()
+
+
+def test_full_queue_sheds_with_503(clock):
+    controller = AdmissionController(rate=1, burst=1, max_queue=0, clock=clock)
+    controller.acquire()
+
+    with pytest.raises(AdmissionRejected) as raised:
+        controller.acquire()
+    assert raised.value.status == 503
+
+
+def test_higher_priority_is_admitted_first():
+    controller = AdmissionController(rate=5, burst=1, max_wait=5)
+    controller.acquire()
+    order = []
+    started = threading.Barrier(3)
+
+    def wait(priority):
+        started.wait()
+        if priority == 9:
+            # Let the low-priority caller queue first
+            while controller.queue_depth < 1:
+                pass
+        controller.acquire(priority)
+        order.append(priority)
+
+    threads = [threading.Thread(target=wait, args=(priority,)) for priority in (1, 9)]
+    for thread in threads:
+        thread.start()
+    started.wait()
+    for thread in threads:
+        thread.join(5)
+
+    assert order == [9, 1]
+
+
+def test_cancelled_async_waiter_leaves_the_queue():
+    controller = AdmissionController(rate=1, burst=1, max_wait=5)
+    controller.acquire()
+
+    async def main():
+        waiter = asyncio.ensure_future(controller.acquire_async())
+        await asyncio.sleep(0.01)
+        assert controller.queue_depth == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+    asyncio.run(main())
+    assert controller.queue_depth == 0
@@ -0,0 +1,107 @@
+import threading
+
+import pytest
+
+from metrics import REQUESTS
+from tracing import Tracer
+
+
+@pytest.fixture(scope="module")
+def agent():
+    from agent import Agent
+
+    return Agent()
+
+
+def profiler_threads():
+    return [thread for thread in threading.enumerate() if thread.name == "trace-profiler" and thread.is_alive()]
+
+
+def test_run_uses_the_mock_provider(agent):
+    result = agent.run({"symptoms": "Headache for two days", "severity": 4, "age": 30}, use_cache=False)
+
+    assert result["ai_provider"] == "MockAI"
+    assert result["assessment"]
+    assert result["session_id"]
+
+
+def test_disconnected_chat_stream_is_recorded_as_cancelled(agent, monkeypatch):
+    monkeypatch.setattr(agent, "tracer", Tracer(allow_header=True, allow_header_profile=True))
+    before = REQUESTS.value("chat_stream", "cancelled")
+
+    events = agent.run_chat_stream({"message": "I have a headache and some fever"}, trace="profile")
+    event, _ = next(events)
+    assert event == "token"
+    assert profiler_threads()
+    # What the server does when the SSE client disconnects
+    events.close()
+
+    assert not profiler_threads()
+    assert REQUESTS.value("chat_stream", "cancelled") == before + 1
+
+
+def test_completed_chat_stream_is_not_cancelled(agent):
+    before = REQUESTS.value("chat_stream", "cancelled")
+
+    events = list(agent.run_chat_stream({"message": "I have a headache"}))
+
+    assert events[-1][0] == "done"
+    assert REQUESTS.value("chat_stream", "cancelled") == before
+
+
+def test_rule_enrichment_runs_at_background_priority_and_keeps_chat_updates(agent, monkeypatch):
+    from admission import BACKGROUND_PRIORITY
+    from session_store import TriageSession
+
+    priorities = []
+    monkeypatch.setattr(agent.admission, "acquire", lambda priority=5: priorities.append(priority))
+    triage_input = agent._normalize_triage_input({"symptoms": "Crushing chest pain", "severity": 9, "age": 60})
+
+    agent.session_store.put("enrich-me", TriageSession(symptoms="Crushing chest pain", assessment="Templated"))
+    agent._enrich_slots.acquire()
+    agent._enrich_session("enrich-me", triage_input, "Templated")
+
+    assert priorities == [BACKGROUND_PRIORITY]
+    assert agent.session_store.get("enrich-me").assessment != "Templated"
+
+    # A chat turn updated the session first; enrichment leaves it alone
+    agent.session_store.put("chatted", TriageSession(symptoms="Crushing chest pain", assessment="From chat"))
+    agent._enrich_slots.acquire()
+    agent._enrich_session("chatted", triage_input, "Templated")
+
+    assert agent.session_store.get("chatted").assessment == "From chat"
+
+
+def test_near_duplicate_triage_is_reported_as_a_semantic_hit(agent, monkeypatch):
+    from semantic_cache import SemanticCache
+
+    monkeypatch.setattr(agent, "semantic_cache", SemanticCache(max_entries=10))
+    first = agent.run({"symptoms": "Sore throat for three days", "severity": 4, "age": 30})
+    second = agent.run({"symptoms": "Dor de garganta há três dias", "severity": 4, "age": 30})
+
+    assert not first["semantic_hit"]
+    assert second["semantic_hit"]
+    assert not second["cache_hit"]
+    assert second["semantic_similarity"] >= 0.95
+
+
+def test_every_upstream_attempt_takes_an_admission_token(agent, monkeypatch):
+    from resilience import UpstreamUnavailable
+
+    priorities = []
+    monkeypatch.setattr(agent.admission, "acquire", lambda priority=5: priorities.append(priority))
+    monkeypatch.setattr(agent.model_router.policy(agent.model_router.chat_model), "backoff", 0)
+    chat_complete = agent.ai_provider.chat_complete
+    failures = [UpstreamUnavailable("overloaded")]
+
+    def flaky(*args):
+        if failures:
+            raise failures.pop()
+        return chat_complete(*args)
+
+    monkeypatch.setattr(agent.ai_provider, "chat_complete", flaky)
+
+    result = agent.run_chat({"message": "I have a headache"})
+
+    assert "error" not in result
+    assert priorities == [5, 5]
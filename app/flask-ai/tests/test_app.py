@@ -0,0 +1,103 @@
+import gzip
+import threading
+
+import pytest
+
+import app as flask_app
+
+
+@pytest.fixture
+def fresh_agent(monkeypatch):
+    """No Agent built yet in this process; the original comes back afterwards"""
+    monkeypatch.setattr(flask_app, "_agent", None)
+    monkeypatch.setattr(flask_app, "_agent_error", None)
+
+
+@pytest.fixture
+def client():
+    return flask_app.create_app().test_client()
+
+
+def test_readyz_reports_a_failed_agent(fresh_agent, client, monkeypatch):
+    class Broken:
+        def __init__(self):
+            raise ValueError("GEMINI_API_KEY is not set")
+
+    monkeypatch.setattr(flask_app, "Agent", Broken)
+
+    response = client.get("/readyz")
+
+    assert response.status_code == 503
+    assert response.get_json()["error"] == "GEMINI_API_KEY is not set"
+    assert not flask_app.agent_ready()
+
+
+def test_readyz_builds_the_agent_once(fresh_agent, client, monkeypatch):
+    built = []
+
+    class Counted(flask_app.Agent):
+        def __init__(self):
+            built.append(self)
+            super().__init__()
+
+    monkeypatch.setattr(flask_app, "Agent", Counted)
+    threads = [threading.Thread(target=flask_app.get_agent) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    response = client.get("/readyz")
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["status"] == "ready"
+    assert body["agent_init_seconds"] >= 0
+    assert len(built) == 1
+    assert flask_app.get_agent() is built[0]
+    assert flask_app.agent_ready()
+
+
+def test_healthz_does_not_build_the_agent(fresh_agent, client):
+    assert client.get("/healthz").status_code == 200
+    assert not flask_app.agent_ready()
+
+
+TRIAGE = {"symptoms": "Headache for two days", "severity": 4, "age": 30}
+
+
+def test_prefer_return_minimal_leaves_out_the_large_fields(client):
+    full = client.post("/generate_summary", json=TRIAGE).get_json()
+    compact = client.post("/generate_summary", json=TRIAGE, headers={"Prefer": "return=minimal"}).get_json()
+
+    assert "triage_input" in full
+    assert "triage_input" not in compact and "raw_response" not in compact
+    assert compact["assessment"] == full["assessment"]
+
+
+def test_large_json_responses_are_gzipped(client, monkeypatch):
+    import serialization
+
+    monkeypatch.setattr(serialization, "GZIP_MIN_BYTES", 64)
+
+    response = client.post("/generate_summary", json=TRIAGE, headers={"Accept-Encoding": "gzip"})
+    plain = client.post("/generate_summary", json=TRIAGE)
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert gzip.decompress(response.get_data()).startswith(b"{")
+    assert "Content-Encoding" not in plain.headers
+
+
+def test_oversized_bodies_are_refused_before_parsing(client, monkeypatch):
+    monkeypatch.setattr(flask_app, "MAX_REQUEST_BYTES", 256)
+    monkeypatch.setattr(flask_app, "BATCH_MAX_REQUEST_BYTES", 4096)
+    padded = {**TRIAGE, "medical_history": "x" * 512}
+
+    response = client.post("/generate_summary", json=padded)
+
+    assert response.status_code == 413
+    assert "256 bytes" in response.get_json()["error"]
+    # The batch endpoint has its own, larger limit
+    assert client.post("/generate_summary/batch", json=[padded]).status_code == 200
+    assert client.post("/generate_summary/batch", json=[padded] * 10).status_code == 413
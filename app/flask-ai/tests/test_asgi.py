@@ -0,0 +1,128 @@
+import asyncio
+import json
+
+import pytest
+
+from metrics import REQUESTS
+
+
+@pytest.fixture(scope="module")
+def asgi_app():
+    from asgi import app
+
+    return app
+
+
+def call(asgi_app, method, path, body=b"", headers=(), query=b"", disconnect_after_chunks=None):
+    """Drive one ASGI request; returns (status, headers, body chunks).
+
+    A list body is sent as one http.request message per element.
+    """
+    sent = []
+    chunks_sent = asyncio.Event() if disconnect_after_chunks else None
+    parts = body if isinstance(body, list) else [body]
+
+    async def main():
+        requests = [{"type": "http.request", "body": part, "more_body": index < len(parts) - 1}
+                    for index, part in enumerate(parts)]
+
+        async def receive():
+            if requests:
+                return requests.pop(0)
+            if chunks_sent is not None:
+                await chunks_sent.wait()
+            else:
+                await asyncio.Event().wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+            body_chunks = [m for m in sent if m["type"] == "http.response.body" and m.get("body")]
+            if chunks_sent is not None and len(body_chunks) >= disconnect_after_chunks:
+                chunks_sent.set()
+
+        scope = {
+            "type": "http", "method": method, "path": path, "query_string": query,
+            "headers": [(key.encode("latin-1"), value.encode("latin-1")) for key, value in headers],
+        }
+        await asyncio.wait_for(asgi_app(scope, receive, send), 5)
+
+    asyncio.run(main())
+    start = sent[0]
+    return start["status"], dict(start["headers"]), [m["body"] for m in sent[1:] if m.get("body")]
+
+
+def sse_events(chunks):
+    return [chunk.decode("utf-8").split("\n")[0].split(": ", 1)[1] for chunk in chunks]
+
+
+def test_chat_stream_sends_server_sent_events(asgi_app):
+    status, headers, chunks = call(asgi_app, "POST", "/chat/stream", json.dumps({"message": "I have a headache"}).encode())
+
+    assert status == 200
+    assert headers[b"content-type"] == b"text/event-stream"
+    events = sse_events(chunks)
+    assert events[0] == "token"
+    assert events[-1] == "done"
+
+
+def test_chat_with_event_stream_accept_streams(asgi_app):
+    _, headers, chunks = call(asgi_app, "POST", "/chat", json.dumps({"message": "I have a headache"}).encode(),
+                              headers=[("accept", "text/event-stream")])
+
+    assert headers[b"content-type"] == b"text/event-stream"
+    assert sse_events(chunks)[-1] == "done"
+
+
+def test_chat_stream_validates_the_body(asgi_app):
+    status, _, chunks = call(asgi_app, "POST", "/chat/stream", json.dumps({"message": ""}).encode())
+
+    assert status == 400
+    assert b"message must be" in chunks[0]
+
+
+def test_chat_stream_disconnect_is_recorded_as_cancelled(asgi_app):
+    before = REQUESTS.value("chat_stream", "cancelled")
+
+    _, _, chunks = call(asgi_app, "POST", "/chat/stream", json.dumps({"message": "I have a headache"}).encode(),
+                        disconnect_after_chunks=1)
+
+    assert "done" not in sse_events(chunks)
+    assert REQUESTS.value("chat_stream", "cancelled") == before + 1
+
+
+BATCH = [
+    {"symptoms": "Headache for two days", "severity": 4, "age": 30},
+    {"symptoms": "Sore throat", "severity": 3, "age": 22},
+]
+
+
+def test_batch_returns_results_in_order(asgi_app):
+    status, _, chunks = call(asgi_app, "POST", "/generate_summary/batch", json.dumps({"items": BATCH}).encode())
+
+    results = json.loads(b"".join(chunks))["results"]
+    assert status == 200
+    assert [result["index"] for result in results] == [0, 1]
+    assert all(result["status"] == "ok" for result in results)
+
+
+def test_batch_reads_and_writes_ndjson_incrementally(asgi_app):
+    lines = [json.dumps(item).encode() + b"\n" for item in BATCH]
+    # Split the first line across two body messages
+    body = [lines[0][:10], lines[0][10:] + b"not json\n", lines[1]]
+
+    status, headers, chunks = call(asgi_app, "POST", "/generate_summary/batch", body,
+                                   headers=[("content-type", "application/x-ndjson")], query=b"compact=1")
+
+    results = [json.loads(line) for line in b"".join(chunks).splitlines()]
+    assert status == 200
+    assert headers[b"content-type"] == b"application/x-ndjson"
+    assert [result["status"] for result in results] == ["ok", "error", "ok"]
+    assert "raw_response" not in results[0]["result"]
+    assert "Invalid JSON line" in results[1]["error"]
+
+
+def test_batch_rejects_a_body_without_items(asgi_app):
+    status, _, _ = call(asgi_app, "POST", "/generate_summary/batch", json.dumps({"symptoms": "x"}).encode())
+
+    assert status == 400
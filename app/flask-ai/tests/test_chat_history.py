@@ -0,0 +1,64 @@
+from chat_history import CHARS_PER_TOKEN, SUMMARY_TURN_CHARS, estimate_tokens, fit_history
+
+
+def turn(role, content):
+    return {"role": role, "content": content}
+
+
+def conversation(turns, chars=200):
+    return [turn("user" if index % 2 == 0 else "assistant", f"turn {index} " + "x" * chars) for index in range(turns)]
+
+
+def test_estimate_tokens_rounds_up():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("a") == 1
+    assert estimate_tokens("a" * CHARS_PER_TOKEN) == 1
+    assert estimate_tokens("a" * (CHARS_PER_TOKEN + 1)) == 2
+
+
+def test_short_history_is_kept_whole():
+    history = conversation(3, chars=20)
+
+    kept, summary = fit_history(history, "earlier summary", token_budget=1000)
+
+    assert kept == history
+    assert summary == "earlier summary"
+
+
+def test_older_turns_are_folded_into_the_summary():
+    history = conversation(20)
+
+    kept, summary = fit_history(history, "", token_budget=300)
+
+    assert 0 < len(kept) < len(history)
+    assert kept == history[-len(kept):]
+    # The newest folded turn survives; the oldest excerpts go first
+    assert f"turn {len(history) - len(kept) - 1} " in summary
+    assert "turn 0 " not in summary
+    assert estimate_tokens(summary) <= 300 // 4
+
+
+def test_newest_turn_is_kept_even_over_budget():
+    history = conversation(3, chars=4000)
+
+    kept, _ = fit_history(history, "", token_budget=10)
+
+    assert kept == history[-1:]
+
+
+def test_folded_excerpts_are_truncated():
+    history = [turn("user", "y" * 1000), turn("assistant", "short reply")]
+
+    kept, summary = fit_history(history, "", token_budget=20)
+
+    assert kept == history[-1:]
+    assert len(summary) <= SUMMARY_TURN_CHARS + len("Patient: ...")
+
+
+def test_prompt_stays_bounded_however_long_the_conversation():
+    budget = 400
+    summary = ""
+    for length in (10, 100, 1000):
+        kept, summary = fit_history(conversation(length), summary, budget)
+        kept_tokens = sum(estimate_tokens(item["content"]) + 4 for item in kept)
+        assert kept_tokens + estimate_tokens(summary) <= budget + budget // 4
@@ -0,0 +1,87 @@
+import asyncio
+import threading
+
+import pytest
+
+from concurrency import ConcurrencyLimiter
+
+
+def test_threads_and_coroutines_share_one_limit():
+    limiter = ConcurrencyLimiter(1)
+    held = threading.Event()
+    release = threading.Event()
+
+    def hold_slot():
+        with limiter:
+            held.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=hold_slot)
+    thread.start()
+    assert held.wait(5)
+
+    async def use_slot():
+        async with limiter.async_slot():
+            return limiter.in_flight
+
+    async def main():
+        waiter = asyncio.ensure_future(use_slot())
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        assert limiter.waiting == 1
+        release.set()
+        return await asyncio.wait_for(waiter, 5)
+
+    assert asyncio.run(main()) == 1
+    thread.join(5)
+    assert limiter.in_flight == 0
+    assert limiter.waiting == 0
+
+
+def test_async_slot_is_handed_to_a_waiting_thread():
+    limiter = ConcurrencyLimiter(1)
+    acquired = threading.Event()
+
+    def wait_for_slot():
+        with limiter:
+            acquired.set()
+
+    async def main():
+        async with limiter.async_slot():
+            thread = threading.Thread(target=wait_for_slot)
+            thread.start()
+            while limiter.waiting == 0:
+                await asyncio.sleep(0.001)
+            assert not acquired.is_set()
+        return thread
+
+    thread = asyncio.run(main())
+    assert acquired.wait(5)
+    thread.join(5)
+    assert limiter.in_flight == 0
+
+
+def test_cancelled_async_waiter_gives_up_its_place():
+    limiter = ConcurrencyLimiter(1)
+
+    async def main():
+        async with limiter.async_slot():
+            waiter = asyncio.ensure_future(limiter.acquire_async())
+            await asyncio.sleep(0)
+            assert limiter.waiting == 1
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+            assert limiter.waiting == 0
+        assert limiter.in_flight == 0
+
+        # A waiter cancelled after the slot was handed to it passes the slot on
+        async with limiter.async_slot():
+            waiter = asyncio.ensure_future(limiter.acquire_async())
+            await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert limiter.in_flight == 0
+
+    asyncio.run(main())
@@ -0,0 +1,80 @@
+import time
+
+import pytest
+
+from conversation_log import SESSION, TURN, ConversationLog, replay
+from session_store import TriageSession
+
+
+@pytest.fixture
+def log(tmp_path):
+    conversation_log = ConversationLog(str(tmp_path / "log.db"), flush_interval=0.001, compact_threshold=3,
+                                       compact_interval=3600, durable=False)
+    yield conversation_log
+    conversation_log.close()
+
+
+def test_replay_applies_turns_after_the_session():
+    session = TriageSession(symptoms="cough", assessment="Cold")
+    events = [
+        (SESSION, session.to_dict()),
+        (TURN, {"user": "still coughing", "assistant": "Rest", "assessment": "Bronchitis"}),
+    ]
+
+    rebuilt = replay(events, token_budget=2000)
+
+    assert rebuilt.symptoms == "cough"
+    assert rebuilt.assessment == "Bronchitis"
+    assert [turn["content"] for turn in rebuilt.history] == ["still coughing", "Rest"]
+
+
+def test_session_is_rebuilt_from_the_log(log):
+    session = TriageSession(symptoms="cough", assessment="Cold")
+    log.log_session("s1", session)
+    session.assessment = "Bronchitis"
+    log.log_turn("s1", "worse at night", "See a doctor", session)
+
+    assert log.flush()
+    rebuilt = log.load_session("s1")
+
+    assert rebuilt.assessment == "Bronchitis"
+    assert len(rebuilt.history) == 2
+    assert log.load_session("unknown") is None
+
+
+def test_compaction_replaces_events_with_a_snapshot(log):
+    session = TriageSession(symptoms="cough")
+    log.log_session("s1", session)
+    for index in range(4):
+        log.log_turn("s1", f"message {index}", f"reply {index}", session)
+    assert log.flush()
+    before = log.load_session("s1")
+
+    assert log.compact() == 1
+    assert log.stats()["events"] == 1
+    assert log.load_session("s1") == before
+
+
+def test_writer_survives_a_failing_compaction(tmp_path, monkeypatch):
+    conversation_log = ConversationLog(str(tmp_path / "log.db"), flush_interval=0.001, compact_interval=0.01,
+                                       durable=False)
+    compactions = []
+
+    def broken_compact(conn=None):
+        compactions.append(conn)
+        raise IndexError("list index out of range")
+
+    monkeypatch.setattr(conversation_log, "compact", broken_compact)
+    try:
+        conversation_log.log_session("s1", TriageSession(symptoms="cough"))
+        assert conversation_log.flush()
+        deadline = time.monotonic() + 5
+        while not compactions and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert compactions
+
+        conversation_log.log_session("s2", TriageSession(symptoms="fever"))
+        assert conversation_log.flush()
+        assert conversation_log.load_session("s2").symptoms == "fever"
+    finally:
+        conversation_log.close()
@@ -0,0 +1,73 @@
+from metrics import MetricsRegistry, REQUESTS, STAGE_DURATION, stage, start_request
+
+
+def test_counter_exposition():
+    registry = MetricsRegistry()
+    counter = registry.counter("demo_total", "Demo events", ("endpoint", "outcome"))
+    counter.inc("chat", "success")
+    counter.inc("chat", "success", amount=2)
+    counter.inc("chat", 'say "hi"\n')
+
+    assert registry.render().splitlines() == [
+        "# HELP demo_total Demo events",
+        "# TYPE demo_total counter",
+        'demo_total{endpoint="chat",outcome="say \\"hi\\"\\n"} 1.0',
+        'demo_total{endpoint="chat",outcome="success"} 3.0',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("demo_seconds", "Demo latency", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value, "parse")
+
+    assert registry.render().splitlines() == [
+        "# HELP demo_seconds Demo latency",
+        "# TYPE demo_seconds histogram",
+        'demo_seconds_bucket{stage="parse",le="0.1"} 1',
+        'demo_seconds_bucket{stage="parse",le="1.0"} 3',
+        'demo_seconds_bucket{stage="parse",le="+Inf"} 4',
+        'demo_seconds_sum{stage="parse"} 6.05',
+        'demo_seconds_count{stage="parse"} 4',
+    ]
+
+
+def test_gauges_are_read_at_scrape_time_and_skip_failures():
+    registry = MetricsRegistry()
+    depth = [3]
+    registry.gauge("demo_depth", "Queue depth", lambda: depth[0])
+    registry.gauge("demo_broken", "Raises", lambda: 1 / 0)
+    depth[0] = 7
+
+    assert registry.render().splitlines() == [
+        "# HELP demo_depth Queue depth",
+        "# TYPE demo_depth gauge",
+        "demo_depth 7.0",
+    ]
+
+
+def test_registering_twice_returns_the_same_metric():
+    registry = MetricsRegistry()
+
+    assert registry.counter("demo_total", "Demo") is registry.counter("demo_total", "Demo")
+
+
+def test_stages_are_recorded_with_the_request_outcome():
+    requests = REQUESTS.value("metrics_test", "success")
+    stages = STAGE_DURATION.count("metrics_test", "parse", "success")
+
+    timer = start_request("metrics_test")
+    with stage("parse"):
+        pass
+    timer.finish("success")
+    timer.finish("error")
+
+    assert REQUESTS.value("metrics_test", "success") == requests + 1
+    assert REQUESTS.value("metrics_test", "error") == 0
+    assert STAGE_DURATION.count("metrics_test", "parse", "success") == stages + 1
+
+
+def test_stage_outside_a_request_is_a_no_op():
+    with stage("parse"):
+        pass
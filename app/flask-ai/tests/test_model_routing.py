@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from model_routing import MODEL_FALLBACKS, ModelRouter
+from resilience import CircuitBreaker, ResiliencePolicy, UpstreamUnavailable
+
+
+def router(fallback_model="fallback", chat_max_tokens=100):
+    return ModelRouter(
+        summary_model="strong", chat_model="light", fallback_model=fallback_model, chat_max_tokens=chat_max_tokens,
+        policy_factory=lambda: ResiliencePolicy(timeout=None, max_retries=0, backoff=0,
+                                                breaker=CircuitBreaker(failure_threshold=1)),
+    )
+
+
+def overloaded_on(*models):
+    def call(prompt, model):
+        if model in models:
+            raise UpstreamUnavailable(f"{model} overloaded")
+        return f"{prompt} from {model}"
+    return call
+
+
+def test_models_for_each_operation():
+    routes = router()
+
+    assert routes.models_for("summary") == ["strong", "fallback"]
+    assert routes.models_for("chat", prompt_tokens=50) == ["light", "fallback"]
+    # Long chat prompts need the stronger model
+    assert routes.models_for("chat", prompt_tokens=500) == ["strong", "fallback"]
+    assert router(fallback_model=None).models_for("chat") == ["light"]
+    assert router(fallback_model="strong").models_for("summary") == ["strong"]
+
+
+def test_call_reports_the_model_that_answered():
+    assert router().call("summary", overloaded_on(), "hi") == ("strong", "hi from strong")
+
+
+def test_overload_moves_to_the_fallback_model():
+    routes = router()
+    fallbacks = MODEL_FALLBACKS.value("summary")
+
+    assert routes.call("summary", overloaded_on("strong"), "hi") == ("fallback", "hi from fallback")
+    assert MODEL_FALLBACKS.value("summary") == fallbacks + 1
+    # The primary's own breaker is open; the next call skips straight to the fallback
+    assert routes.policy("strong").breaker.state == CircuitBreaker.OPEN
+    assert routes.breaker_state == CircuitBreaker.OPEN
+    assert routes.call("summary", overloaded_on(), "again") == ("fallback", "again from fallback")
+
+
+def test_other_errors_do_not_fall_back():
+    def invalid(prompt, model):
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        router().call("summary", invalid, "hi")
+
+
+def test_call_async_falls_back():
+    async def call(prompt, model):
+        return overloaded_on("light")(prompt, model)
+
+    assert asyncio.run(router().call_async("chat", call, "hi")) == ("fallback", "hi from fallback")
+
+
+def test_stream_falls_back_only_before_the_first_chunk():
+    def stream(prompt, model):
+        if model == "light":
+            raise UpstreamUnavailable("light overloaded")
+        yield from ("a", "b")
+
+    assert list(router().call_stream("chat", stream, "hi")) == [("fallback", "a"), ("fallback", "b")]
+
+    def breaks_midway(prompt, model):
+        yield "a"
+        raise UpstreamUnavailable("dropped")
+
+    chunks = router().call_stream("chat", breaks_midway, "hi")
+    assert next(chunks) == ("light", "a")
+    with pytest.raises(UpstreamUnavailable):
+        next(chunks)
+
+
+def test_on_attempt_runs_for_the_primary_and_the_fallback():
+    attempts = []
+
+    router().call("summary", overloaded_on("strong"), "hi", on_attempt=lambda: attempts.append(1))
+
+    assert len(attempts) == 2
@@ -0,0 +1,43 @@
+import pytest
+
+from prompts import CHAT_PROMPT, SOAP_JSON_PROMPT, SOAP_PROMPT, SOAP_RESPONSE_SCHEMA, PromptTemplate
+
+PATIENT = {
+    "age": 42, "severity": 6, "duration": "2 days", "gender": "female", "symptoms": "Headache",
+    "medical_history": "asthma", "current_medications": "none",
+}
+
+
+def test_render_matches_str_format():
+    template = "Age {age}, {symptoms}; {{not a field}}"
+    prompt = PromptTemplate("demo", 1, system="", template=template)
+
+    assert prompt.render(age=30, symptoms="cough") == template.format(age=30, symptoms="cough")
+
+
+def test_render_requires_every_field():
+    prompt = PromptTemplate("demo", 1, system="", template="{age} {symptoms}")
+
+    with pytest.raises(KeyError):
+        prompt.render(age=30)
+
+
+def test_keys_carry_the_version():
+    assert SOAP_PROMPT.key == "soap-v2"
+    assert SOAP_JSON_PROMPT.key == "soap-json-v1"
+    assert len({SOAP_PROMPT.key, SOAP_JSON_PROMPT.key, CHAT_PROMPT.key}) == 3
+
+
+@pytest.mark.parametrize("prompt", [SOAP_PROMPT, SOAP_JSON_PROMPT])
+def test_soap_prompts_keep_the_system_text_out_of_the_user_prompt(prompt):
+    rendered = prompt.render(**PATIENT)
+
+    assert "Symptoms: Headache" in rendered
+    assert "Medical History: asthma" in rendered
+    assert prompt.system not in rendered
+    assert "professional healthcare assistant" in prompt.system
+
+
+def test_json_prompt_names_every_schema_field():
+    for field in SOAP_RESPONSE_SCHEMA["required"]:
+        assert f'"{field}"' in SOAP_JSON_PROMPT.system
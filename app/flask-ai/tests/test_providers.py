@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+from ai_provider import AIProvider
+from mock_provider import MockAIProvider
+from resilience import UpstreamUnavailable
+
+PROMPT = "Symptoms: Chest pain and shortness of breath\nSeverity: 9"
+
+
+def test_provider_registry(monkeypatch):
+    from agent import AI_PROVIDERS, Agent
+
+    assert AI_PROVIDERS["mock"] is MockAIProvider
+    assert all(issubclass(provider, AIProvider) for provider in AI_PROVIDERS.values())
+
+    monkeypatch.setenv("AGENT_PROVIDER", "nonexistent")
+    with pytest.raises(ValueError, match="expected one of: gemini, mock"):
+        Agent()
+
+
+def test_providers_must_implement_complete_and_chat():
+    class Incomplete(AIProvider):
+        def complete(self, prompt, system_message=None, model=None):
+            return ""
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_mock_output_is_a_pure_function_of_the_prompt():
+    first, second = MockAIProvider(), MockAIProvider()
+
+    assert first.complete(PROMPT) == second.complete(PROMPT)
+    assert first.complete(PROMPT) != first.complete(PROMPT.replace("Chest pain", "Cough"))
+    assert "Seek emergency care" in first.complete(PROMPT)
+
+    reply = json.loads(first.complete_json(PROMPT))
+    assert reply["nextStep"] == "Seek emergency care"
+    assert reply["start_chat"] is False
+
+
+def test_mock_stream_joins_to_the_chat_reply(monkeypatch):
+    monkeypatch.setenv("MOCK_STREAM_CHUNK_CHARS", "7")
+    provider = MockAIProvider()
+    messages = [{"role": "user", "content": "I have a fever"}]
+
+    chunks = list(provider.chat_complete_stream(messages))
+
+    assert all(len(chunk) <= 7 for chunk in chunks)
+    assert "".join(chunks) == provider.chat_complete(messages)
+
+
+def test_mock_sampling_is_seeded(monkeypatch):
+    monkeypatch.setenv("MOCK_LATENCY_DIST", "exponential")
+    monkeypatch.setenv("MOCK_ERROR_RATE", "0.5")
+    monkeypatch.setenv("MOCK_SEED", "7")
+
+    draws = [[provider._sample() for _ in range(20)] for provider in (MockAIProvider(), MockAIProvider())]
+
+    assert draws[0] == draws[1]
+
+
+def test_mock_errors_are_retryable(monkeypatch):
+    monkeypatch.setenv("MOCK_ERROR_RATE", "1")
+
+    with pytest.raises(UpstreamUnavailable):
+        MockAIProvider().complete(PROMPT)
+
+
+def test_mock_pads_to_the_requested_size(monkeypatch):
+    monkeypatch.setenv("MOCK_RESPONSE_CHARS", "2000")
+
+    assert len(MockAIProvider().complete(PROMPT)) >= 2000
+
+
+def test_mock_rejects_unknown_latency_distribution(monkeypatch):
+    monkeypatch.setenv("MOCK_LATENCY_DIST", "gamma")
+
+    with pytest.raises(ValueError, match="gamma"):
+        MockAIProvider()
@@ -0,0 +1,244 @@
+import asyncio
+import threading
+
+import pytest
+
+from concurrency import ConcurrencyLimiter
+from resilience import (CircuitBreaker, CircuitOpenError, ResiliencePolicy, UpstreamTimeout, UpstreamUnavailable,
+                        WorkersBusy, is_retryable)
+
+
+class Flaky:
+    """Raises the given errors in turn, then returns "ok\""""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+def policy(**options):
+    options.setdefault("backoff", 0)
+    options.setdefault("timeout", None)
+    return ResiliencePolicy(**options)
+
+
+def test_is_retryable_follows_the_cause_chain():
+    wrapped = RuntimeError("sdk error")
+    wrapped.__cause__ = ConnectionError()
+
+    assert is_retryable(UpstreamTimeout())
+    assert is_retryable(wrapped)
+    assert not is_retryable(ValueError())
+
+
+def test_breaker_opens_then_lets_one_probe_through(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=clock)
+    breaker.record_failure()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    clock.advance(30)
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_probe_reopens_the_breaker(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+    breaker.record_failure()
+    clock.advance(30)
+    assert breaker.allow()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_call_retries_transient_failures():
+    fn = Flaky(UpstreamUnavailable(), ConnectionError())
+
+    assert policy(max_retries=2).call("test", fn) == "ok"
+    assert fn.calls == 3
+
+
+def test_call_does_not_retry_other_errors():
+    fn = Flaky(ValueError("bad prompt"))
+    calls = policy(max_retries=2)
+
+    with pytest.raises(ValueError):
+        calls.call("test", fn)
+    assert fn.calls == 1
+    assert calls.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_call_fails_fast_while_the_breaker_is_open():
+    calls = policy(max_retries=0, breaker=CircuitBreaker(failure_threshold=1))
+    with pytest.raises(UpstreamUnavailable):
+        calls.call("test", Flaky(UpstreamUnavailable()))
+
+    with pytest.raises(CircuitOpenError):
+        calls.call("test", Flaky())
+
+
+def test_call_enforces_the_deadline():
+    calls = ResiliencePolicy(timeout=0.01, max_retries=0, backoff=0)
+
+    with pytest.raises(UpstreamTimeout):
+        calls.call("test", lambda: __import__("time").sleep(0.2))
+
+
+def test_call_async_retries_and_times_out():
+    attempts = []
+
+    async def slow_then_fast():
+        attempts.append(1)
+        if len(attempts) == 1:
+            await asyncio.sleep(1)
+        return "ok"
+
+    calls = ResiliencePolicy(timeout=0.01, max_retries=1, backoff=0)
+
+    assert asyncio.run(calls.call_async("test", slow_then_fast)) == "ok"
+    assert len(attempts) == 2
+
+
+def test_call_stream_retries_until_the_first_chunk():
+    attempts = []
+
+    def stream():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise UpstreamUnavailable()
+        yield "a"
+        yield "b"
+
+    assert list(policy(max_retries=1).call_stream("test", stream)) == ["a", "b"]
+    assert len(attempts) == 2
+
+
+def half_open_policy(clock, **options):
+    """A policy whose breaker is half-open, so the next call is the single probe"""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+    breaker.record_failure()
+    clock.advance(30)
+    return policy(breaker=breaker, **options)
+
+
+def test_cancelled_async_probe_releases_the_breaker(clock):
+    calls = half_open_policy(clock)
+
+    async def main():
+        task = asyncio.ensure_future(calls.call_async("test", asyncio.sleep, 10))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+
+    assert calls.breaker.allow()
+
+
+def test_closed_stream_probe_releases_the_breaker(clock):
+    calls = half_open_policy(clock)
+    stream = calls.call_stream("test", lambda: iter(["a", "b"]))
+
+    assert next(stream) == "a"
+    stream.close()
+
+    assert calls.breaker.allow()
+
+
+def test_interrupted_probe_releases_the_breaker(clock):
+    calls = half_open_policy(clock)
+
+    def interrupted():
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        calls.call("test", interrupted)
+
+    assert calls.breaker.allow()
+
+
+def test_stream_that_fails_to_start_is_recorded(clock):
+    calls = half_open_policy(clock, max_retries=0)
+
+    def refused():
+        raise ConnectionError()
+
+    with pytest.raises(ConnectionError):
+        list(calls.call_stream("test", refused))
+
+    assert calls.breaker.state == CircuitBreaker.OPEN
+
+
+def test_call_stream_enforces_the_deadline_on_the_first_chunk():
+    def stalled():
+        __import__("time").sleep(0.2)
+        yield "late"
+
+    calls = ResiliencePolicy(timeout=0.01, max_retries=0, backoff=0)
+
+    with pytest.raises(UpstreamTimeout):
+        list(calls.call_stream("test", stalled))
+
+
+def test_overrun_attempt_keeps_its_limiter_slot_until_it_returns():
+    limiter = ConcurrencyLimiter(1)
+    returned = threading.Event()
+    calls = ResiliencePolicy(timeout=0.01, max_retries=0, backoff=0, limiter=limiter)
+
+    with pytest.raises(UpstreamTimeout):
+        calls.call("test", returned.wait, 5)
+
+    assert limiter.in_flight == 1
+    returned.set()
+    limiter.acquire()
+    limiter.release()
+    assert calls.call("test", lambda: "ok") == "ok"
+    assert limiter.in_flight == 0
+
+
+def test_attempt_queued_behind_overrun_calls_does_not_trip_the_breaker():
+    returned = threading.Event()
+    breaker = CircuitBreaker(failure_threshold=2)
+    calls = ResiliencePolicy(timeout=0.01, max_retries=0, backoff=0, breaker=breaker, max_workers=1)
+
+    with pytest.raises(UpstreamTimeout):
+        calls.call("test", returned.wait, 5)
+    with pytest.raises(WorkersBusy):
+        calls.call("test", lambda: "never started")
+    returned.set()
+
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_on_attempt_runs_before_every_attempt():
+    attempts = []
+    calls = policy(max_retries=2)
+
+    assert calls.call("test", Flaky(UpstreamUnavailable(), UpstreamUnavailable()),
+                      on_attempt=lambda: attempts.append(1)) == "ok"
+    assert len(attempts) == 3
+
+
+def test_on_attempt_error_releases_the_breaker(clock):
+    calls = half_open_policy(clock)
+
+    def shed():
+        raise RuntimeError("shed")
+
+    with pytest.raises(RuntimeError):
+        calls.call("test", Flaky(), on_attempt=shed)
+    with pytest.raises(RuntimeError):
+        list(calls.call_stream("test", lambda: iter(["a"]), on_attempt=shed))
+
+    assert calls.breaker.allow()
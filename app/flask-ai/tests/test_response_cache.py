@@ -0,0 +1,49 @@
+from response_cache import ResponseCache, make_cache_key
+
+
+def test_cache_key_ignores_field_order():
+    first = make_cache_key({"symptoms": "cough", "age": 30}, "model", "v1")
+    second = make_cache_key({"age": 30, "symptoms": "cough"}, "model", "v1")
+
+    assert first == second
+    assert first != make_cache_key({"symptoms": "cough", "age": 30}, "model", "v2")
+
+
+def test_values_are_copied_in_and_out(clock):
+    cache = ResponseCache(clock=clock)
+    value = {"assessment": "Cold"}
+    cache.put("k", value)
+    value["assessment"] = "changed"
+    hit = cache.get("k")
+    hit["cache_hit"] = True
+
+    assert cache.get("k") == {"assessment": "Cold"}
+
+
+def test_entries_expire(clock):
+    cache = ResponseCache(ttl_seconds=10, clock=clock)
+    cache.put("k", {"assessment": "Cold"})
+    clock.advance(10)
+
+    assert cache.get("k") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_least_recently_used_is_evicted(clock):
+    cache = ResponseCache(max_entries=2, clock=clock)
+    cache.put("a", {})
+    cache.put("b", {})
+    cache.get("a")
+    cache.put("c", {})
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {}
+    assert cache.stats()["evictions"] == 1
+
+
+def test_disabled_cache_stores_nothing(clock):
+    cache = ResponseCache(max_entries=0, clock=clock)
+    cache.put("k", {})
+
+    assert cache.get("k") is None
+    assert len(cache) == 0
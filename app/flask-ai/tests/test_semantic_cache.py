@@ -0,0 +1,96 @@
+import pytest
+
+from semantic_cache import SemanticCache, bucket_key, canonical_text, clinical_signature
+
+
+def triage(symptoms, **fields):
+    return {"symptoms": symptoms, "severity": 5, "age": 30, "duration": "2 days", **fields}
+
+
+def cache(clock, **options):
+    options.setdefault("max_entries", 100)
+    return SemanticCache(clock=clock, **options)
+
+
+def test_canonical_text_maps_portuguese_terms():
+    assert canonical_text("Dor de cabeça há dois dias") == "headache 2 days"
+    assert canonical_text("I have had a headache for two days") == "headache 2 days"
+
+
+def test_bucket_key_separates_patient_fields():
+    assert bucket_key(triage("cough", age=30)) == bucket_key(triage("dry cough", age=35))
+    assert bucket_key(triage("cough", age=30)) != bucket_key(triage("fever", age=30))
+    assert bucket_key(triage("cough", age=30)) != bucket_key(triage("cough", age=70))
+    assert bucket_key(triage("cough", severity=2)) != bucket_key(triage("cough", severity=9))
+
+
+def test_reworded_complaint_hits(clock):
+    semantic = cache(clock)
+    semantic.put(triage("headache for two days"), {"assessment": "Tension headache"})
+
+    hit = semantic.get(triage("dor de cabeça há dois dias"))
+
+    assert hit is not None
+    value, similarity = hit
+    assert value == {"assessment": "Tension headache"}
+    assert similarity >= semantic.threshold
+
+
+def test_different_complaint_misses(clock):
+    semantic = cache(clock)
+    semantic.put(triage("headache for two days"), {"assessment": "Tension headache"})
+
+    assert semantic.get(triage("ankle swelling after a fall")) is None
+    assert semantic.get(triage("headache for two days", age=80)) is None
+
+
+@pytest.mark.parametrize("cached,asked", [
+    ("chest pain 1 day", "no chest pain 1 day"),
+    ("sem febre", "febre"),
+    ("severe abdominal pain and vomiting blood 2 days", "severe abdominal pain and vomiting 2 days"),
+])
+def test_negated_or_missing_clinical_terms_miss(clock, cached, asked):
+    semantic = cache(clock, threshold=0.5)
+    semantic.put(triage(cached), {"assessment": "cached"})
+
+    assert semantic.get(triage(asked)) is None
+    assert semantic.get(triage(cached)) is not None
+
+
+def test_clinical_signature_keeps_negations_and_red_flags():
+    assert clinical_signature(canonical_text("no chest pain")) != clinical_signature(canonical_text("chest pain"))
+    assert clinical_signature(canonical_text("vomitando sangue")) == clinical_signature(canonical_text("vomiting blood"))
+
+
+def test_default_threshold_is_strict(clock):
+    assert SemanticCache(clock=clock).threshold >= 0.95
+
+
+def test_entries_expire(clock):
+    semantic = cache(clock, ttl_seconds=60)
+    semantic.put(triage("headache"), {})
+    clock.advance(60)
+
+    assert semantic.get(triage("headache")) is None
+    assert semantic.stats()["expirations"] == 1
+    assert len(semantic) == 0
+
+
+def test_least_recently_used_is_evicted(clock):
+    semantic = cache(clock, max_entries=2)
+    semantic.put(triage("headache"), {"assessment": "a"})
+    semantic.put(triage("sore throat"), {"assessment": "b"})
+    semantic.get(triage("headache"))
+    semantic.put(triage("back pain"), {"assessment": "c"})
+
+    assert semantic.get(triage("sore throat")) is None
+    assert semantic.get(triage("headache")) is not None
+    assert semantic.stats()["evictions"] == 1
+
+
+def test_disabled_by_default(clock):
+    semantic = SemanticCache(clock=clock)
+    semantic.put(triage("headache"), {})
+
+    assert not semantic.enabled
+    assert semantic.get(triage("headache")) is None
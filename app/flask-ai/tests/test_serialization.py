@@ -0,0 +1,60 @@
+import gzip
+
+import pytest
+
+import serialization
+from serialization import accepts_gzip, dumps, loads, maybe_gzip, shape, wants_compact
+
+
+def test_dumps_is_compact_utf8():
+    payload = {"symptoms": "dor no peito", "severity": 9, "notes": "açúcar"}
+
+    body = dumps(payload)
+
+    assert b": " not in body and b", " not in body
+    assert "açúcar".encode("utf-8") in body
+    assert loads(body) == payload
+
+
+@pytest.mark.parametrize("data, prefer, expected", [
+    ({}, "", False),
+    ({"compact": True}, "", True),
+    ({"compact": "yes"}, "", True),
+    ({"compact": "false"}, "", False),
+    ({}, "return=minimal", True),
+    ({}, "respond-async, Return=Minimal", True),
+    ({}, "return=representation", False),
+])
+def test_wants_compact(data, prefer, expected):
+    assert wants_compact(data, prefer) is expected
+
+
+def test_shape_drops_the_large_fields_only_when_compact():
+    payload = {"assessment": "Migraine", "raw_response": "...", "triage_input": {}}
+
+    assert shape(payload, compact=True) == {"assessment": "Migraine"}
+    assert shape(payload, compact=False) is payload
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip", True),
+    ("deflate, gzip;q=0.5", True),
+    ("*", True),
+    ("gzip;q=0", False),
+    ("identity", False),
+    ("", False),
+])
+def test_accepts_gzip(header, expected):
+    assert accepts_gzip(header) is expected
+
+
+def test_maybe_gzip_respects_the_size_threshold(monkeypatch):
+    monkeypatch.setattr(serialization, "GZIP_MIN_BYTES", 100)
+
+    assert maybe_gzip(b"x" * 99, "gzip") == (b"x" * 99, False)
+    body, compressed = maybe_gzip(b"x" * 100, "gzip")
+    assert compressed and gzip.decompress(body) == b"x" * 100
+    assert maybe_gzip(b"x" * 100, "identity") == (b"x" * 100, False)
+
+    monkeypatch.setattr(serialization, "GZIP_MIN_BYTES", 0)
+    assert maybe_gzip(b"x" * 5000, "gzip")[1] is False
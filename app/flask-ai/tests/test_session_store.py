@@ -0,0 +1,135 @@
+import pytest
+
+from session_store import InMemorySessionStore, SQLiteSessionStore, TriageSession, create_session_store
+
+
+def session(symptoms="Headache", **fields):
+    return TriageSession(symptoms=symptoms, **fields)
+
+
+def test_memory_store_round_trip(clock):
+    store = InMemorySessionStore(clock=clock)
+    store.put("a", session())
+
+    assert store.get("a").symptoms == "Headache"
+    assert "a" in store
+    assert store.get("missing") is None
+    assert store.stats()["hits"] == 2
+    assert store.stats()["misses"] == 1
+
+
+def test_memory_store_evicts_least_recently_used(clock):
+    store = InMemorySessionStore(max_entries=2, clock=clock)
+    store.put("a", session())
+    store.put("b", session())
+    store.get("a")
+    store.put("c", session())
+
+    assert store.get("b") is None
+    assert store.get("a") is not None
+    assert store.get("c") is not None
+    assert store.stats()["evictions_capacity"] == 1
+
+
+def test_memory_store_enforces_byte_budget(clock):
+    small = session("x")
+    store = InMemorySessionStore(max_bytes=small.approx_size() * 2, clock=clock)
+    store.put("a", small)
+    store.put("b", session("x"))
+    store.put("c", session("x"))
+
+    assert len(store) == 2
+    assert store.get("a") is None
+    assert store.stats()["bytes"] <= store.max_bytes
+
+
+def test_memory_store_keeps_an_oversized_latest_entry(clock):
+    store = InMemorySessionStore(max_bytes=10, clock=clock)
+    store.put("a", session("a long description of the symptoms"))
+
+    assert store.get("a") is not None
+
+
+def test_memory_store_expires_idle_sessions(clock):
+    store = InMemorySessionStore(idle_ttl_seconds=60, clock=clock)
+    store.put("a", session())
+    store.put("b", session())
+    clock.advance(45)
+    store.get("b")
+    clock.advance(30)
+
+    assert store.get("a") is None
+    assert store.get("b") is not None
+    assert store.stats()["evictions_ttl"] == 1
+
+
+def test_memory_store_sweeps_expired_sessions_on_put(clock):
+    store = InMemorySessionStore(idle_ttl_seconds=60, clock=clock)
+    store.put("a", session())
+    clock.advance(61)
+    store.put("b", session())
+
+    assert len(store) == 1
+    assert store.stats()["evictions_ttl"] == 1
+
+
+def test_sqlite_store_round_trip(tmp_path, clock):
+    store = SQLiteSessionStore(str(tmp_path / "sessions.db"), clock=clock)
+    original = session(severity=6, history=[{"role": "user", "content": "hi"}])
+    store.put("a", original)
+
+    assert store.get("a") == original
+    store.delete("a")
+    assert store.get("a") is None
+
+
+def test_sqlite_store_expires_idle_sessions(tmp_path, clock):
+    store = SQLiteSessionStore(str(tmp_path / "sessions.db"), idle_ttl_seconds=60, clock=clock)
+    store.put("a", session())
+    clock.advance(61)
+
+    assert store.get("a") is None
+    assert store.stats()["evictions_ttl"] == 1
+
+
+def test_sqlite_sweep_drops_least_recently_used(tmp_path, clock):
+    store = SQLiteSessionStore(str(tmp_path / "sessions.db"), max_entries=2, sweep_interval=1000, clock=clock)
+    for session_id in ("a", "b", "c"):
+        store.put(session_id, session())
+        clock.advance(1)
+    store.sweep()
+
+    assert len(store) == 2
+    assert store.get("a") is None
+    assert store.stats()["evictions_capacity"] == 1
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path, clock):
+    if request.param == "memory":
+        return InMemorySessionStore(clock=clock)
+    return SQLiteSessionStore(str(tmp_path / "sessions.db"), clock=clock)
+
+
+def test_update_replaces_the_session_only_when_fn_returns_one(store):
+    store.put("a", session(assessment="Templated"))
+
+    def enrich(current):
+        if current.assessment != "Templated":
+            return None
+        current.assessment = "Model"
+        return current
+
+    assert store.update("a", enrich).assessment == "Model"
+    assert store.get("a").assessment == "Model"
+    assert store.update("a", enrich) is None
+    assert store.get("a").assessment == "Model"
+    assert store.update("missing", enrich) is None
+    assert store.get("missing") is None
+
+
+def test_create_session_store_rejects_unknown_backend(monkeypatch):
+    monkeypatch.setenv("SESSION_BACKEND", "redis")
+
+    with pytest.raises(ValueError):
+        create_session_store()
@@ -0,0 +1,121 @@
+import json
+
+import pytest
+
+from soap_parser import SoapParser, match_header, parse_soap, parse_soap_json
+
+DEFAULTS = {
+    "subjective": "No subjective", "objective": "No objective", "assessment": "No assessment",
+    "plan": "No plan", "nextStep": "No next step", "summary": "No summary", "start_chat": False,
+}
+
+REPLY = """## Subjective:
+Patient reports headache for two days.
+Worse in the evening.
+**Objective:** Temperature not measured.
+Assessment
+- a bullet that is skipped
+Probable tension headache.
+Plan: Rest and hydration.
+Próximo passo: Schedule appointment
+start_chat: yes
+ignored after start_chat
+"""
+
+
+def test_match_header_variants():
+    assert match_header("Plan: rest") == ("plan", "rest")
+    assert match_header("**Plan:** rest") == ("plan", "rest")
+    assert match_header("## 2. Assessment") == ("assessment", None)
+    assert match_header("Plan (short term): rest") == ("plan", "rest")
+    assert match_header("Patient reports pain: 5/10") is None
+
+
+def test_parse_soap_sections():
+    result = parse_soap(REPLY, DEFAULTS)
+
+    assert result["subjective"] == "Patient reports headache for two days. Worse in the evening."
+    assert result["objective"] == "Temperature not measured."
+    assert result["assessment"] == "Probable tension headache."
+    assert result["plan"] == "Rest and hydration."
+    assert result["nextStep"] == "Schedule appointment"
+    assert result["summary"] == "No summary"
+    assert result["start_chat"] is True
+
+
+def test_incremental_parser_matches_one_pass_parse():
+    parser = SoapParser(DEFAULTS)
+    completed = []
+    for index in range(0, len(REPLY), 7):
+        completed.extend(parser.feed(REPLY[index:index + 7]))
+    completed.extend(parser.close())
+
+    assert parser.result() == parse_soap(REPLY, DEFAULTS)
+    assert [section for section, _ in completed][:3] == ["subjective", "objective", "assessment"]
+
+
+def test_repeated_header_replaces_the_section():
+    result = parse_soap("Plan: first\nPlan: second", DEFAULTS)
+
+    assert result["plan"] == "second"
+
+
+def test_parse_soap_json_accepts_fenced_object():
+    text = ('```json\n{"subjective": "s", "objective": "o", "assessment": "a", "plan": "p", '
+            '"nextStep": "n", "start_chat": "true"}\n```')
+
+    result = parse_soap_json(text, DEFAULTS)
+
+    assert result["assessment"] == "a"
+    assert result["summary"] == "No summary"
+    assert result["start_chat"] is True
+
+
+def test_parse_soap_json_rejects_incomplete_objects():
+    assert parse_soap_json('{"subjective": "s"}', DEFAULTS) is None
+    assert parse_soap_json("Subjective: s", DEFAULTS) is None
+    assert parse_soap_json("{not json", DEFAULTS) is None
+
+
+def soap_object(**overrides):
+    reply = {"subjective": "s", "objective": "o", "assessment": "a", "plan": "p", "nextStep": "n",
+             "start_chat": False}
+    reply.update(overrides)
+    return json.dumps(reply)
+
+
+def test_parse_soap_json_fills_empty_sections_with_defaults():
+    result = parse_soap_json(soap_object(plan="  ", summary="Talked it through"), DEFAULTS)
+
+    assert result["plan"] == "No plan"
+    assert result["summary"] == "Talked it through"
+    assert result["start_chat"] is False
+
+
+@pytest.mark.parametrize("overrides", [
+    {"assessment": 3},
+    {"nextStep": None},
+    {"summary": ["not", "a", "string"]},
+    {"start_chat": None},
+    {"start_chat": 1},
+])
+def test_parse_soap_json_rejects_wrong_types(overrides):
+    assert parse_soap_json(soap_object(**overrides), DEFAULTS) is None
+
+
+def test_parse_soap_json_rejects_non_objects():
+    assert parse_soap_json('["subjective", "objective"]', DEFAULTS) is None
+    assert parse_soap_json("```\n" + soap_object() + "\n```", DEFAULTS)["assessment"] == "a"
+
+
+def test_agent_falls_back_to_the_text_parser():
+    from agent import Agent
+
+    agent = Agent()
+    triage_input = {"symptoms": "Headache", "severity": 4, "age": 30}
+
+    sections, path = agent._parse_with_path(soap_object(), triage_input, structured=True)
+    assert (sections["assessment"], path) == ("a", "json")
+    sections, path = agent._parse_with_path(REPLY, triage_input, structured=True)
+    assert (sections["assessment"], path) == ("Probable tension headache.", "text_fallback")
+    assert agent._parse_with_path(REPLY, triage_input, structured=False)[1] == "text"
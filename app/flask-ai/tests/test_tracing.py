@@ -0,0 +1,104 @@
+import threading
+
+from tracing import Tracer
+
+
+def profiler_threads():
+    return [thread for thread in threading.enumerate() if thread.name == "trace-profiler"]
+
+
+def test_header_is_ignored_by_default():
+    tracer = Tracer()
+
+    assert tracer.start("r1", "chat", 0.0, "1") is None
+    assert tracer.start("r2", "chat", 0.0, "profile") is None
+
+
+def test_header_traces_when_allowed():
+    tracer = Tracer(allow_header=True)
+
+    trace = tracer.start("r1", "chat", 0.0, "1")
+
+    assert trace is not None
+    assert trace.profiler is None
+    assert tracer.start("r2", "chat", 0.0, "off") is None
+
+
+def test_header_profile_needs_its_own_switch():
+    tracer = Tracer(allow_header=True)
+    trace = tracer.start("r1", "chat", 0.0, "profile")
+
+    assert trace is not None
+    assert trace.profiler is None
+
+    profiling = Tracer(allow_header=True, allow_header_profile=True)
+    trace = profiling.start("r2", "chat", 0.0, "profile")
+    try:
+        assert trace.profiler is not None
+    finally:
+        result = profiling.finish(trace, "success")
+    assert "profile" in result
+    assert not profiler_threads()
+
+
+def test_async_handlers_get_spans_without_a_profile():
+    tracer = Tracer(allow_header=True, allow_header_profile=True)
+
+    trace = tracer.start("r1", "chat", 0.0, "profile", profile_allowed=False)
+
+    assert trace is not None
+    assert trace.profiler is None
+
+
+def test_sampling_still_works_without_the_header():
+    tracer = Tracer(sample_rate=1.0)
+
+    assert tracer.start("r1", "chat", 0.0) is not None
+
+
+def test_profile_follows_the_upstream_worker(monkeypatch):
+    import time
+
+    from agent import Agent
+
+    agent = Agent()
+    monkeypatch.setattr(agent, "tracer", Tracer(allow_header=True, allow_header_profile=True, profile_interval_ms=1))
+
+    def slow_upstream_call(*args):
+        time.sleep(0.1)
+        return "Assessment: tension headache"
+
+    monkeypatch.setattr(agent.ai_provider, "chat_complete", slow_upstream_call)
+
+    result = agent.run_chat({"message": "I have a headache"}, trace="profile")
+
+    frames = [entry["frame"] for entry in result["trace"]["profile"]["self"]]
+    assert any(frame.startswith("slow_upstream_call") for frame in frames)
+
+
+def test_trace_file_is_written_off_the_event_loop(tmp_path, monkeypatch):
+    import asyncio
+
+    import tracing
+
+    writers = []
+    write_trace = tracing._write_trace
+
+    def record(path, result):
+        writers.append(threading.current_thread())
+        write_trace(path, result)
+
+    monkeypatch.setattr(tracing, "_write_trace", record)
+    tracer = Tracer(sample_rate=1.0, trace_dir=str(tmp_path))
+
+    async def main():
+        result = tracer.finish(tracer.start("r1", "chat", 0.0), "success")
+        while not writers:
+            await asyncio.sleep(0.001)
+        return result, threading.current_thread()
+
+    result, loop_thread = asyncio.run(main())
+
+    assert writers[0] is not loop_thread
+    assert (tmp_path / "r1.json").exists()
+    assert result["file"] == str(tmp_path / "r1.json")
@@ -0,0 +1,66 @@
+import json
+import os
+
+import pytest
+
+import triage_cli
+
+
+@pytest.fixture
+def cli(monkeypatch):
+    # main() forces these; monkeypatch restores them afterwards
+    monkeypatch.setenv("AI_MAX_RETRIES", "2")
+    monkeypatch.setenv("TRIAGE_RULES_ENRICH", "true")
+    monkeypatch.setattr(triage_cli, "load_dotenv", lambda: None)
+    return triage_cli.main
+
+
+def write_input(path, count):
+    lines = [json.dumps({"symptoms": f"Headache for {day} days", "severity": 4, "age": 30}) for day in range(count)]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def read_output(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_writes_one_record_per_line_in_order(cli, tmp_path):
+    source, output = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    write_input(source, 5)
+
+    assert cli([str(source), str(output), "--workers", "3"]) == 0
+
+    records = read_output(output)
+    assert [record["index"] for record in records] == [0, 1, 2, 3, 4]
+    assert all(record["status"] == "ok" for record in records)
+    checkpoint = json.loads((tmp_path / "out.jsonl.checkpoint").read_text())
+    assert checkpoint == {"lines_done": 5, "output_bytes": output.stat().st_size}
+    # The per-line loop is the only retry layer, and nothing is enriched
+    assert os.environ["AI_MAX_RETRIES"] == "0"
+    assert os.environ["TRIAGE_RULES_ENRICH"] == "false"
+
+
+def test_resume_drops_output_past_the_checkpoint_and_redoes_those_lines(cli, tmp_path):
+    source, output = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    write_input(source, 5)
+    cli([str(source), str(output)])
+    first_two = b"".join(output.read_bytes().splitlines(keepends=True)[:2])
+
+    # A crash after the checkpoint at line 2, with a torn third record
+    output.write_bytes(first_two + b'{"index": 2, "sta')
+    triage_cli.write_checkpoint(str(tmp_path / "out.jsonl.checkpoint"), 2, len(first_two))
+
+    assert cli([str(source), str(output), "--resume"]) == 0
+
+    assert [record["index"] for record in read_output(output)] == [0, 1, 2, 3, 4]
+
+
+def test_invalid_lines_are_reported_without_retries(cli, tmp_path):
+    source, output = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    source.write_text('{"symptoms": "Cough", "severity": 3}\nnot json\n\n', encoding="utf-8")
+
+    cli([str(source), str(output), "--retries", "3"])
+
+    records = read_output(output)
+    assert [record["status"] for record in records] == ["ok", "error"]
+    assert records[1]["attempts"] == 0
@@ -0,0 +1,117 @@
+import json
+
+import pytest
+
+from triage_rules import DEFAULT_RULES_PATH, NEGATION_WINDOW, KeywordAutomaton, fold, load_rule_engine
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return load_rule_engine(DEFAULT_RULES_PATH)
+
+
+def rule_name(engine, symptoms, severity=9, age=40):
+    rule = engine.match({"symptoms": symptoms, "severity": severity, "age": age})
+    return rule.name if rule else None
+
+
+def test_fold_strips_accents_and_case():
+    assert fold("  Dor  TORÁCICA\tforte ") == "dor toracica forte"
+
+
+def test_automaton_reports_whole_words_only():
+    automaton = KeywordAutomaton(["pain", "chest pain"])
+    text = "chest pain and painful"
+
+    matches = [(automaton.keywords[k], start, end) for k, start, end in automaton.iter_matches(text)]
+
+    assert ("chest pain", 0, 10) in matches
+    assert ("pain", 6, 10) in matches
+    assert all(end <= 10 for _, _, end in matches)
+
+
+@pytest.mark.parametrize("symptoms,expected", [
+    ("Crushing chest pain radiating to the arm", "chest_pain"),
+    ("Estou com dor no peito há uma hora", "chest_pain"),
+    ("Sudden slurred speech and face drooping", "stroke_signs"),
+    ("I want to kill myself", "suicidal_ideation"),
+    ("Headache and mild fever for two days", None),
+])
+def test_red_flags_match(engine, symptoms, expected):
+    assert rule_name(engine, symptoms) == expected
+
+
+@pytest.mark.parametrize("symptoms", [
+    "no chest pain",
+    "Denies chest pain or shortness of breath",
+    "without any chest pain",
+    "sem dor no peito",
+    "não tenho dor no peito",
+])
+def test_negated_keywords_do_not_match(engine, symptoms):
+    assert rule_name(engine, symptoms) is None
+
+
+def test_negation_window_is_bounded(engine):
+    # The keyword starts exactly NEGATION_WINDOW characters after the cue ends
+    within = f"no {'x' * (NEGATION_WINDOW - 2)} chest pain"
+    beyond = f"no {'word ' * (NEGATION_WINDOW // 5 + 1)}chest pain"
+
+    assert rule_name(engine, within) is None
+    assert rule_name(engine, beyond) == "chest_pain"
+
+
+@pytest.mark.parametrize("symptoms", [
+    "no fever, but chest pain since morning",
+    "no fever. Chest pain since morning",
+    "denies fever but has crushing chest pain",
+    "sem febre mas com dor no peito",
+])
+def test_clause_breaks_end_the_negation(engine, symptoms):
+    assert rule_name(engine, symptoms) == "chest_pain"
+
+
+@pytest.mark.parametrize("symptoms", [
+    "febre no corpo e dor no peito forte",
+    "dor no braço e dor no peito",
+    "acordei com aperto no peito",
+])
+def test_portuguese_contraction_no_is_not_a_negation(engine, symptoms):
+    assert engine.language(fold(symptoms)) == "pt"
+    assert rule_name(engine, symptoms, severity=8) == "chest_pain"
+
+
+@pytest.mark.parametrize("symptoms, language", [
+    ("no chest pain today", "en"),
+    ("sem dor no peito", "pt"),
+    ("não tenho dor no peito", "pt"),
+])
+def test_negation_cues_apply_in_their_language(engine, symptoms, language):
+    assert engine.language(fold(symptoms)) == language
+    assert rule_name(engine, symptoms) is None
+
+
+def test_thresholds_gate_the_rule(engine):
+    assert rule_name(engine, "chest pain", severity=3) is None
+    assert rule_name(engine, "fever", severity=6, age=0) == "infant_fever"
+    assert rule_name(engine, "fever", severity=6, age=30) is None
+    assert rule_name(engine, "fever", severity=None, age=0) is None
+
+
+def test_respond_fills_the_templates(engine):
+    triage_input = {"symptoms": "chest pain", "severity": 9, "age": 58}
+
+    response = engine.respond(engine.match(triage_input), triage_input)
+
+    assert response["rule"] == "chest_pain"
+    assert "chest pain" in response["subjective"]
+    assert "Not provided" in response["subjective"]
+    assert response["nextStep"] == "Seek emergency care"
+
+
+def test_load_rejects_unknown_placeholders(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps({"rules": [{"name": "x", "keywords": ["x"], "plan": "{dose}"}]}))
+
+    with pytest.raises(ValueError, match="dose"):
+        load_rule_engine(str(path))
@@ -0,0 +1,224 @@
+"""Opt-in per-request tracing with an optional sampling profiler.
+
+A request is traced when it is picked by TRACE_SAMPLE_RATE or, if the server
+sets TRACE_ALLOW_HEADER, when the caller sends an ``X-Trace`` header. Traced
+requests record span timings for each stage of the request and, when
+profiling is enabled, sample the stack of the thread doing the request's
+work with ``sys._current_frames()``: the handling thread, or the upstream
+worker while it runs a provider call for the request. Async handlers are
+traced without a profile, since their event-loop thread runs every other
+request too. Untraced requests never build a Trace, so the only cost is one
+``is None`` check per stage.
+
+    X-Trace: 1         span timings in the response's "trace" field
+    X-Trace: profile   span timings plus a sampling-profiler summary
+                       (also needs TRACE_ALLOW_HEADER_PROFILE)
+
+The header is ignored by default: a profiled request starts a sampler thread
+and, with TRACE_DIR set, writes a file, so callers must not be able to turn
+that on for every request. On an event loop the file is written from the
+default executor.
+"""
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+
+def _short_path(filename: str) -> str:
+    # Parent directory keeps flask/app.py apart from our own app.py
+    parent, name = os.path.split(filename)
+    return f"{os.path.basename(parent)}/{name}"
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack on a timer from a background thread.
+
+    ``thread_id`` can be moved while sampling, when the work hops threads.
+
+    Samples are counted per innermost frame ("self" time) and per frame anywhere
+    on the stack ("total" time). Time spent waiting for the GIL shows up as
+    fewer samples than the interval would predict; it is reported as
+    ``missed_samples``.
+    """
+
+    def __init__(self, thread_id: int, interval: float, max_depth: int = 32):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = 0
+        self.self_counts: Counter = Counter()
+        self.total_counts: Counter = Counter()
+        self._stop = threading.Event()
+        self._started = 0.0
+        self._elapsed = 0.0
+        self._thread = threading.Thread(target=self._run, name="trace-profiler", daemon=True)
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self._elapsed = time.perf_counter() - self._started
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.samples += 1
+            seen = set()
+            depth = 0
+            innermost = True
+            while frame is not None and depth < self.max_depth:
+                code = frame.f_code
+                key = f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+                if innermost:
+                    self.self_counts[key] += 1
+                    innermost = False
+                if key not in seen:
+                    seen.add(key)
+                    self.total_counts[key] += 1
+                frame = frame.f_back
+                depth += 1
+
+    def summary(self, top: int = 15) -> Dict[str, Any]:
+        expected = int(self._elapsed / self.interval) if self.interval else 0
+
+        def ranked(counts: Counter) -> List[Dict[str, Any]]:
+            return [
+                {"frame": key, "samples": count, "pct": round(100.0 * count / self.samples, 1)}
+                for key, count in counts.most_common(top)
+            ]
+
+        return {
+            "interval_ms": round(self.interval * 1000, 3),
+            "samples": self.samples,
+            "missed_samples": max(expected - self.samples, 0),
+            "self": ranked(self.self_counts),
+            "total": ranked(self.total_counts),
+        }
+
+
+class Trace:
+    """Span timings for one request, relative to the request start"""
+
+    def __init__(self, request_id: str, endpoint: str, started: float, profiler: Optional[SamplingProfiler] = None):
+        self.request_id = request_id
+        self.endpoint = endpoint
+        self.started = started
+        self.spans: List[Dict[str, Any]] = []
+        self.profiler = profiler
+        if profiler is not None:
+            profiler.start()
+
+    @contextmanager
+    def follow(self, thread_id: int):
+        """Profile thread_id for the duration of the block, then go back"""
+        profiler = self.profiler
+        if profiler is None:
+            yield
+            return
+        previous, profiler.thread_id = profiler.thread_id, thread_id
+        try:
+            yield
+        finally:
+            # An overrun upstream call can finish after the caller moved on
+            if profiler.thread_id == thread_id:
+                profiler.thread_id = previous
+
+    def add_span(self, name: str, started: float, duration: float):
+        self.spans.append({
+            "name": name,
+            "start_ms": round((started - self.started) * 1000, 3),
+            "duration_ms": round(duration * 1000, 3),
+        })
+
+    def finish(self, outcome: str) -> Dict[str, Any]:
+        if self.profiler is not None:
+            self.profiler.stop()
+        trace = {
+            "request_id": self.request_id,
+            "endpoint": self.endpoint,
+            "outcome": outcome,
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 3),
+            "spans": self.spans,
+        }
+        if self.profiler is not None:
+            trace["profile"] = self.profiler.summary()
+        return trace
+
+
+class Tracer:
+    """Decides which requests are traced and where finished traces go"""
+
+    def __init__(self, sample_rate: float = 0.0, profile_sampled: bool = False,
+                 profile_interval_ms: float = 5.0, trace_dir: Optional[str] = None,
+                 allow_header: bool = False, allow_header_profile: bool = False):
+        self.sample_rate = sample_rate
+        self.profile_sampled = profile_sampled
+        self.allow_header = allow_header
+        self.allow_header_profile = allow_header_profile
+        self.profile_interval = profile_interval_ms / 1000.0
+        self.trace_dir = trace_dir
+        if trace_dir:
+            os.makedirs(trace_dir, exist_ok=True)
+
+    def start(self, request_id: str, endpoint: str, started: float, requested: Optional[str] = None,
+              profile_allowed: bool = True) -> Optional[Trace]:
+        """Return a Trace if this request should be traced, otherwise None.
+
+        ``requested`` is the caller's X-Trace value; it only counts when the
+        server allows it. With ``profile_allowed`` false (async handlers) the
+        trace has spans only.
+        """
+        mode = (requested or "").strip().lower() if self.allow_header else ""
+        if mode in ("", "0", "false", "off"):
+            if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+                return None
+            profile = self.profile_sampled
+        else:
+            profile = mode == "profile" and self.allow_header_profile
+        profile = profile and profile_allowed
+
+        profiler = SamplingProfiler(threading.get_ident(), self.profile_interval) if profile else None
+        return Trace(request_id, endpoint, started, profiler)
+
+    def finish(self, trace: Trace, outcome: str) -> Dict[str, Any]:
+        """Stop the trace and write it to TRACE_DIR when configured"""
+        result = trace.finish(outcome)
+        if self.trace_dir:
+            path = os.path.join(self.trace_dir, f"{trace.request_id}.json")
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                _write_trace(path, result)
+            else:
+                loop.run_in_executor(None, _write_trace, path, dict(result))
+            result["file"] = path
+        return result
+
+
+def _write_trace(path: str, result: Dict[str, Any]):
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump(result, handle, indent=2)
+
+
+def create_tracer() -> Tracer:
+    """Build the tracer from TRACE_* environment variables"""
+    return Tracer(
+        sample_rate=float(os.getenv('TRACE_SAMPLE_RATE', '0')),
+        profile_sampled=os.getenv('TRACE_PROFILE', 'false').lower() == 'true',
+        profile_interval_ms=float(os.getenv('TRACE_PROFILE_INTERVAL_MS', '5')),
+        trace_dir=os.getenv('TRACE_DIR') or None,
+        allow_header=os.getenv('TRACE_ALLOW_HEADER', 'false').lower() == 'true',
+        allow_header_profile=os.getenv('TRACE_ALLOW_HEADER_PROFILE', 'false').lower() == 'true',
+    )
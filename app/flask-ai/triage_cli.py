@@ -0,0 +1,139 @@
+"""Offline triage over JSONL files, without the Flask server.
+
+    python triage_cli.py submissions.jsonl summaries.jsonl --workers 8 --retries 2
+
+Each input line is a triage payload (same shape as POST /generate_summary).
+Each output line is {"index", "status", "result"/"error", "attempts"}, written
+in input order through the same Agent.run used by the HTTP service. Progress
+is checkpointed next to the output; rerun with --resume after a crash to
+continue where the last checkpoint left off.
+
+--retries is the only retry layer by default: the agent is built with
+AI_MAX_RETRIES=0 (override with --upstream-retries), so a line makes at most
+(retries + 1) x (1 + upstream-retries) attempts per routed model, and twice
+that when AI_MODEL_FALLBACK is set. Otherwise the CLI's retries would repeat
+the agent's own, on each model.
+
+Rule enrichment (TRIAGE_RULES_ENRICH) is always off: a rule-matched line is
+written with its templated answer, and nothing would ever read the session a
+background model call updates.
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, Iterator, Tuple
+
+from dotenv import load_dotenv
+
+from agent import Agent
+from batch import iter_ordered
+
+
+def read_checkpoint(path: str) -> Dict[str, int]:
+    if not os.path.exists(path):
+        return {"lines_done": 0, "output_bytes": 0}
+    with open(path, "r", encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def write_checkpoint(path: str, lines_done: int, output_bytes: int):
+    # Write then rename so a crash never leaves a half-written checkpoint
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as handle:
+        json.dump({"lines_done": lines_done, "output_bytes": output_bytes}, handle)
+    os.replace(tmp_path, path)
+
+
+def iter_input(path: str, skip: int) -> Iterator[Tuple[int, str]]:
+    """Yield (index, line) lazily, skipping lines already processed"""
+    with open(path, "r", encoding="utf-8") as handle:
+        for index, line in itertools.islice(enumerate(handle), skip, None):
+            yield index, line
+
+
+def process_line(agent: Agent, index: int, line: str, retries: int, backoff: float) -> Dict[str, Any]:
+    line = line.strip()
+    if not line:
+        return {"index": index, "status": "skipped", "attempts": 0}
+    try:
+        item = json.loads(line)
+    except ValueError as e:
+        return {"index": index, "status": "error", "error": f"Invalid JSON line: {e}", "attempts": 0}
+
+    attempt = 0
+    while True:
+        attempt += 1
+        record = agent.run_batch_item(index, item)
+        rejected = record["status"] == "rejected"
+        # Only upstream failures are worth retrying; bad payloads fail the same way again
+        if record["status"] == "ok" or not (rejected or "result" in record) or attempt > retries:
+            record["attempts"] = attempt
+            return record
+        delay = backoff * (2 ** (attempt - 1))
+        time.sleep(max(delay, record["retry_after"]) if rejected else delay)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run triage summaries over a JSONL file")
+    parser.add_argument("input", help="input JSONL file, one triage payload per line")
+    parser.add_argument("output", help="output JSONL file")
+    parser.add_argument("--workers", type=int, default=int(os.getenv('BATCH_MAX_WORKERS', '8')),
+                        help="parallel model calls (default: BATCH_MAX_WORKERS or 8)")
+    parser.add_argument("--retries", type=int, default=2, help="retries per line on upstream errors")
+    parser.add_argument("--upstream-retries", type=int, default=0,
+                        help="retries inside each model call (AI_MAX_RETRIES); multiplies with --retries")
+    parser.add_argument("--retry-backoff", type=float, default=1.0,
+                        help="seconds before the first retry, doubled on each attempt")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: <output>.checkpoint)")
+    parser.add_argument("--checkpoint-every", type=int, default=50, help="lines between checkpoints")
+    parser.add_argument("--resume", action="store_true", help="continue from the last checkpoint")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    # The per-line loop below already retries; do not stack the policy's retries under it
+    os.environ['AI_MAX_RETRIES'] = str(max(args.upstream_retries, 0))
+    # Nothing reads the sessions that background enrichment would update
+    os.environ['TRIAGE_RULES_ENRICH'] = 'false'
+    checkpoint_path = args.checkpoint or f"{args.output}.checkpoint"
+    state = read_checkpoint(checkpoint_path) if args.resume else {"lines_done": 0, "output_bytes": 0}
+
+    agent = Agent()
+    lines_done = state["lines_done"]
+    errors = 0
+    started = time.perf_counter()
+
+    with open(args.output, "ab" if args.resume else "wb") as output:
+        # Drop anything written after the last checkpoint; those lines are redone
+        output.truncate(state["output_bytes"])
+        output.seek(state["output_bytes"])
+
+        records = iter_ordered(
+            lambda indexed: process_line(agent, *indexed, args.retries, args.retry_backoff),
+            iter_input(args.input, lines_done),
+            args.workers,
+        )
+        for record in records:
+            if record["status"] != "skipped":
+                output.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+                errors += record["status"] in ("error", "rejected")
+            lines_done += 1
+            if lines_done % args.checkpoint_every == 0:
+                output.flush()
+                os.fsync(output.fileno())
+                write_checkpoint(checkpoint_path, lines_done, output.tell())
+
+        output.flush()
+        os.fsync(output.fileno())
+        write_checkpoint(checkpoint_path, lines_done, output.tell())
+
+    elapsed = time.perf_counter() - started
+    print(f"Processed {lines_done - state['lines_done']} lines ({errors} errors) in {elapsed:.1f}s; "
+          f"{lines_done} total in {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
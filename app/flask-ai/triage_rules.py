@@ -0,0 +1,306 @@
+"""Rule-based pre-triage for clear-cut cases.
+
+A rule table (triage_rules.json by default) lists red-flag keywords with
+severity and age thresholds. All keywords, plus a few negation cues, are
+compiled into one Aho–Corasick automaton, so matching a submission is a
+single pass over its symptoms however many rules there are. When a rule
+matches, the agent answers at once with the rule's templated SOAP sections
+and urgent next step instead of waiting on the model.
+
+Keywords only match whole words, and a keyword is ignored when a negation
+cue ("no", "denies", "sem", ...) appears shortly before it in the same
+clause; punctuation or a clause break such as "but" ends the clause.
+Negation cues can be scoped to a language, because a cue in one language
+can be an ordinary word in another: the Portuguese contraction "no" ("in
+the") in "dor no peito". The submission's language is guessed from the
+table's marker words, falling back to the first language listed.
+A wrongly negated keyword only means the model answers as before.
+Rules are tried in file order and the first one whose thresholds hold
+wins, so list the most specific rules first.
+"""
+import json
+import os
+import re
+import unicodedata
+from bisect import bisect_right
+from collections import deque
+from string import Formatter
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
+
+from metrics import REGISTRY
+
+RULE_MATCHES = REGISTRY.counter(
+    "triage_rule_matches_total", "Triage requests answered by a pre-triage rule", ("rule",))
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "triage_rules.json")
+
+# A negation cue ending at most this many characters before a keyword negates it
+NEGATION_WINDOW = 24
+# Automaton owners of the cue words: negations, and words that end a clause
+_NEGATION = "negation"
+_BREAK = "break"
+_CLAUSE_BREAKS = ".;,!?\n"
+_WORD = re.compile(r"[a-z]+")
+SECTIONS = ("subjective", "objective", "assessment", "plan", "nextStep", "summary")
+TEMPLATE_FIELDS = ("symptoms", "severity", "age", "duration", "gender", "medical_history", "current_medications")
+
+
+def fold(text: str) -> str:
+    """Lowercase, strip accents and collapse whitespace"""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return " ".join("".join(ch for ch in decomposed if not unicodedata.combining(ch)).split())
+
+
+class KeywordAutomaton:
+    """Aho–Corasick automaton that reports whole-word keyword occurrences.
+
+    Failure links are folded into a full transition table at build time,
+    so search is one dict lookup per character.
+    """
+
+    __slots__ = ("keywords", "_delta", "_out")
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords: List[str] = []
+        goto: List[Dict[str, int]] = [{}]
+        out: List[List[int]] = [[]]
+        for keyword in keywords:
+            state = 0
+            for ch in keyword:
+                if ch not in goto[state]:
+                    goto.append({})
+                    out.append([])
+                    goto[state][ch] = len(goto) - 1
+                state = goto[state][ch]
+            out[state].append(len(self.keywords))
+            self.keywords.append(keyword)
+
+        # Breadth-first, so a state's failure target is complete before it
+        fail = [0] * len(goto)
+        delta: List[Dict[str, int]] = [dict(goto[0])] + [{} for _ in goto[1:]]
+        pending = deque(goto[0].values())
+        while pending:
+            state = pending.popleft()
+            out[state] = out[state] + out[fail[state]]
+            delta[state] = {**delta[fail[state]], **goto[state]}
+            for ch, child in goto[state].items():
+                fail[child] = delta[fail[state]].get(ch, 0)
+                pending.append(child)
+        self._delta = delta
+        self._out: List[Tuple[int, ...]] = [tuple(ids) for ids in out]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, int]]:
+        """Yield (keyword id, start, end) for each whole-word match in already folded text"""
+        delta, out, keywords = self._delta, self._out, self.keywords
+        state = 0
+        for end, ch in enumerate(text, 1):
+            state = delta[state].get(ch, 0)
+            for keyword_id in out[state]:
+                start = end - len(keywords[keyword_id])
+                if (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum()):
+                    yield keyword_id, start, end
+
+
+class TriageRule:
+    """Red-flag keywords, the thresholds that make them clear-cut, and the templated reply"""
+
+    __slots__ = ("name", "keywords", "min_severity", "min_age", "max_age", "urgency", "start_chat", "sections")
+
+    def __init__(self, name: str, keywords: List[str], sections: Dict[str, str], min_severity: Optional[int] = None,
+                 min_age: Optional[int] = None, max_age: Optional[int] = None, urgency: str = "emergency",
+                 start_chat: bool = False):
+        self.name = name
+        self.keywords = keywords
+        self.sections = sections
+        self.min_severity = min_severity
+        self.min_age = min_age
+        self.max_age = max_age
+        self.urgency = urgency
+        self.start_chat = start_chat
+
+    def applies(self, triage_input: Dict[str, Any]) -> bool:
+        """Thresholds on a missing severity or age never hold"""
+        severity = triage_input.get("severity")
+        age = triage_input.get("age")
+        if self.min_severity is not None and (severity is None or severity < self.min_severity):
+            return False
+        if self.min_age is not None and (age is None or age < self.min_age):
+            return False
+        if self.max_age is not None and (age is None or age > self.max_age):
+            return False
+        return True
+
+
+class RuleEngine:
+    """Matches normalized triage input against a rule table in one automaton pass"""
+
+    def __init__(self, rules: List[TriageRule], negations: Union[Iterable[str], Mapping[str, Iterable[str]]] = (),
+                 clause_breaks: Iterable[str] = (), defaults: Optional[Dict[str, str]] = None,
+                 language_markers: Optional[Mapping[str, Iterable[str]]] = None):
+        """negations is a list of cues for every language, or a mapping of
+        language -> cues; language_markers maps a language to words that
+        identify it, and the first language in negations is the fallback.
+        """
+        self.rules = rules
+        self.defaults = defaults or {}
+        self._markers: Dict[str, FrozenSet[str]] = {
+            language: frozenset(fold(word) for word in words) for language, words in (language_markers or {}).items()
+        }
+        # folded cue -> languages it negates in, or None for every language
+        cue_languages: Dict[str, Optional[FrozenSet[str]]] = {}
+        if isinstance(negations, Mapping):
+            self._default_language = next(iter(negations), None)
+            for language, language_cues in negations.items():
+                for cue in language_cues:
+                    cue_languages[fold(cue)] = cue_languages.get(fold(cue), frozenset()) | {language}
+        else:
+            self._default_language = None
+            cue_languages = {fold(cue): None for cue in negations}
+        keywords: List[str] = []
+        # keyword id -> rule indices, or _NEGATION / _BREAK for cue words
+        self._owners: List[Any] = []
+        owners: Dict[str, List[int]] = {}
+        for index, rule in enumerate(rules):
+            for keyword in rule.keywords:
+                owners.setdefault(fold(keyword), []).append(index)
+        for keyword, indices in owners.items():
+            keywords.append(keyword)
+            self._owners.append(tuple(indices))
+        cues = {cue: _NEGATION for cue in cue_languages}
+        cues.update({fold(cue): _BREAK for cue in clause_breaks})
+        # keyword id -> languages, for language-scoped negation cues only
+        self._cue_languages: Dict[int, FrozenSet[str]] = {}
+        for cue, kind in cues.items():
+            if cue not in owners:
+                if kind == _NEGATION and cue_languages[cue] is not None:
+                    self._cue_languages[len(keywords)] = cue_languages[cue]
+                keywords.append(cue)
+                self._owners.append(kind)
+        self.automaton = KeywordAutomaton(keywords)
+
+    def matched_rules(self, symptoms: str) -> List[int]:
+        """Indices of rules with a non-negated keyword in the symptoms, in table order"""
+        text = fold(symptoms)
+        hits = set()
+        # End offsets of cue words, ascending since matches arrive in end order.
+        # A cue can sit inside a longer keyword ("no" in "dor no peito"), so a
+        # keyword looks back from its start rather than at the latest cue.
+        negation_ends: List[int] = []
+        break_ends: List[int] = []
+        language = None
+        for keyword_id, start, end in self.automaton.iter_matches(text):
+            owners = self._owners[keyword_id]
+            if owners == _NEGATION:
+                languages = self._cue_languages.get(keyword_id)
+                if languages is not None:
+                    language = language or self.language(text)
+                    if language not in languages:
+                        continue
+                negation_ends.append(end)
+                continue
+            if owners == _BREAK:
+                break_ends.append(end)
+                continue
+            if self._negated(text, start, negation_ends, break_ends):
+                continue
+            hits.update(owners)
+        return sorted(hits)
+
+    def language(self, text: str) -> Optional[str]:
+        """Language with the most marker words in folded text, else the fallback"""
+        words = set(_WORD.findall(text))
+        best, best_count = self._default_language, 0
+        for language, markers in self._markers.items():
+            count = len(words & markers)
+            if count > best_count:
+                best, best_count = language, count
+        return best
+
+    @staticmethod
+    def _negated(text: str, start: int, negation_ends: List[int], break_ends: List[int]) -> bool:
+        cue = bisect_right(negation_ends, start)
+        if not cue:
+            return False
+        negation_end = negation_ends[cue - 1]
+        if start - negation_end > NEGATION_WINDOW:
+            return False
+        clause_break = bisect_right(break_ends, start)
+        if clause_break and break_ends[clause_break - 1] > negation_end:
+            return False
+        return not any(ch in _CLAUSE_BREAKS for ch in text[negation_end:start])
+
+    def match(self, triage_input: Dict[str, Any]) -> Optional[TriageRule]:
+        """First rule, in table order, whose keywords and thresholds both hold"""
+        symptoms = triage_input.get("symptoms") or ""
+        if not symptoms:
+            return None
+        for index in self.matched_rules(symptoms):
+            rule = self.rules[index]
+            if rule.applies(triage_input):
+                RULE_MATCHES.inc(rule.name)
+                return rule
+        return None
+
+    def respond(self, rule: TriageRule, triage_input: Dict[str, Any]) -> Dict[str, Any]:
+        """The rule's SOAP sections with the patient fields filled in"""
+        values = {name: _template_value(triage_input.get(name)) for name in TEMPLATE_FIELDS}
+        response = {
+            section: template.format_map(values)
+            for section, template in {**self.defaults, **rule.sections}.items()
+        }
+        response.update({"start_chat": rule.start_chat, "rule": rule.name, "urgency": rule.urgency})
+        return response
+
+
+def _template_value(value: Any) -> str:
+    if value is None or value == "":
+        return "Not provided"
+    return str(value)
+
+
+def _check_templates(source: str, sections: Dict[str, str]):
+    for section, template in sections.items():
+        if section not in SECTIONS:
+            raise ValueError(f"{source}: unknown section '{section}' (expected one of: {', '.join(SECTIONS)})")
+        for _, field, _, _ in Formatter().parse(template):
+            if field is not None and field not in TEMPLATE_FIELDS:
+                raise ValueError(f"{source}: unknown placeholder '{{{field}}}' in {section}")
+
+
+def load_rule_engine(path: str) -> RuleEngine:
+    """Build a RuleEngine from a JSON rule table; raises ValueError on a malformed table"""
+    with open(path, "r", encoding="utf-8") as handle:
+        table = json.load(handle)
+
+    defaults = table.get("defaults", {})
+    _check_templates(f"{path} defaults", defaults)
+    rules = []
+    for index, entry in enumerate(table.get("rules", [])):
+        name = entry.get("name") or f"rule_{index}"
+        keywords = entry.get("keywords") or []
+        if not keywords:
+            raise ValueError(f"{path}: rule '{name}' has no keywords")
+        sections = {section: entry[section] for section in SECTIONS if section in entry}
+        _check_templates(f"{path} rule '{name}'", sections)
+        rules.append(TriageRule(
+            name,
+            keywords,
+            sections,
+            min_severity=entry.get("min_severity"),
+            min_age=entry.get("min_age"),
+            max_age=entry.get("max_age"),
+            urgency=entry.get("urgency", "emergency"),
+            start_chat=bool(entry.get("start_chat", False)),
+        ))
+    return RuleEngine(rules, table.get("negations", []), table.get("clause_breaks", []), defaults,
+                      table.get("language_markers"))
+
+
+def create_rule_engine() -> Optional[RuleEngine]:
+    """Load TRIAGE_RULES_PATH (default: the bundled table); None when TRIAGE_RULES_ENABLED is false"""
+    if os.getenv('TRIAGE_RULES_ENABLED', 'true').strip().lower() not in ('1', 'true', 'yes'):
+        return None
+    path = os.getenv('TRIAGE_RULES_PATH', '').strip() or DEFAULT_RULES_PATH
+    engine = load_rule_engine(path)
+    print(f"Loaded {len(engine.rules)} pre-triage rules from {path}")
+    return engine